@@ -11,55 +11,11 @@ import urllib.parse
 
 
 
-if DEFAULT_CONFIG["save_local"]:
-
-    for folder in [DATA_DIR, SITEMAPS_DIR, PRODUCTS_DIR,OUTPUTS_DIR ]:
-        os.makedirs(folder, exist_ok=True)
-
 logger = setup_logger("logs/scraper.log")
 
 
 
 
-def get_standard_csv_headers():
-    headers = [
-        "source", "date", "apiURL", "url", "sku", "name", "brand","stock",
-        "advance","paymentAmount","phoneContractDuration","sim_price","simContractname","simContractDuration","phoneContractPrice","isPhoneContractAvailableWOsim"
-        ,"phoneContractSimPackage","handsetOnlyCostCash","handsetOnlyContract",
-        "previousPrice", "onSale", "saleText",
-        "plan_type","sim_data","simOfferData", "sim1YearIncrease", "sim2YearIncrease", "sim3YearIncrease","simDesc",
-        "colour", "size", "UPC", "EAN",
-        "cat", "subcat1", "subcat2", "subcat3", "subcat4", "subcat5", "warranty",
-        "image1", "image2", "image3", "image4", "image5", "desc", "shortDesc",
-        "reviewCount", "reviewRating", "videoURL", "isSellingFast",
-        "isRestockingSoon", "isPromotion", "isOutletPrice", "lowestPriceText",
-        "lowestPriceValue"
-    ]
-    for i in range(1, 21):
-        headers += [f"attributeType{i}", f"attributeTitle{i}", f"attributeValue{i}"]
-    return headers
-
-def create_csv_file(filepath):
-    if DEFAULT_CONFIG["save_local"]:
-
-        headers = get_standard_csv_headers()
-        with open(OUTPUTS_DIR/filepath, mode="w", newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-
-def append_to_csv(item, filepath):
-
-    if DEFAULT_CONFIG["save_local"]:
-
-        headers = get_standard_csv_headers()
-        with open(OUTPUTS_DIR/filepath, mode="a", newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writerow(item)
-
-
-
-
-
 def generate_steps(min_val, max_val):
     values = []
 
@@ -82,253 +38,511 @@ def generate_steps(min_val, max_val):
 
     return values
 
-async def fetch_single_product(url: str):
-
-    response = await fetch_url(url, content_type="product")
-
-    soup = BeautifulSoup(response, "html.parser")
-    row = {}
-    script_tag = soup.find("script", {"id": "__NEXT_DATA__"})
-
-    if script_tag:
-        data_str = script_tag.text
-        data_str = data_str.replace("undefined", "null")
-        data = json.loads(data_str)
-        bundle_key = next(k for k in data["props"]["apolloState"]["ROOT_QUERY"] if k.startswith("deviceBundle("))
-        data_json = data["props"]["apolloState"]["ROOT_QUERY"][bundle_key]
-        variants = data_json["deviceBundleVariants"]
-        baseDeviceSeoId = data_json["product"]["baseDeviceSeoId"]
-        for v in variants:
-            row = {}
-            product = v["product"]
-            dimensions = product["dimensions"]
-
-            dims = {d["key"]: d["value"] for d in dimensions}
-
-            color = dims.get("color", "")
-            capacity = dims.get("capacity", "")
-            size = dims.get("watchScreenSize", "")
-
-
-            if capacity and not "tablet" in url:
-                params = {
-                    'operationName': 'FlexPayProductDetailsQuery',
-                    'variables': f'{{"deviceBundleBySeoInput":{{"bundleSeoId":"pay-monthly-phones","baseProductSeoId":"{baseDeviceSeoId}","dimensions":[{{"key":"capacity","value":"{capacity}"}},{{"key":"color","value":"{color}"}}]}}}}',
-                    'extensions': '{"persistedQuery":{"version":1,"sha256Hash":"74a0a54b03ccd740c5a3e7f5767146b2a10a7f45e5874074328b1b63fb61f59e"}}',
-                }
-            elif "broadband" in url:
-
-                params = {
-                    'operationName': 'FlexPayProductDetailsQuery',
-                    'variables': f'{{"deviceBundleBySeoInput":{{"bundleSeoId":"pay-monthly-mobile-broadband","baseProductSeoId":"{baseDeviceSeoId}","dimensions":[{{"key":"color","value":"{color}"}}]}}}}',
-                    'extensions': '{"persistedQuery":{"version":1,"sha256Hash":"74a0a54b03ccd740c5a3e7f5767146b2a10a7f45e5874074328b1b63fb61f59e"}}',
-                }
-            elif "wearables" in url:
-                params = {
-                    'operationName': 'ProductDetailsQuery',
-                    'variables': f'{{"deviceBundleBySeoInput":{{"bundleSeoId":"pay-monthly-{url.split("pay-monthly-")[1].split("-gallery")[0]}","baseProductSeoId":"{baseDeviceSeoId}","dimensions":[{{"key":"watchScreenSize","value":"{size}"}},{{"key":"color","value":"{color}"}}]}}}}',
-                    'extensions': '{"persistedQuery":{"version":1,"sha256Hash":"4d049d3a7d5913eac7aa4467610512496e76cad121b46e896f143f50594c2846"}}',
-                }
-            elif "computing-tablets" in str(url):
-
-                params = {
-                    'operationName': 'FlexPayProductDetailsQuery',
-                    'variables': f'{{"deviceBundleBySeoInput":{{"bundleSeoId":"add-pay-monthly-tablets","baseProductSeoId":"{baseDeviceSeoId}","dimensions":[{{"key":"capacity","value":"{capacity}"}},{{"key":"color","value":"{color}"}}]}}}}',
-                    'extensions': '{"persistedQuery":{"version":1,"sha256Hash":"4d049d3a7d5913eac7aa4467610512496e76cad121b46e896f143f50594c2846"}}',
+def parse_product_page(html: str):
+    """Return the base device id and the (color, capacity, size) of every variant on a product page"""
+    soup = parse_html(html, scope=["script#__NEXT_DATA__"])
+    script_tag = soup.select_one("script#__NEXT_DATA__")
+    if not script_tag:
+        return None, []
+
+    data_str = script_tag.text()
+    data_str = data_str.replace("undefined", "null")
+    data = json.loads(data_str)
+    bundle_key = next(k for k in data["props"]["apolloState"]["ROOT_QUERY"] if k.startswith("deviceBundle("))
+    data_json = data["props"]["apolloState"]["ROOT_QUERY"][bundle_key]
+    baseDeviceSeoId = data_json["product"]["baseDeviceSeoId"]
+    variants = []
+    for v in data_json["deviceBundleVariants"]:
+        dims = {d["key"]: d["value"] for d in v["product"]["dimensions"]}
+        variants.append((dims.get("color", ""), dims.get("capacity", ""), dims.get("watchScreenSize", "")))
+    return baseDeviceSeoId, variants
+
+def plan_fields(plan: dict) -> dict:
+    """Columns of a row that depend only on the plan of a productPlanCombination"""
+    sim_data = ""
+    for ent in plan.get("entitlements", []):
+        if ent.get("code") == "ME_DATA_MB":
+            qty = ent.get("quantity", 0)
+            if qty == -1:
+                sim_data = "Unlimited"
+            else:
+                sim_data = f"{int(qty / 1000)}GB"
+    sim_price = plan.get("price", {}).get("payMonthlyPrice")
+    simOfferData = "" if  plan.get("price", {}).get("wasPayMonthlyPrice") == 0.0 else plan.get("price", {}).get("wasPayMonthlyPrice")
+    simContractDuration = plan.get("price", {}).get("subscriptionTermInMonths", 0)
+    phoneContractPrice = 0
+    future_prices = plan.get("price", {}).get("futurePrices", [])
+
+    plan_family = plan.get("planFamily", {})
+    features = [f.get("name", "") for f in plan_family.get("features", [])]
+    special = [s.get("name", "") for s in plan_family.get("specialFeatures", [])]
+
+    simDesc = plan.get("summary", "")
+    if features:
+        simDesc += " | Features: " + "".join(features)
+    if special:
+        simDesc += " | Special: " + "".join(special)
+
+    return {
+        "plan_type": "contract",
+        "sim_data": sim_data,
+        "sim_price": sim_price,
+        "simOfferData": simOfferData,
+        "simContractname": plan.get("name"),
+        "simContractDuration": simContractDuration,
+        "isPhoneContractAvailableWOsim": "N",
+        "phoneContractSimPackage": phoneContractPrice + (simContractDuration * sim_price),
+        "handsetOnlyContract": "",
+        "sim1YearIncrease": future_prices[0].get("price", "") if len(future_prices) > 0 else "",
+        "sim2YearIncrease": future_prices[1].get("price", "") if len(future_prices) > 1 else "",
+        "sim3YearIncrease": future_prices[2].get("price", "") if len(future_prices) > 2 else "",
+        "simDesc": simDesc,
+    }
+
+# Plan columns of a variant sold without any plan
+NO_PLAN_FIELDS = {
+    "phoneContractDuration": "",
+    "advance": 0.0,
+    "phoneContractPrice": 0.0,
+    "paymentAmount": 0.0,
+    "plan_type": "",
+    "sim_data": "",
+    "sim_price": "",
+    "simOfferData": "",
+    "simContractname": "",
+    "simContractDuration": 0,
+    "isPhoneContractAvailableWOsim": "N",
+    "phoneContractSimPackage": 0,
+    "handsetOnlyContract": "",
+    "sim1YearIncrease": "",
+    "sim2YearIncrease": "",
+    "sim3YearIncrease": "",
+    "simDesc": "",
+}
+
+def build_variant_rows(url: str, color: str, capacity: str, api_url_varites: str, response_varites: str) -> list:
+    """
+    Build the output rows of one variant from its GraphQL response.
+
+    The variant's product columns go into one RowTemplate and each plan's
+    columns into a template derived from it, so the term x upfront x plan
+    loop only sets the pricing columns of every row.
+    """
+    rows = []
+    data_varites_json = json.loads(response_varites)
+
+    data_product = data_varites_json["data"]["deviceBundle"]["product"]
+    try:
+        first_combo = data_varites_json["data"]["deviceBundle"]["productPlanCombinations"][0]
+        handsetOnlyCostCash = first_combo["productPrice"]["payTodayPrice"]
+        maxLoanUpfrontCostPercentage = data_varites_json["data"]["guidedSellingConfig"]["maxLoanUpfrontCostPercentage"]
+        maxUpfront = int(handsetOnlyCostCash * (maxLoanUpfrontCostPercentage / 100))
+        minLoanUpfrontCostPercentage = first_combo["productPrice"].get("minimumPayTodayPrice", 0.0)
+
+        phoneContractDurations = first_combo["productPrice"].get("availableSubscriptionTermsInMonths", [1])
+    except:
+        handsetOnlyCostCash = 0
+        phoneContractDurations = [1]
+        minLoanUpfrontCostPercentage = 0.0
+        maxUpfront = 0.0
+
+    if data_product["stock"]["message"] != "In stock":
+        return rows
+
+    images = []
+    for img in data_product["images"]:
+        for fmt in img["formats"]:
+            if fmt["mimeType"] == "image/webp":
+                images.append(fmt["url"])
+                if len(images) == 5:
+                    break
+        if len(images) == 5:
+            break
+
+    template = RowTemplate(
+        {
+            "source": "EE",
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "apiURL": api_url_varites,
+            "url": url,
+            "sku": data_product["code"],
+            "name": data_product["name"],
+            "brand": data_product["manufacturer"],
+            "stock": "Y",
+            "desc": data_product["baseDeviceShortDescription"],
+            "shortDesc": data_product["seoTitle"],
+            "videoURL": "",
+            "lowestPriceValue": "",
+            "reviewRating": "",
+            "reviewCount": "",
+            "onSale": "",
+            "colour": color,
+            "size": capacity,
+            "UPC": "",
+            "EAN": "",
+            **url_category_fields(url),
+            "warranty": "",
+            "isSellingFast": "",
+            "isRestockingSoon": "",
+            "isPromotion": "",
+            "isOutletPrice": "",
+            "lowestPriceText": "",
+            **{f"image{i + 1}": images[i] if i < len(images) else "" for i in range(5)},
+            "saleText": "",
+            "handsetOnlyCostCash": handsetOnlyCostCash if handsetOnlyCostCash else "",
+            "previousPrice": "",
+        },
+        spec_attribute_fields(
+            (feature.get("assistiveText", "").strip(), feature.get("name", "").strip().upper())
+            for feature in data_product.get("features", [])
+        ),
+    )
+
+    combos = data_varites_json["data"]["deviceBundle"].get("productPlanCombinations", [])
+    if combos:
+        plan_templates = [template.derive(plan_fields(combo.get("plan"))) for combo in combos]
+        upfronts = generate_steps(minLoanUpfrontCostPercentage, maxUpfront) or [0]
+
+    for term in phoneContractDurations:
+        if combos:
+            for advance in upfronts:
+                pricing = {
+                    "phoneContractDuration": "" if term == 1 else term,
+                    "handsetOnlyCostCash": handsetOnlyCostCash,
+                    "advance": advance,
+                    "phoneContractPrice": handsetOnlyCostCash,
+                    "paymentAmount": round((handsetOnlyCostCash-advance) / term, 2),
                 }
-            headers = {
-
-                'cookie': 'XSRF-TOKEN=50e73457-1da8-4f86-b033-9b76de36ef06; isAcquisitionFlexpay=true; incap_ses_452_2335605=kXO/M/6l6xatdzwwwNNFBhfZpWgAAAAAvM/+wY9WImdfYbXrzb6qsQ==; visid_incap_2407824=Z+Wb5oOmT4GEV9+y5Z3PBMbppWgAAAAAQUIPAAAAAAAMCZFrJMtCOAxjz9FJ3c5S; nlbi_2407824=XzbZeaklhm0XdNpyrQnCxwAAAACYeiaM1SQbpv4m0i9JVqlI; incap_ses_452_2407824=ni90OVP8ngAbBkcwwNNFBsfppWgAAAAA1QnDsHbImiY1cIG0UsLzGQ==; visid_incap_2407823=ifpxnS1UTGW0RrP0eVewLsrppWgAAAAAQUIPAAAAAADY0q/eKAGg5teGWZwFuiHp; nlbi_2407823=zOvBeuePuwJKdckf9N3RlQAAAAAWDJZbMn/aKnQ1v4fyqJjp; incap_ses_452_2407823=RsNbI+Dy+245CUcwwNNFBsrppWgAAAAAa6W09QBNEGgAmBwT8uHZow==; incap_ses_1572_2335605=Q4IJV+WG0j/gg2uiDd7QFc3ppWgAAAAA1OgXLERqc3OarEdRUrzCzA==; visid_incap_2407832=LQ6FZY9RQbulv8Nv+Z5Owzikp2gAAAAAQUIPAAAAAAAoV9DLY9kUriRmyQ9Qk5RF; nlbi_2407832=zT0+XZaF1wiVxNrBKTvRZgAAAADJZpq8ciuroLHLZlw/P8e0; incap_ses_416_2407832=bBNqewO/1Cl7F0ev7u3FBTikp2gAAAAAvPI/aGDkJXJ8/J3kEaoJOg==; OptanonAlertBoxClosed=2025-08-21T22:56:11.560Z; at_check=true; abFeatureTesting.addlineCheckout=true; abFeatureTesting.acquisitionSubsidySemiHeadless=true; dtCookie=v_4_srv_2_sn_1D918CBBC2EBA0171D2BD4BA87D10FEF_perc_100000_ol_0_mul_1_app-3A7556ecaf88963360_1_app-3A7b6134e75ed78205_1_app-3Ae7f5606eaba145d0_1_rcs-3Acss_0; visid_incap_2407808=x7FBHwyiTPOM9K6iTtRHGZukp2gAAAAAQUIPAAAAAACUx10kqmHEmx7goXoKw08J; nlbi_2407808=kPmYTRn9bmxiq9BD8OLD1wAAAABShJaq4ha/3+Wz8+4AY2jA; incap_ses_416_2407808=6T/RCj3kJF1VYUev7u3FBZukp2gAAAAAvtz5/E0D46P0KFCv5Ee2rg==; visid_incap_2407836=UMcukpfDSdufhAREQObFapukp2gAAAAAQUIPAAAAAADWG7izLWqeKUtEwxwzWtKQ; nlbi_2407836=azpfY2O31mhwUcPlOV2ikAAAAAD9Y+oBE9RETXrGgQ0o38/z; incap_ses_416_2407836=bU5vXoyBDgReYUev7u3FBZukp2gAAAAAxsLEj0ApPg7fGrFh/ErTbg==; incap_ses_416_2407823=87mfaVB0gXJmYUev7u3FBZukp2gAAAAAAiKIMhX68BCQYvQJIXGzsw==; ee-minicart-details=eyJiYXNrZXRTdGVwIjoiL2V4cC9iYXNrZXQiLCJudW1CYXNrZXRJdGVtcyI6MH0=; JSESSIONID=Y6-f1afecde-76d9-41d0-a70d-f02c2161affa; incap_ses_9125_2335605=94T8FOWJJAob1prccYOifnhlqGgAAAAA5JKBbCnBLVVdDuY1c9vcnA==; incap_ses_416_2335605=qp+JabfhljaCC+6v7u3FBT5rqGgAAAAAikaG/J2y5MtL9RL0y5RyBg==; incap_ses_1378_2335605=vJAOJ59miHWcKyiABKQfE0RrqGgAAAAAyH8B4nZ4ZNuaS1k6qwomTQ==; AWSELB=2BDB77B51852D32BE6379457F72939339CB3D6001A9FFBC722D0D176EAF7F7A5727E67A8F1246A6890D70DC61D637C8C61DFB7E52731DC0113A5813D6C144933E1EE2BE4A6; incap_ses_455_2335605=M4rFczNNXDfDEfMKZnxQBkRrqGgAAAAAVpzJmy1Fzt/KYW9j7PKiCQ==; incap_ses_1364_2335605=JEXraOaFnVxS/bp6EOftEklrqGgAAAAA2AhsNRa1i1QzVx7FGCtnnQ==; incap_ses_1376_2335605=IzpXaZYb5Vdu+8yPCYkYE0prqGgAAAAA2746R8Pw3zNjjXEnl4Lq8w==; affinity="08a2a2b772930702"; nlbi_2335605=0HlEQiri63eFvHjw4NzfzwAAAABVFy2BuDyxBIcNNisZluEZ; incap_ses_1371_2335605=o0VwRyLFGxDEH7r3hsUGE3VrqGgAAAAAE1JbO+lpSJTJHAQFMC0Nhw==; visid_incap_2335605=i731d5CHTRSHu7nre7tmLHZrqGgAAAAAQUIPAAAAAAC17sRNgVHWtP3KBdG3ZVbJ; incap_ses_1380_2335605=xq6AdN+41CCeT8XBAb8mE3ZrqGgAAAAASOAhLFkuFZ456Za/J7a3uA==; OptanonConsent=isGpcEnabled=0&datestamp=Fri+Aug+22+2025+16%3A06%3A11+GMT%2B0300+(Eastern+European+Summer+Time)&version=202501.2.0&browserGpcFlag=0&isIABGlobal=false&hosts=&consentId=a8532de6-965b-41a8-95b2-5d48d5d29939&interactionCount=1&isAnonUser=1&landingPath=NotLandingPage&groups=0%3A1%2C1%3A1%2C2%3A1%2C3%3A1%2C5%3A1%2C6%3A1%2C7%3A1&intType=1&geolocation=EG%3BALX&AwaitingReconsent=false; is-one-page-config=1; mbox=PC#130117c0263e4913adc3fd854dbdea6d.37_0#1819112774|session#4c9e692a388943d78a3a4f35efe6b223#1755869834',
+                for plan_template in plan_templates:
+                    rows.append(plan_template.row(pricing))
+        else:
+            rows.append(template.row(NO_PLAN_FIELDS))
+
+    return rows
+
+# Session cookies sent with the GraphQL queries
+GRAPHQL_HEADERS = {
+    'cookie': 'XSRF-TOKEN=50e73457-1da8-4f86-b033-9b76de36ef06; isAcquisitionFlexpay=true; incap_ses_452_2335605=kXO/M/6l6xatdzwwwNNFBhfZpWgAAAAAvM/+wY9WImdfYbXrzb6qsQ==; visid_incap_2407824=Z+Wb5oOmT4GEV9+y5Z3PBMbppWgAAAAAQUIPAAAAAAAMCZFrJMtCOAxjz9FJ3c5S; nlbi_2407824=XzbZeaklhm0XdNpyrQnCxwAAAACYeiaM1SQbpv4m0i9JVqlI; incap_ses_452_2407824=ni90OVP8ngAbBkcwwNNFBsfppWgAAAAA1QnDsHbImiY1cIG0UsLzGQ==; visid_incap_2407823=ifpxnS1UTGW0RrP0eVewLsrppWgAAAAAQUIPAAAAAADY0q/eKAGg5teGWZwFuiHp; nlbi_2407823=zOvBeuePuwJKdckf9N3RlQAAAAAWDJZbMn/aKnQ1v4fyqJjp; incap_ses_452_2407823=RsNbI+Dy+245CUcwwNNFBsrppWgAAAAAa6W09QBNEGgAmBwT8uHZow==; incap_ses_1572_2335605=Q4IJV+WG0j/gg2uiDd7QFc3ppWgAAAAA1OgXLERqc3OarEdRUrzCzA==; visid_incap_2407832=LQ6FZY9RQbulv8Nv+Z5Owzikp2gAAAAAQUIPAAAAAAAoV9DLY9kUriRmyQ9Qk5RF; nlbi_2407832=zT0+XZaF1wiVxNrBKTvRZgAAAADJZpq8ciuroLHLZlw/P8e0; incap_ses_416_2407832=bBNqewO/1Cl7F0ev7u3FBTikp2gAAAAAvPI/aGDkJXJ8/J3kEaoJOg==; OptanonAlertBoxClosed=2025-08-21T22:56:11.560Z; at_check=true; abFeatureTesting.addlineCheckout=true; abFeatureTesting.acquisitionSubsidySemiHeadless=true; dtCookie=v_4_srv_2_sn_1D918CBBC2EBA0171D2BD4BA87D10FEF_perc_100000_ol_0_mul_1_app-3A7556ecaf88963360_1_app-3A7b6134e75ed78205_1_app-3Ae7f5606eaba145d0_1_rcs-3Acss_0; visid_incap_2407808=x7FBHwyiTPOM9K6iTtRHGZukp2gAAAAAQUIPAAAAAACUx10kqmHEmx7goXoKw08J; nlbi_2407808=kPmYTRn9bmxiq9BD8OLD1wAAAABShJaq4ha/3+Wz8+4AY2jA; incap_ses_416_2407808=6T/RCj3kJF1VYUev7u3FBZukp2gAAAAAvtz5/E0D46P0KFCv5Ee2rg==; visid_incap_2407836=UMcukpfDSdufhAREQObFapukp2gAAAAAQUIPAAAAAADWG7izLWqeKUtEwxwzWtKQ; nlbi_2407836=azpfY2O31mhwUcPlOV2ikAAAAAD9Y+oBE9RETXrGgQ0o38/z; incap_ses_416_2407836=bU5vXoyBDgReYUev7u3FBZukp2gAAAAAxsLEj0ApPg7fGrFh/ErTbg==; incap_ses_416_2407823=87mfaVB0gXJmYUev7u3FBZukp2gAAAAAAiKIMhX68BCQYvQJIXGzsw==; ee-minicart-details=eyJiYXNrZXRTdGVwIjoiL2V4cC9iYXNrZXQiLCJudW1CYXNrZXRJdGVtcyI6MH0=; JSESSIONID=Y6-f1afecde-76d9-41d0-a70d-f02c2161affa; incap_ses_9125_2335605=94T8FOWJJAob1prccYOifnhlqGgAAAAA5JKBbCnBLVVdDuY1c9vcnA==; incap_ses_416_2335605=qp+JabfhljaCC+6v7u3FBT5rqGgAAAAAikaG/J2y5MtL9RL0y5RyBg==; incap_ses_1378_2335605=vJAOJ59miHWcKyiABKQfE0RrqGgAAAAAyH8B4nZ4ZNuaS1k6qwomTQ==; AWSELB=2BDB77B51852D32BE6379457F72939339CB3D6001A9FFBC722D0D176EAF7F7A5727E67A8F1246A6890D70DC61D637C8C61DFB7E52731DC0113A5813D6C144933E1EE2BE4A6; incap_ses_455_2335605=M4rFczNNXDfDEfMKZnxQBkRrqGgAAAAAVpzJmy1Fzt/KYW9j7PKiCQ==; incap_ses_1364_2335605=JEXraOaFnVxS/bp6EOftEklrqGgAAAAA2AhsNRa1i1QzVx7FGCtnnQ==; incap_ses_1376_2335605=IzpXaZYb5Vdu+8yPCYkYE0prqGgAAAAA2746R8Pw3zNjjXEnl4Lq8w==; affinity="08a2a2b772930702"; nlbi_2335605=0HlEQiri63eFvHjw4NzfzwAAAABVFy2BuDyxBIcNNisZluEZ; incap_ses_1371_2335605=o0VwRyLFGxDEH7r3hsUGE3VrqGgAAAAAE1JbO+lpSJTJHAQFMC0Nhw==; visid_incap_2335605=i731d5CHTRSHu7nre7tmLHZrqGgAAAAAQUIPAAAAAAC17sRNgVHWtP3KBdG3ZVbJ; incap_ses_1380_2335605=xq6AdN+41CCeT8XBAb8mE3ZrqGgAAAAASOAhLFkuFZ456Za/J7a3uA==; OptanonConsent=isGpcEnabled=0&datestamp=Fri+Aug+22+2025+16%3A06%3A11+GMT%2B0300+(Eastern+European+Summer+Time)&version=202501.2.0&browserGpcFlag=0&isIABGlobal=false&hosts=&consentId=a8532de6-965b-41a8-95b2-5d48d5d29939&interactionCount=1&isAnonUser=1&landingPath=NotLandingPage&groups=0%3A1%2C1%3A1%2C2%3A1%2C3%3A1%2C5%3A1%2C6%3A1%2C7%3A1&intType=1&geolocation=EG%3BALX&AwaitingReconsent=false; is-one-page-config=1; mbox=PC#130117c0263e4913adc3fd854dbdea6d.37_0#1819112774|session#4c9e692a388943d78a3a4f35efe6b223#1755869834',
+}
+
+def graphql_request_key(params: dict) -> Tuple[str, str, str]:
+    """(operationName, sha256Hash, canonical variables) of persisted-query GET params"""
+    variables = json.loads(params["variables"])
+    for value in variables.values():
+        # Dimensions are a set of key/value pairs; their order does not change the answer
+        if isinstance(value, dict) and isinstance(value.get("dimensions"), list):
+            value["dimensions"] = sorted(value["dimensions"], key=lambda d: d.get("key", ""))
+    sha256_hash = json.loads(params["extensions"])["persistedQuery"]["sha256Hash"]
+    return params["operationName"], sha256_hash, json.dumps(variables, sort_keys=True, separators=(",", ":"))
+
+def graphql_cache_key(key: Tuple[str, str, str]) -> str:
+    """Raw cache key of a GraphQL request key, independent of how the request is sent"""
+    payload = json.dumps(["graphql", *key], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def graphql_errors(text: str) -> bool:
+    """Whether a GraphQL response carries errors (such responses are not cached)"""
+    if '"errors"' not in text:
+        return False
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return True
+    return not isinstance(payload, dict) or bool(payload.get("errors"))
+
+class EEGraphQLClient:
+    """
+    Persisted-query GraphQL requests to EE, deduplicated within a run.
+
+    Requests are keyed on (operationName, sha256Hash, canonical variables).
+    Identical requests share one call (single-flight), and the results of
+    the last MAX_ENTRIES keys are kept for the rest of the run, as the same
+    variant is reached from several sitemap URLs. Failed calls and responses
+    with GraphQL errors are not kept.
+
+    Responses are cached on disk under the same key, whether they came
+    from a GET or a batch, with content type "graphql": they follow
+    cache_ttl["graphql"], show up in the cache stats and are tagged with
+    the query hash for invalidate_graphql_cache.
+
+    With config["graphql_batch_size"] above 1, requests queued within
+    graphql_batch_window seconds go out as one Apollo batch POST. If the
+    endpoint answers a batch with anything but a list of results, batching
+    is turned off for the run and the queued requests are sent one by one.
+    """
+
+    ENDPOINT = "https://ee.co.uk/graphql"
+    MAX_ENTRIES = 2048
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None):
+        self.headers = headers or {}
+        self.requests = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self._results: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        # (params, key, future, frontier item, config) of the requests waiting for the next batch
+        self._queue: List[Tuple[dict, Tuple[str, str, str], asyncio.Future, Any, Dict[str, Any]]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._batching = True
+
+    async def query(self, params: dict, config: Dict[str, Any] = None) -> str:
+        """Response text of the persisted query described by its GET params"""
+        if config is None:
+            config = DEFAULT_CONFIG
+        key = graphql_request_key(params)
+        future = self._results.pop(key, None)
+        if future is not None:
+            self._results[key] = future
+            self.deduplicated += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._results[key] = future
+        while len(self._results) > self.MAX_ENTRIES:
+            del self._results[next(iter(self._results))]
+        future.add_done_callback(lambda f: f.cancelled() or f.exception() is None or self._forget(key, f))
+
+        if self._batching and config.get("graphql_batch_size", 1) > 1:
+            cached = self._cached(key, config)
+            if cached is not None:
+                future.set_result(cached)
+                return cached
+            self.requests += 1
+            self._enqueue(params, key, future, config)
+        else:
+            self.requests += 1
+            self._spawn(self._send_one(params, key, future, config))
+        return await asyncio.shield(future)
+
+    def _spawn(self, coroutine: Coroutine):
+        """Run coroutine as a task that is kept referenced until it is done"""
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"EE GraphQL request task failed: {task.exception()!r}")
+
+    def _forget(self, key: Tuple[str, str, str], future: asyncio.Future):
+        if self._results.get(key) is future:
+            del self._results[key]
+
+    def _resolve(self, key: Tuple[str, str, str], future: asyncio.Future, text: str, has_errors: bool):
+        if has_errors:
+            # Let a later request for the same variant try again
+            self._forget(key, future)
+        if not future.done():
+            future.set_result(text)
+
+    def _cached(self, key: Tuple[str, str, str], config: Dict[str, Any]) -> Optional[str]:
+        """Cached response of a request about to be batched, as fetch_url would find it"""
+        if not (config.get("save_local", True) and config.get("save_raw_products", True)):
+            return None
+        cache_key = graphql_cache_key(key)
+        entry = request_cache.lookup(cache_key)
+        if entry is None:
+            return None
+        frontier_item = current_frontier_item.get()
+        if not entry.is_fresh(config.get("cache_ttl", {}).get("graphql")) and not (
+            frontier_item is not None and frontier_item[0].subrequest_done(frontier_item[1], cache_key)
+        ):
+            return None
+        cached = request_cache.read(entry)
+        if cached is not None:
+            metrics.inc("cache_requests_total", content_type="graphql", result="hit")
+        return cached
+
+    def _store(self, key: Tuple[str, str, str], text: str, frontier_item: Any, config: Dict[str, Any]):
+        """Cache one result of a batch under its own key"""
+        if not (config.get("save_local", True) and config.get("save_raw_products", True)):
+            return
+        cache_key = graphql_cache_key(key)
+        metrics.inc("cache_requests_total", content_type="graphql", result="miss")
+        request_cache.put(
+            cache_key, text, "graphql", self.ENDPOINT, "POST",
+            codec=resolve_cache_codec(config),
+            compression_level=config.get("cache_compression_level", 3),
+            use_dictionary=config.get("cache_zstd_dictionaries", True),
+            tag=key[1]
+        )
+        request_cache.evict(config.get("cache_max_bytes"))
+        if frontier_item is not None:
+            frontier_item[0].record_subrequest(frontier_item[1], cache_key)
+
+    def _enqueue(self, params: dict, key: Tuple[str, str, str], future: asyncio.Future, config: Dict[str, Any]):
+        self._queue.append((params, key, future, current_frontier_item.get(), config))
+        if len(self._queue) >= config.get("graphql_batch_size", 1):
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                config.get("graphql_batch_window", 0.02), self._flush
+            )
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._queue = self._queue, []
+        if batch:
+            self._spawn(self._send_batch(batch))
+
+    async def _send_one(self, params: dict, key: Tuple[str, str, str], future: asyncio.Future,
+                        config: Dict[str, Any]):
+        cache_key = graphql_cache_key(key)
+        try:
+            result = await fetch_url(
+                self.ENDPOINT, content_type="graphql", params=params, headers=self.headers, config=config,
+                cache_key=cache_key, cache_tag=key[1]
+            )
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        has_errors = graphql_errors(result)
+        if has_errors:
+            # fetch_url cached it like any 200 answer
+            request_cache.delete(cache_key)
+        self._resolve(key, future, result, has_errors)
+
+    async def _send_batch(self, batch: List[Tuple[dict, Tuple[str, str, str], asyncio.Future, Any, Dict[str, Any]]]):
+        if len(batch) == 1:
+            params, key, future, frontier_item, config = batch[0]
+            current_frontier_item.set(frontier_item)
+            return await self._send_one(params, key, future, config)
+        payload = [
+            {
+                "operationName": params["operationName"],
+                "variables": json.loads(params["variables"]),
+                "extensions": json.loads(params["extensions"]),
             }
-            query_string = urllib.parse.urlencode(params)
-            api_url_varites = f"https://ee.co.uk/graphql?{query_string}"
-
-            url_varites = f"https://ee.co.uk/graphql?{baseDeviceSeoId}_{color}_{capacity}'"
-            response_varites = await fetch_url(url_varites, content_type="product", params=params, headers=headers)
-
-            if response_varites:
-
-                data_varites_json = json.loads(response_varites)
-
-                data_product = data_varites_json["data"]["deviceBundle"]["product"]
-                try:
-                    first_combo = data_varites_json["data"]["deviceBundle"]["productPlanCombinations"][0]
-                    handsetOnlyCostCash = first_combo["productPrice"]["payTodayPrice"]
-                    maxLoanUpfrontCostPercentage = data_varites_json["data"]["guidedSellingConfig"]["maxLoanUpfrontCostPercentage"]
-                    maxUpfront = int(handsetOnlyCostCash * (maxLoanUpfrontCostPercentage / 100))
-                    minLoanUpfrontCostPercentage = first_combo["productPrice"].get("minimumPayTodayPrice", 0.0)
-
-                    phoneContractDurations = first_combo["productPrice"].get("availableSubscriptionTermsInMonths", [1])
-                except:
-                    handsetOnlyCostCash = 0
-                    phoneContractDurations = [1]
-                    minLoanUpfrontCostPercentage = 0.0
-                    maxUpfront = 0.0
-
-                row["source"] = "EE"
-                row["date"] = datetime.now().strftime("%Y-%m-%d")
-                row["apiURL"] = api_url_varites
-                row["url"] = url
-                row["sku"] = data_product["code"]
-                row["name"] = data_product["name"]
-                row["brand"] = data_product["manufacturer"]
-                row["stock"] = "Y" if data_product["stock"]["message"] == "In stock" else "N"
-                if row["stock"] == "Y":
-                    row["desc"] = data_product["baseDeviceShortDescription"]
-                    row["shortDesc"] = data_product["seoTitle"]
-                    row["videoURL"] = ""
-                    row["lowestPriceValue"] = ""
-                    row["reviewRating"] = ""
-                    row["reviewCount"] = ""
-                    row["onSale"] = ""
-                    row["colour"] = color
-                    row["size"] = capacity
-                    row["UPC"] = ""
-                    row["EAN"] = ""
-                    row["cat"] = url.split("/")[3]
-                    row["subcat1"] = url.split("/")[4]
-                    row["subcat2"] = url.split("/")[5]
-                    row["subcat3"] = url.split("/")[6] if len(url.split("/")) > 6 else ""
-                    row["subcat4"] = url.split("/")[7] if len(url.split("/")) > 7 else ""
-                    row["subcat5"] = url.split("/")[8] if len(url.split("/")) > 8 else ""
-                    row["warranty"] = ""
-                    row["isSellingFast"] = ""
-                    row["isRestockingSoon"] = ""
-                    row["isPromotion"] = ""
-                    row["isOutletPrice"] = ""
-                    row["lowestPriceText"] = ""
-                    images = []
-                    for img in data_product["images"]:
-                        for fmt in img["formats"]:
-                            if fmt["mimeType"] == "image/webp":
-                                images.append(fmt["url"])
-                                if len(images) == 5:
-                                    break
-                        if len(images) == 5:
-                            break
-                    for i in range(5):
-                        row[f"image{i + 1}"] = images[i] if i < len(images) else ""
-                    row["saleText"] = ""
-                    row["handsetOnlyCostCash"] = handsetOnlyCostCash if handsetOnlyCostCash else ""
-                    row["previousPrice"] = ""
-
-                    for term in phoneContractDurations:
-                        if data_varites_json["data"]["deviceBundle"].get("productPlanCombinations", []):
-                            upfronts = generate_steps(minLoanUpfrontCostPercentage, maxUpfront)
-                            if not upfronts:
-                                upfronts = [0]
-
-                            for advance in upfronts:
-
-                                for combo in data_varites_json["data"]["deviceBundle"].get("productPlanCombinations", []):
-                                    plan = combo.get("plan")
-                                    row["phoneContractDuration"] = "" if term == 1 else term
-                                    row["handsetOnlyCostCash"] = handsetOnlyCostCash
-                                    row["advance"] = advance
-                                    paymentAmount = round((handsetOnlyCostCash-advance) / term, 2)
-                                    row["phoneContractPrice"] = handsetOnlyCostCash
-                                    row["paymentAmount"] = paymentAmount
-
-                                    plan_type = "contract"
-                                    sim_data = ""
-                                    for ent in plan.get("entitlements", []):
-                                        if ent.get("code") == "ME_DATA_MB":
-                                            qty = ent.get("quantity", 0)
-                                            if qty == -1:
-                                                sim_data = "Unlimited"
-                                            else:
-                                                sim_data = f"{int(qty / 1000)}GB"
-                                    sim_price = plan.get("price", {}).get("payMonthlyPrice")
-                                    simOfferData = "" if  plan.get("price", {}).get("wasPayMonthlyPrice") == 0.0 else plan.get("price", {}).get("wasPayMonthlyPrice")
-                                    simContractname = plan.get("name")
-                                    simContractDuration = plan.get("price", {}).get("subscriptionTermInMonths", 0)
-                                    isPhoneContractAvailableWOsim = "N"
-                                    phoneContractPrice = 0
-                                    phoneContractSimPackage =  phoneContractPrice +  (simContractDuration * sim_price)
-                                    handsetOnlyContract =  ""
-                                    future_prices = plan.get("price", {}).get("futurePrices", [])
-
-                                    sim1YearIncrease = ""
-                                    sim2YearIncrease = ""
-                                    sim3YearIncrease = ""
-
-                                    if len(future_prices) > 0:
-                                        sim1YearIncrease = future_prices[0].get("price", "")
-                                    if len(future_prices) > 1:
-                                        sim2YearIncrease = future_prices[1].get("price", "")
-                                    if len(future_prices) > 2:
-                                        sim3YearIncrease = future_prices[2].get("price", "")
-
-
-                                    plan_family = plan.get("planFamily", {})
-                                    features = [f.get("name", "") for f in plan_family.get("features", [])]
-                                    special = [s.get("name", "") for s in plan_family.get("specialFeatures", [])]
-
-                                    simDesc = plan.get("summary", "")
-                                    if features:
-                                        simDesc += " | Features: " + "".join(features)
-                                    if special:
-                                        simDesc += " | Special: " + "".join(special)
-
-
-                                    row["plan_type"] = plan_type
-                                    row["sim_data"] = sim_data
-                                    row["sim_price"] = sim_price
-                                    row["simOfferData"] = simOfferData
-                                    row["simContractname"] = simContractname
-                                    row["simContractDuration"] = simContractDuration
-                                    row["isPhoneContractAvailableWOsim"] = isPhoneContractAvailableWOsim
-                                    row["phoneContractSimPackage"] = phoneContractSimPackage
-                                    row["handsetOnlyContract"] = handsetOnlyContract
-                                    row["sim1YearIncrease"] = sim1YearIncrease
-                                    row["sim2YearIncrease"] = sim2YearIncrease
-                                    row["sim3YearIncrease"] = sim3YearIncrease
-                                    row["simDesc"] = simDesc
-
-                                    attribute_index = 1
-
-                                    for feature in data_product.get("features", []):
-                                        title = feature.get("assistiveText", "").strip()
-                                        description = feature.get("name", "").strip()
-
-                                        row[f"attributeType{attribute_index}"] = "SPECIFICATION"
-                                        row[f"attributeTitle{attribute_index}"] = title
-                                        row[f"attributeValue{attribute_index}"] = description.upper()
-                                        attribute_index += 1
-                                    append_to_csv(row, "products.csv")
-
-                        else:
-
-                            row["phoneContractDuration"] = ""
-                            row["handsetOnlyCostCash"] = handsetOnlyCostCash if handsetOnlyCostCash else ""
-                            row["advance"] = 0.0
-                            row["phoneContractPrice"] = 0.0
-                            row["paymentAmount"] = 0.0
-                            row["plan_type"] = ""
-                            row["sim_data"] = ""
-                            row["sim_price"] = ""
-                            row["simOfferData"] = ""
-                            row["simContractname"] = ""
-                            row["simContractDuration"] = 0
-                            row["isPhoneContractAvailableWOsim"] = "N"
-                            row["phoneContractSimPackage"] = 0
-                            row["handsetOnlyContract"] = ""
-                            row["sim1YearIncrease"] = ""
-                            row["sim2YearIncrease"] = ""
-                            row["sim3YearIncrease"] = ""
-                            row["simDesc"] = ""
-                            attribute_index = 1
-                            for feature in data_product.get("features", []):
-                                title = feature.get("assistiveText", "").strip()
-                                description = feature.get("name", "").strip()
-
-                                row[f"attributeType{attribute_index}"] = "SPECIFICATION"
-                                row[f"attributeTitle{attribute_index}"] = title
-                                row[f"attributeValue{attribute_index}"] = description.upper()
-                                attribute_index += 1
-
-
-                            append_to_csv(row, "products.csv")
+            for params, _, _, _, _ in batch
+        ]
+        try:
+            # Not cached as a whole: each result is cached under its own key below
+            response = await fetch_url(
+                self.ENDPOINT, method="POST", json_data=payload, headers=self.headers, content_type="graphql_batch",
+                config=batch[0][4], final_client_errors=True
+            )
+            results = json.loads(response)
+            if not isinstance(results, list) or len(results) != len(batch):
+                raise ValueError("batch answered without a list of results")
+        except (FetchStatusError, ValueError) as e:
+            if self._batching:
+                logger.warning(f"EE GraphQL batching turned off ({e}); sending queries one by one")
+            self._batching = False
+            await asyncio.gather(*(self._send_alone(*pending) for pending in batch))
+            return
+        except Exception as e:
+            for _, _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        for (_, key, future, frontier_item, config), result in zip(batch, results):
+            text = json.dumps(result)
+            has_errors = not isinstance(result, dict) or bool(result.get("errors"))
+            if not has_errors:
+                self._store(key, text, frontier_item, config)
+            self._resolve(key, future, text, has_errors)
+
+    async def _send_alone(self, params: dict, key: Tuple[str, str, str], future: asyncio.Future,
+                          frontier_item: Any, config: Dict[str, Any]):
+        # Runs as its own task under gather, so the frontier item only applies to this request
+        current_frontier_item.set(frontier_item)
+        await self._send_one(params, key, future, config)
+
+    def log_stats(self):
+        logger.info(
+            f"EE GraphQL: {self.requests} queries sent ({self.batches} batches), "
+            f"{self.deduplicated} duplicates served from earlier calls"
+        )
+
+graphql = EEGraphQLClient(GRAPHQL_HEADERS)
+
+def log_graphql_cache_stats(config: Dict[str, Any] = None):
+    """Log the size of the GraphQL response cache per persisted query hash"""
+    if config is None:
+        config = DEFAULT_CONFIG
+    ttl = config.get("cache_ttl", {}).get("graphql")
+    stats = request_cache.tag_stats("graphql")
+    if not stats:
+        logger.info("GraphQL cache is empty")
+    for sha256_hash, entry in sorted(stats.items(), key=lambda item: -item[1]["bytes"]):
+        fresh_until = entry["newest"] + ttl if ttl is not None else None
+        logger.info(
+            f"GraphQL cache {sha256_hash}: {entry['entries']} entries, "
+            f"{entry['bytes'] / 1024 ** 2:.1f} MB on disk ({entry['raw_bytes'] / 1024 ** 2:.1f} MB raw), "
+            + (f"newest fresh until {time.strftime('%Y-%m-%d %H:%M', time.localtime(fresh_until))}"
+               if fresh_until is not None else "never expires")
+        )
+
+def invalidate_graphql_cache(sha256_hash: str) -> int:
+    """Drop the cached responses of a persisted query, e.g. after EE rotated its hash"""
+    removed = request_cache.delete_tagged(sha256_hash, content_type="graphql")
+    logger.info(f"Removed {removed} cached GraphQL responses of query {sha256_hash}")
+    return removed
+
+def variant_query(url: str, baseDeviceSeoId: str, color: str, capacity: str, size: str) -> Optional[dict]:
+    """GET params of the persisted GraphQL query for one variant, by product family of url"""
+    params = None
+    if capacity and not "tablet" in url:
+        params = {
+            'operationName': 'FlexPayProductDetailsQuery',
+            'variables': f'{{"deviceBundleBySeoInput":{{"bundleSeoId":"pay-monthly-phones","baseProductSeoId":"{baseDeviceSeoId}","dimensions":[{{"key":"capacity","value":"{capacity}"}},{{"key":"color","value":"{color}"}}]}}}}',
+            'extensions': '{"persistedQuery":{"version":1,"sha256Hash":"74a0a54b03ccd740c5a3e7f5767146b2a10a7f45e5874074328b1b63fb61f59e"}}',
+        }
+    elif "broadband" in url:
+
+        params = {
+            'operationName': 'FlexPayProductDetailsQuery',
+            'variables': f'{{"deviceBundleBySeoInput":{{"bundleSeoId":"pay-monthly-mobile-broadband","baseProductSeoId":"{baseDeviceSeoId}","dimensions":[{{"key":"color","value":"{color}"}}]}}}}',
+            'extensions': '{"persistedQuery":{"version":1,"sha256Hash":"74a0a54b03ccd740c5a3e7f5767146b2a10a7f45e5874074328b1b63fb61f59e"}}',
+        }
+    elif "wearables" in url:
+        params = {
+            'operationName': 'ProductDetailsQuery',
+            'variables': f'{{"deviceBundleBySeoInput":{{"bundleSeoId":"pay-monthly-{url.split("pay-monthly-")[1].split("-gallery")[0]}","baseProductSeoId":"{baseDeviceSeoId}","dimensions":[{{"key":"watchScreenSize","value":"{size}"}},{{"key":"color","value":"{color}"}}]}}}}',
+            'extensions': '{"persistedQuery":{"version":1,"sha256Hash":"4d049d3a7d5913eac7aa4467610512496e76cad121b46e896f143f50594c2846"}}',
+        }
+    elif "computing-tablets" in str(url):
+
+        params = {
+            'operationName': 'FlexPayProductDetailsQuery',
+            'variables': f'{{"deviceBundleBySeoInput":{{"bundleSeoId":"add-pay-monthly-tablets","baseProductSeoId":"{baseDeviceSeoId}","dimensions":[{{"key":"capacity","value":"{capacity}"}},{{"key":"color","value":"{color}"}}]}}}}',
+            'extensions': '{"persistedQuery":{"version":1,"sha256Hash":"4d049d3a7d5913eac7aa4467610512496e76cad121b46e896f143f50594c2846"}}',
+        }
+    return params
+
+async def fetch_single_product(url: str, config: Dict[str, Any] = None):
+    if config is None:
+        config = DEFAULT_CONFIG
+
+    response = await fetch_url(url, content_type="product", config=config)
+
+    baseDeviceSeoId, variants = await run_parse(parse_product_page, response)
+
+    async def variant_rows(variant):
+        color, capacity, size = variant
+        params = variant_query(url, baseDeviceSeoId, color, capacity, size)
+        if params is None:
+            logger.warning(f"No EE GraphQL query for {url} ({color}, {capacity}, {size})")
+            return []
+        query_string = urllib.parse.urlencode(params)
+        api_url_varites = f"https://ee.co.uk/graphql?{query_string}"
+
+        response_varites = await graphql.query(params, config)
+
+        if response_varites:
+            return await run_parse(build_variant_rows, url, color, capacity, api_url_varites, response_varites)
+        return []
+
+    for rows in await gather_subrequests(url, variants, variant_rows, config):
+        for row in rows:
+            yield row
 
 
 
@@ -349,43 +563,39 @@ async def get_products_from_sitemap(urls: list[str]) -> list:
     return products
 
 
+class EESite(SiteScraper):
+    name = "EE"
+    site_url = "https://ee.co.uk"
+    sitemap_url = "https://ee.co.uk/sitemap-shop-hybris.xml"
 
-async def extact_data_from_product_url(all_product_urls: list[str]):
-    tasks = []
-    total_urls = len(all_product_urls)
-
-    with tqdm(total=total_urls, desc="Processing product URLs", ncols=100) as pbar:
-        for url in all_product_urls:
-            task = asyncio.create_task(wrapped_fetch(url))
-            tasks.append(task)
-            pbar.update(1)
-            if len(tasks) >= DEFAULT_WORKERS:
-                await tasks.pop(0)
-
-    for task in tasks:
-        await task
-
-
-
-async def wrapped_fetch(url):
-    try:
-        await fetch_single_product(url)
-    except Exception as e:
-        logger = logging.getLogger("scraper")
-        logger.warning(f"Failed to fetch {url}: {e}")
-
-
-
-
+    async def discover(self):
+        async for entry in iter_sitemap(self.sitemap_url, self.config):
+            yield entry
 
+    def rows(self, url: str):
+        return fetch_single_product(url, self.config)
 
 
 async def main():
-    create_csv_file("products.csv")
-    siteurl = "https://ee.co.uk/sitemap-shop-hybris.xml"
-    products  = await fetch_sitemap(siteurl)
-    data = await extact_data_from_product_url(products)
+    await run_site_scraper(EESite())
+    graphql.log_stats()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Scrape EE products")
+    parser.add_argument(
+        "--graphql-cache-stats", action="store_true",
+        help="Report the size of the GraphQL response cache per query hash and exit"
+    )
+    parser.add_argument(
+        "--invalidate-query-hash", action="append", default=[], metavar="SHA256",
+        help="Drop the cached GraphQL responses of a persisted query hash and exit (repeatable)"
+    )
+    args = parse_script_args(parser=parser)
+    if args.graphql_cache_stats or args.invalidate_query_hash:
+        for sha256_hash in args.invalidate_query_hash:
+            invalidate_graphql_cache(sha256_hash)
+        if args.graphql_cache_stats:
+            log_graphql_cache_stats()
+    else:
+        asyncio.run(main())
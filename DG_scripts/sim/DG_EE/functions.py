@@ -5,14 +5,56 @@ import random
 import asyncio
 import re
 import csv
+import time
+import hashlib
+import sqlite3
+import os
+import io
+import gzip
+import zlib
+import argparse
+import contextvars
+import types
+import sys
+import threading
 import httpx
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 from datetime import date, datetime
 from pathlib import Path
 from typing import *
-#from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer
 import xml.etree.ElementTree as ET
 from tqdm.asyncio import tqdm_asyncio as tqdm
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import lxml
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 # Constants
 MIN_WAIT = 1.0
@@ -24,7 +66,12 @@ DATA_DIR = Path("data")
 SITEMAPS_DIR = DATA_DIR / "sitemaps"
 CATEGORIES_DIR = DATA_DIR / "categories"
 PRODUCTS_DIR = DATA_DIR / "products"
+GRAPHQL_DIR = DATA_DIR / "graphql"
 OUTPUTS_DIR = DATA_DIR / "outputs"
+CACHE_INDEX_PATH = DATA_DIR / "cache.sqlite"
+CACHE_DICTS_DIR = DATA_DIR / "cache_dicts"
+CRAWL_STATE_PATH = DATA_DIR / "crawl_state.sqlite"
+FRONTIER_PATH = DATA_DIR / "frontier.sqlite"
 
 # Configuration defaults
 DEFAULT_CONFIG = {
@@ -37,12 +84,99 @@ DEFAULT_CONFIG = {
     "scrape_products_only": False,
     "stream_output": True,
     "workers": 3,
-    "min_delay": 1.0,
-    "max_delay": 3.0,
     "max_retries": 1,
-    "source_name": "generic"
+    "source_name": "generic",
+    "http2": True,
+    "timeout": 30.0,
+    "max_connections_per_host": 10,
+    "max_keepalive_per_host": 10,
+    "keepalive_expiry": 30.0,
+    # Send the requests of a host to another base URL, e.g. {"ee.co.uk": "http://127.0.0.1:8080"}
+    # for a local stand-in server; the Host header keeps the original host
+    "host_overrides": {},
+    # Raw cache freshness in seconds per content type (None = never expires)
+    "cache_ttl": {
+        "sitemap": 6 * 3600,
+        "category": 24 * 3600,
+        "product": 20 * 3600,
+        # GraphQL responses, cached per persisted query and variables (see fetch_url cache_key)
+        "graphql": 6 * 3600,
+    },
+    "cache_max_bytes": 5 * 1024 ** 3,
+    # Revalidate expired entries with If-None-Match/If-Modified-Since instead of refetching
+    "cache_revalidate": True,
+    # "zstd" (falls back to gzip when zstandard is not installed), "gzip" or None
+    "cache_compression": "zstd",
+    "cache_compression_level": 3,
+    # Train a zstd dictionary per site from its first small responses
+    "cache_zstd_dictionaries": True,
+    # Output sinks flush every output_batch_size rows or output_flush_interval seconds
+    "output_batch_size": 1000,
+    "output_flush_interval": 5.0,
+    # "csv", "parquet" or "both"; Parquet output needs pyarrow
+    "output_format": "csv",
+    "parquet_row_group_size": 50000,
+    # Child sitemaps of a sitemap index fetched at once, and parsed entries buffered ahead of consumers
+    "sitemap_concurrency": 4,
+    "sitemap_queue_size": 1000,
+    # Product pages processed at once per site (sliding window, see run_bounded)
+    "concurrency": {
+        "default": 3,
+        "ee.co.uk": 4,
+        "mozillion.com": 4,
+        "phones.lebara.co.uk": 4,
+    },
+    # Worker processes for page parsing and row building (0 = parse on the event loop,
+    # None = one per core), and parse jobs in flight before fetches wait (None = 2 per worker)
+    "parse_workers": 0,
+    "parse_queue_size": None,
+    # HTML backend: "auto" (selectolax, then lxml, then html.parser), "selectolax", "lxml" or "html.parser"
+    "html_parser": "auto",
+    # Let BeautifulSoup backends build only the subtrees a script asks for
+    "html_parse_scope": True,
+    # Only fetch URLs that are new or whose sitemap <lastmod> changed; the rest reuse
+    # their rows from the last scrape, up to incremental_max_age seconds old
+    "incremental": False,
+    "incremental_max_age": 7 * 24 * 3600,
+    # Continue the last run of a site from its checkpointed frontier, written every checkpoint_interval seconds
+    "resume": False,
+    "checkpoint_interval": 30,
+    # Seconds between compactions of the deduplicated outputs during run_scraper
+    "dedup_checkpoint_interval": 300,
+    # Write <site>_metrics.prom (Prometheus textfile) and <site>_metrics.json at the end of a run,
+    # into metrics_dir (default: OUTPUTS_DIR)
+    "metrics": True,
+    "metrics_dir": None,
+    # Sample the event loop thread every profile_interval seconds and write per-stage
+    # collapsed stacks to OUTPUTS_DIR (see StageProfiler)
+    "profile": False,
+    "profile_interval": 0.005,
+    # Upfront steps of plan prices: "rows" writes a row per plan and step, "table" one row per
+    # plan (no upfront) plus a narrow upfront/payment table next to the output (DG_mozillion)
+    "advance_grid": "rows",
+    # Sub-requests of a product (e.g. variant lookups) run at once per product, and across all
+    # products of a host (see gather_subrequests); the rate limits still apply to each request
+    "subrequest_concurrency": {
+        "default": {"per_product": 4, "global": 8},
+    },
+    # EE GraphQL variant queries sent per batched POST (1 sends each as its own GET), and how long
+    # a partial batch waits for more queries (see EEGraphQLClient in DG_EE)
+    "graphql_batch_size": 1,
+    "graphql_batch_window": 0.02,
+    # Per-host token buckets: "rate" requests per second, bursts of up to
+    # "burst" requests. Hosts match on domain suffix; "default" covers the rest.
+    "rate_limits": {
+        "default": {"rate": 1.0, "burst": 2},
+        "ee.co.uk": {"rate": 2.0, "burst": 4},
+        "mozillion.com": {"rate": 2.0, "burst": 4},
+        "phones.lebara.co.uk": {"rate": 2.0, "burst": 4},
+    }
 }
 
+# Sitemap protocol namespace
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+SITEMAP_CHUNK_SIZE = 64 * 1024
+
 # ScrapingBee configuration
 SCRAPINGBEE_URL = "https://app.scrapingbee.com/api/v1/"
 
@@ -58,6 +192,24 @@ STANDARD_CSV_HEADERS = [
     "image3", "image4", "image5", "desc", "reviewCount", "reviewRating"
 ] + [f"attributeTitle{i}" for i in range(1, 21)] + [f"attributeValue{i}" for i in range(1, 21)] + [f"attributeType{i}" for i in range(1, 21)]
 
+# SIM / handset contract schema shared by the DG_* site scripts
+DG_CSV_HEADERS = [
+    "source", "date", "apiURL", "url", "sku", "name", "brand", "stock",
+    "advance", "paymentAmount", "phoneContractDuration", "sim_price", "simContractname", "simContractDuration",
+    "phoneContractPrice", "isPhoneContractAvailableWOsim", "phoneContractSimPackage", "handsetOnlyCostCash",
+    "handsetOnlyContract", "previousPrice", "onSale", "saleText",
+    "plan_type", "sim_data", "simOfferData", "sim1YearIncrease", "sim2YearIncrease", "sim3YearIncrease", "simDesc",
+    "colour", "size", "UPC", "EAN",
+    "cat", "subcat1", "subcat2", "subcat3", "subcat4", "subcat5", "warranty",
+    "image1", "image2", "image3", "image4", "image5", "desc", "shortDesc",
+    "reviewCount", "reviewRating", "videoURL", "isSellingFast",
+    "isRestockingSoon", "isPromotion", "isOutletPrice", "lowestPriceText",
+    "lowestPriceValue"
+] + [f"attribute{kind}{i}" for i in range(1, 21) for kind in ("Type", "Title", "Value")]
+
+# Columns stored as float64 in columnar output; everything else is a dictionary-encoded string
+NUMERIC_OUTPUT_FIELDS = ["advance", "paymentAmount", "sim_price", "handsetOnlyCostCash"]
+
 # Setup logging
 logger = logging.getLogger("scraper")
 
@@ -92,7 +244,7 @@ def setup_logger(log_file=None):
 
 def ensure_data_dirs():
     """Create necessary data directories"""
-    for directory in [SITEMAPS_DIR, CATEGORIES_DIR, PRODUCTS_DIR, OUTPUTS_DIR]:
+    for directory in [SITEMAPS_DIR, CATEGORIES_DIR, PRODUCTS_DIR, GRAPHQL_DIR, OUTPUTS_DIR]:
         directory.mkdir(parents=True, exist_ok=True)
     
     logger.info("Data directories created")
@@ -117,18 +269,903 @@ def get_random_headers():
         "upgrade-insecure-requests": "1",
     }
 
-def get_cache_path(url: str, content_type: str) -> Path:
-    """Get the cache path for a URL based on content type"""
-    safe_filename = re.sub(r'[^\w\-.]', '_', url)
-    if len(safe_filename) > 200:
-        safe_filename = safe_filename[:190]
+class HostOverrideTransport(httpx.AsyncBaseTransport):
+    """Sends every request to the scheme, host and port of target, keeping its Host header and path"""
+
+    def __init__(self, target: str, transport: httpx.AsyncBaseTransport):
+        self.target = httpx.URL(target)
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = request.url.copy_with(scheme=self.target.scheme, host=self.target.host, port=self.target.port)
+        forwarded = httpx.Request(
+            request.method, url, headers=request.headers, stream=request.stream, extensions=request.extensions
+        )
+        return await self.transport.handle_async_request(forwarded)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+class HttpClientManager:
+    """
+    Long-lived pool of httpx.AsyncClient instances, one per host.
+
+    Clients are created lazily on first use and reused for every request
+    of the run, so connections (and HTTP/2 streams) are kept alive instead
+    of paying a TCP+TLS handshake per request. Call close() once at shutdown.
+
+    The clients keep no cookies: a Set-Cookie from one request is never
+    sent with the next, so each request carries exactly the cookies its
+    caller puts in its headers, as with a fresh client per request.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get_client(self, url: str, config: Dict[str, Any] = None) -> httpx.AsyncClient:
+        """Return the shared client for the host of url, creating it if needed"""
+        if config is None:
+            config = DEFAULT_CONFIG
+
+        host = httpx.URL(url).host
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            limits = httpx.Limits(
+                max_connections=config.get("max_connections_per_host", 10),
+                max_keepalive_connections=config.get("max_keepalive_per_host", 10),
+                keepalive_expiry=config.get("keepalive_expiry", 30.0),
+            )
+            http2 = config.get("http2", True) and HTTP2_AVAILABLE
+            override = get_host_setting(config, "host_overrides", url)
+            if override:
+                transport = HostOverrideTransport(override, httpx.AsyncHTTPTransport(http2=http2, limits=limits))
+                client = httpx.AsyncClient(
+                    transport=transport, timeout=config.get("timeout", 30.0), cookies=self._cookieless_jar()
+                )
+                logger.info(f"Sending requests for {host} to {override}")
+            else:
+                client = httpx.AsyncClient(
+                    http2=http2, limits=limits, timeout=config.get("timeout", 30.0), cookies=self._cookieless_jar()
+                )
+            self._clients[host] = client
+            logger.debug(f"Opened HTTP client for {host} (http2={http2})")
+        return client
+
+    @staticmethod
+    def _cookieless_jar() -> CookieJar:
+        """Cookie jar that refuses every cookie (response.cookies still shows what the server set)"""
+        return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+    async def close(self):
+        """Close every pooled client"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+http_clients = HttpClientManager()
+
+def get_http_client(url: str, config: Dict[str, Any] = None) -> httpx.AsyncClient:
+    """Get the pooled client for the host of url"""
+    return http_clients.get_client(url, config)
+
+async def close_http_clients():
+    """Shutdown hook: close all pooled HTTP clients at the end of a run"""
+    await http_clients.close()
+
+def get_host_setting(config: Dict[str, Any], key: str, url: str, default: Any = None) -> Any:
+    """
+    Look up a per-host entry in a config mapping such as config["rate_limits"].
+
+    A host matches an entry when it equals the entry name or is a subdomain
+    of it; the "default" entry is used when nothing else matches.
+    """
+    settings = config.get(key) or {}
+    host = httpx.URL(url).host
+    for name, value in settings.items():
+        if name != "default" and (host == name or host.endswith("." + name)):
+            return value
+    return settings.get("default", default)
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, holding at most `burst`.
+
+    acquire() takes a token immediately while the budget allows it; once the
+    bucket is empty, callers queue up by borrowing against future tokens and
+    sleep only for the time it takes their token to be refilled.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+class HostRateLimiter:
+    """One TokenBucket per host, configured from config["rate_limits"]"""
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    async def wait(self, url: str, config: Dict[str, Any] = None):
+        """Wait until the host of url has budget for one more request"""
+        if config is None:
+            config = DEFAULT_CONFIG
+
+        limit = get_host_setting(config, "rate_limits", url)
+        if not limit:
+            return
+
+        host = httpx.URL(url).host
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(limit.get("rate", 1.0), limit.get("burst", 1))
+            self._buckets[host] = bucket
+        await bucket.acquire()
+
+rate_limiter = HostRateLimiter()
+
+def request_fingerprint(
+    url: str,
+    method: str = "GET",
+    params: Optional[Dict[str, str]] = None,
+    data: Optional[Union[Dict[str, Any], str]] = None,
+    json_data: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Hash everything that identifies a request: method, full URL with params, and body.
+
+    The result is the content address used as the cache key, so POSTs with
+    different bodies and URLs that only differ past any length limit never collide.
+    """
+    full_url = httpx.URL(url)
+    if params:
+        full_url = full_url.copy_merge_params(params)
+    fingerprint = {
+        "method": method.upper(),
+        "url": str(full_url),
+        "data": data,
+        "json": json_data,
+    }
+    payload = json.dumps(fingerprint, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+CODEC_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
 
+def get_cache_path(key: str, content_type: str, codec: Optional[str] = None) -> Path:
+    """Get the cache path for a request fingerprint based on content type and compression"""
+    suffix = CODEC_SUFFIXES.get(codec, "")
+    # Shard on the first two hex digits so no directory grows past a few thousand files
     if content_type == "sitemap":
-        return SITEMAPS_DIR / f"{safe_filename}.xml"
+        return SITEMAPS_DIR / key[:2] / f"{key}.xml{suffix}"
     elif content_type == "category":
-        return CATEGORIES_DIR / f"{safe_filename}.html"
+        return CATEGORIES_DIR / key[:2] / f"{key}.html{suffix}"
+    elif content_type == "graphql":
+        return GRAPHQL_DIR / key[:2] / f"{key}.json{suffix}"
     else:  # product
-        return PRODUCTS_DIR / f"{safe_filename}.html"
+        return PRODUCTS_DIR / key[:2] / f"{key}.html{suffix}"
+
+def resolve_cache_codec(config: Dict[str, Any] = None) -> Optional[str]:
+    """Compression codec to use for new cache entries"""
+    if config is None:
+        config = DEFAULT_CONFIG
+    codec = config.get("cache_compression")
+    if codec == "zstd" and zstandard is None:
+        return "gzip"
+    return codec
+
+class ZstdDictionaries:
+    """
+    Per-site zstd dictionaries for the cache.
+
+    The first small responses of each host are kept as training samples;
+    once enough are collected a dictionary is trained and saved under
+    data/cache_dicts, and later small bodies from that host compress against
+    it. Dictionaries are identified by "<host>-<zstd dict id>" so entries
+    always decompress with the dictionary they were written with.
+    """
+
+    MAX_SAMPLE_BYTES = 64 * 1024
+    SAMPLES_TO_TRAIN = 100
+    DICT_SIZE = 112 * 1024
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._by_id: Dict[str, Any] = {}
+        self._by_host: Dict[str, Optional[str]] = {}
+        self._samples: Dict[str, List[bytes]] = defaultdict(list)
+
+    def load(self, dict_id: str):
+        """Return the dictionary with the given id"""
+        if dict_id not in self._by_id:
+            raw = (self.directory / f"{dict_id}.zdict").read_bytes()
+            self._by_id[dict_id] = zstandard.ZstdCompressionDict(raw)
+        return self._by_id[dict_id]
+
+    def for_host(self, host: str) -> Optional[str]:
+        """Id of the current dictionary of host, if one has been trained"""
+        if host not in self._by_host:
+            existing = sorted(self.directory.glob(f"{host}-*.zdict"), key=lambda p: p.stat().st_mtime)
+            self._by_host[host] = existing[-1].stem if existing else None
+        return self._by_host[host]
+
+    def observe(self, host: str, body: bytes) -> Optional[str]:
+        """
+        Record a body as a training sample and return the dictionary id to
+        compress it with, training the host dictionary when enough samples exist.
+        """
+        if len(body) > self.MAX_SAMPLE_BYTES:
+            return None
+
+        dict_id = self.for_host(host)
+        if dict_id is not None:
+            return dict_id
+
+        samples = self._samples[host]
+        samples.append(body)
+        if len(samples) < self.SAMPLES_TO_TRAIN:
+            return None
+
+        del self._samples[host]
+        try:
+            trained = zstandard.train_dictionary(self.DICT_SIZE, samples)
+        except zstandard.ZstdError as e:
+            logger.warning(f"Could not train zstd dictionary for {host}: {e}")
+            return None
+
+        dict_id = f"{host}-{trained.dict_id()}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{dict_id}.zdict").write_bytes(trained.as_bytes())
+        self._by_id[dict_id] = trained
+        self._by_host[host] = dict_id
+        logger.info(f"Trained zstd dictionary {dict_id} from {len(samples)} samples")
+        return dict_id
+
+class CacheEntry:
+    """Index row of a cached response"""
+
+    def __init__(self, key: str, path: str, created_at: float, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, codec: Optional[str] = None,
+                 dict_id: Optional[str] = None):
+        self.key = key
+        self.path = Path(path)
+        self.created_at = created_at
+        self.etag = etag
+        self.last_modified = last_modified
+        self.codec = codec
+        self.dict_id = dict_id
+
+    def is_fresh(self, ttl: Optional[float]) -> bool:
+        """Whether the entry is younger than ttl seconds (a ttl of None never expires)"""
+        return ttl is None or time.time() - self.created_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Revalidation headers built from the stored validators"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class RequestCache:
+    """
+    Content-addressed cache of raw responses.
+
+    Bodies live in sharded files under the per-content-type data directories;
+    a single SQLite index maps each request fingerprint to its file, so lookups
+    stay O(1) however many entries the cache holds. The index also tracks
+    last access for LRU eviction and the ETag/Last-Modified validators used
+    for conditional revalidation. Bodies are compressed with zstd (optionally
+    against a per-site dictionary) or gzip and decompressed as a stream on read.
+    Entries can carry a tag (e.g. the persisted query hash of a GraphQL
+    response) to be reported on and invalidated together.
+    """
+
+    # Column definitions, also used to add columns to indexes created by older versions
+    COLUMNS = {
+        "key": "TEXT PRIMARY KEY",
+        "content_type": "TEXT NOT NULL",
+        "method": "TEXT NOT NULL",
+        "url": "TEXT NOT NULL",
+        "path": "TEXT NOT NULL",
+        "size": "INTEGER NOT NULL",
+        "created_at": "REAL NOT NULL",
+        "accessed_at": "REAL NOT NULL DEFAULT 0",
+        "etag": "TEXT",
+        "last_modified": "TEXT",
+        "codec": "TEXT",
+        "dict_id": "TEXT",
+        "raw_size": "INTEGER",
+        "tag": "TEXT",
+    }
+
+    def __init__(self, index_path: Path, dicts_dir: Path):
+        self.index_path = Path(index_path)
+        self.dictionaries = ZstdDictionaries(dicts_dir)
+        self._db: Optional[sqlite3.Connection] = None
+        self._total_bytes = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.index_path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            columns = ", ".join(f"{name} {ddl}" for name, ddl in self.COLUMNS.items())
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS entries ({columns})")
+            existing = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+            for name, ddl in self.COLUMNS.items():
+                if name not in existing:
+                    self._db.execute(f"ALTER TABLE entries ADD COLUMN {name} {ddl}")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_tag ON entries (tag)")
+            self._db.commit()
+            self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        return self._db
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        """Return the index entry for key, fresh or not"""
+        row = self.db.execute(
+            "SELECT key, path, created_at, etag, last_modified, codec, dict_id FROM entries WHERE key = ?",
+            (key,)
+        ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def open_stream(self, entry: CacheEntry) -> TextIO:
+        """Open the body of an entry as a text stream, decompressing on the fly"""
+        if entry.codec == "zstd":
+            dict_data = self.dictionaries.load(entry.dict_id) if entry.dict_id else None
+            decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+            raw = decompressor.stream_reader(open(entry.path, "rb"), closefd=True)
+            return io.TextIOWrapper(io.BufferedReader(raw), encoding="utf-8")
+        if entry.codec == "gzip":
+            return gzip.open(entry.path, "rt", encoding="utf-8")
+        return open(entry.path, "r", encoding="utf-8")
+
+    def read(self, entry: CacheEntry) -> Optional[str]:
+        """Read the body of an entry and mark it as recently used"""
+        try:
+            with self.open_stream(entry) as f:
+                text = f.read()
+        except FileNotFoundError:
+            # Body was removed behind our back; forget the entry
+            self.delete(entry.key)
+            return None
+
+        self.touch(entry.key)
+        return text
+
+    def touch(self, key: str):
+        """Mark an entry as recently used"""
+        self.db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[str]:
+        """Return the cached body for key if it is fresh, or None"""
+        entry = self.lookup(key)
+        if entry is None or not entry.is_fresh(ttl):
+            return None
+        return self.read(entry)
+
+    def revalidated(self, key: str):
+        """Restart the TTL of an entry after the server answered 304 Not Modified"""
+        now = time.time()
+        self.db.execute("UPDATE entries SET created_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+        self.db.commit()
+
+    def put(self, key: str, text: str, content_type: str, url: str, method: str = "GET",
+            etag: Optional[str] = None, last_modified: Optional[str] = None,
+            codec: Optional[str] = None, compression_level: int = 3,
+            use_dictionary: bool = True, tag: Optional[str] = None) -> Path:
+        """Store a response body under key, compressed with codec, and index it"""
+        body = text.encode("utf-8")
+        dict_id = None
+        if codec == "zstd":
+            if use_dictionary:
+                dict_id = self.dictionaries.observe(httpx.URL(url).host, body)
+            dict_data = self.dictionaries.load(dict_id) if dict_id else None
+            stored = zstandard.ZstdCompressor(level=compression_level, dict_data=dict_data).compress(body)
+        elif codec == "gzip":
+            stored = gzip.compress(body, compresslevel=min(compression_level, 9))
+        else:
+            codec = None
+            stored = body
+
+        path = get_cache_path(key, content_type, codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(stored)
+        os.replace(tmp_path, path)
+
+        self._index_entry(key, content_type, url, method, path, len(stored), len(body),
+                          etag, last_modified, codec, dict_id, tag)
+        return path
+
+    def open_writer(self, key: str, content_type: str, url: str, method: str = "GET",
+                    etag: Optional[str] = None, last_modified: Optional[str] = None,
+                    codec: Optional[str] = None, compression_level: int = 3) -> "CacheWriter":
+        """Start streaming a body into the cache; it is indexed once the writer is committed"""
+        return CacheWriter(self, key, content_type, url, method, etag, last_modified, codec, compression_level)
+
+    def _index_entry(self, key: str, content_type: str, url: str, method: str, path: Path, size: int,
+                     raw_size: int, etag: Optional[str], last_modified: Optional[str],
+                     codec: Optional[str], dict_id: Optional[str], tag: Optional[str] = None):
+        previous = self.db.execute("SELECT path, size FROM entries WHERE key = ?", (key,)).fetchone()
+        if previous and previous[0] != str(path):
+            Path(previous[0]).unlink(missing_ok=True)
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries "
+            "(key, content_type, method, url, path, size, created_at, accessed_at, etag, last_modified, "
+            "codec, dict_id, raw_size, tag) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, content_type, method.upper(), url, str(path), size, now, now, etag, last_modified,
+             codec, dict_id, raw_size, tag),
+        )
+        self.db.commit()
+        self._total_bytes += size - (previous[1] if previous else 0)
+
+    def delete(self, key: str):
+        """Remove an entry and its body"""
+        row = self.db.execute("SELECT path, size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        Path(row[0]).unlink(missing_ok=True)
+        self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.db.commit()
+        self._total_bytes -= row[1]
+
+    def delete_tagged(self, tag: str, content_type: Optional[str] = None) -> int:
+        """Remove every entry carrying tag (of one content type if given); return the number removed"""
+        query = "SELECT key, path, size FROM entries WHERE tag = ?"
+        args: Tuple[str, ...] = (tag,)
+        if content_type is not None:
+            query += " AND content_type = ?"
+            args += (content_type,)
+        rows = self.db.execute(query, args).fetchall()
+        for _, path, size in rows:
+            Path(path).unlink(missing_ok=True)
+            self._total_bytes -= size
+        self.db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _, _ in rows])
+        self.db.commit()
+        return len(rows)
+
+    def evict(self, max_bytes: Optional[int]) -> int:
+        """Drop least recently used entries until the cache fits in max_bytes; return the number evicted"""
+        if not max_bytes or self.total_bytes <= max_bytes:
+            return 0
+
+        evicted = 0
+        while self._total_bytes > max_bytes:
+            rows = self.db.execute(
+                "SELECT key, path, size FROM entries ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+
+            removed = []
+            for key, path, size in rows:
+                if self._total_bytes <= max_bytes:
+                    break
+                Path(path).unlink(missing_ok=True)
+                self._total_bytes -= size
+                removed.append((key,))
+            self.db.executemany("DELETE FROM entries WHERE key = ?", removed)
+            self.db.commit()
+            evicted += len(removed)
+
+        logger.info(f"Evicted {evicted} cache entries to stay under {max_bytes} bytes")
+        return evicted
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes held by the cache, kept as a running total instead of summing the index"""
+        if self._db is None:
+            self.db
+        return self._total_bytes
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Entry count, on-disk bytes and uncompressed bytes per content type"""
+        rows = self.db.execute(
+            "SELECT content_type, COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(COALESCE(raw_size, size)), 0) "
+            "FROM entries GROUP BY content_type"
+        ).fetchall()
+        return {
+            content_type: {"entries": count, "bytes": size, "raw_bytes": raw_size}
+            for content_type, count, size, raw_size in rows
+        }
+
+    def tag_stats(self, content_type: str) -> Dict[Optional[str], Dict[str, Any]]:
+        """Entry count, on-disk and uncompressed bytes and newest entry time per tag of a content type"""
+        rows = self.db.execute(
+            "SELECT tag, COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(COALESCE(raw_size, size)), 0), "
+            "MAX(created_at) FROM entries WHERE content_type = ? GROUP BY tag",
+            (content_type,)
+        ).fetchall()
+        return {
+            tag: {"entries": count, "bytes": size, "raw_bytes": raw_size, "newest": newest}
+            for tag, count, size, raw_size, newest in rows
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+class CacheWriter:
+    """
+    Streams a body into the cache, compressing as it goes.
+
+    Data goes to a temporary file; commit() moves it into place and indexes
+    it, abort() throws it away. Used for bodies too large to hold in memory.
+    """
+
+    def __init__(self, cache: RequestCache, key: str, content_type: str, url: str, method: str = "GET",
+                 etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 codec: Optional[str] = None, compression_level: int = 3):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.url = url
+        self.method = method
+        self.etag = etag
+        self.last_modified = last_modified
+        self.codec = codec if codec in CODEC_SUFFIXES else None
+        self.raw_size = 0
+        self.path = get_cache_path(key, content_type, self.codec)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        self._file = open(self._tmp_path, "wb")
+        if self.codec == "zstd":
+            self._stream = zstandard.ZstdCompressor(level=compression_level).stream_writer(self._file, closefd=False)
+        elif self.codec == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=min(compression_level, 9))
+        else:
+            self._stream = self._file
+
+    def write(self, data: Union[bytes, str]):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._stream.write(data)
+        self.raw_size += len(data)
+
+    def _close_files(self):
+        if self._stream is not self._file:
+            self._stream.close()
+        self._file.close()
+
+    def commit(self) -> Path:
+        self._close_files()
+        os.replace(self._tmp_path, self.path)
+        self.cache._index_entry(self.key, self.content_type, self.url, self.method, self.path,
+                                self.path.stat().st_size, self.raw_size, self.etag, self.last_modified,
+                                self.codec, None)
+        return self.path
+
+    def abort(self):
+        self._close_files()
+        self._tmp_path.unlink(missing_ok=True)
+
+request_cache = RequestCache(CACHE_INDEX_PATH, CACHE_DICTS_DIR)
+
+def log_cache_stats():
+    """Log the size of the raw cache per content type and overall"""
+    stats = request_cache.stats()
+    total_bytes = total_raw = 0
+    for content_type, entry in stats.items():
+        total_bytes += entry["bytes"]
+        total_raw += entry["raw_bytes"]
+        logger.info(
+            f"Cache {content_type}: {entry['entries']} entries, "
+            f"{entry['bytes'] / 1024 ** 2:.1f} MB on disk ({entry['raw_bytes'] / 1024 ** 2:.1f} MB raw)"
+        )
+    if total_raw:
+        logger.info(
+            f"Cache total: {total_bytes / 1024 ** 2:.1f} MB on disk, "
+            f"{total_raw / 1024 ** 2:.1f} MB raw, ratio {total_raw / max(total_bytes, 1):.1f}x"
+        )
+
+class Histogram:
+    """Cumulative-bucket histogram, as exported to Prometheus"""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, buckets: Optional[Sequence[float]] = None):
+        self.buckets = tuple(buckets or self.BUCKETS)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+class Metrics:
+    """
+    Counters, gauges and histograms of a scraper run, labelled by site and
+    content type.
+
+    fetch_url records request latency, retries, failures, cache hits and
+    misses and downloaded bytes, run_parse the parse time per function and
+    run_site_scraper the rows written. write() exports everything as a
+    Prometheus textfile and a JSON summary.
+    """
+
+    PREFIX = "dg_"
+    HELP = {
+        "fetch_seconds": "Latency of HTTP request attempts",
+        "fetch_retries_total": "Request attempts that failed and were retried",
+        "fetch_failures_total": "Requests that failed after all retries",
+        "cache_requests_total": "Raw cache lookups by result (hit, miss, revalidated)",
+        "downloaded_bytes_total": "Bytes downloaded over the network",
+        "parse_seconds": "Time spent in parse and row-building functions",
+        "product_seconds": "Time to fetch and build the rows of one product URL",
+        "rows_written_total": "Rows written to the output",
+        "products_total": "Product URLs processed by result",
+        "run_seconds": "Duration of the run",
+        "rows_per_second": "Rows written per second over the run",
+    }
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, site: str = "generic"):
+        self.site = site
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+        self.gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+
+    def _key(self, name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        return name, tuple(sorted({"site": self.site, **labels}.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.counters[self._key(name, labels)] += value
+
+    def set(self, name: str, value: float, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @staticmethod
+    def _format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+        def escape(value: Any) -> str:
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+    def to_prometheus(self) -> str:
+        lines = []
+        typed = set()
+
+        def header(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {self.PREFIX}{name} {self.HELP.get(name, name)}")
+                lines.append(f"# TYPE {self.PREFIX}{name} {kind}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name, "counter")
+            lines.append(f"{self.PREFIX}{name}{self._format_labels(labels)} {value:g}")
+        for (name, labels), value in sorted(self.gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{self.PREFIX}{name}{self._format_labels(labels)} {value:g}")
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{self.PREFIX}{name}_bucket{self._format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.PREFIX}{name}_sum{self._format_labels(labels)} {histogram.sum:g}")
+            lines.append(f"{self.PREFIX}{name}_count{self._format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """Metrics as plain data, with the cache hit ratio per content type"""
+        def entries(items, value):
+            return [{"name": name, "labels": dict(labels), **value(v)} for (name, labels), v in sorted(items, key=lambda item: item[0])]
+
+        cache = defaultdict(lambda: defaultdict(float))
+        for (name, labels), value in self.counters.items():
+            if name == "cache_requests_total":
+                labels = dict(labels)
+                cache[labels["content_type"]][labels["result"]] += value
+        cache_hit_ratio = {
+            content_type: (results["hit"] + results["revalidated"]) / sum(results.values())
+            for content_type, results in cache.items()
+        }
+        return {
+            "site": self.site,
+            "counters": entries(self.counters.items(), lambda v: {"value": v}),
+            "gauges": entries(self.gauges.items(), lambda v: {"value": v}),
+            "histograms": entries(self.histograms.items(), lambda h: h.summary()),
+            "cache_hit_ratio": cache_hit_ratio,
+        }
+
+    def write(self, directory: Union[str, Path], name: str) -> Tuple[Path, Path]:
+        """Write <name>_metrics.prom and <name>_metrics.json; the .prom file is replaced atomically"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        prom_path = directory / f"{name}_metrics.prom"
+        json_path = directory / f"{name}_metrics.json"
+        tmp_path = prom_path.with_suffix(".prom.tmp")
+        tmp_path.write_text(self.to_prometheus(), encoding="utf-8")
+        os.replace(tmp_path, prom_path)
+        save_to_file(self.summary(), json_path)
+        return prom_path, json_path
+
+    def log_summary(self):
+        """Log fetch latency and cache hit ratio per content type"""
+        summary = self.summary()
+        for entry in summary["histograms"]:
+            if entry["name"] == "fetch_seconds":
+                content_type = entry["labels"].get("content_type")
+                ratio = summary["cache_hit_ratio"].get(content_type)
+                logger.info(
+                    f"Fetch {content_type}: {entry['count']} requests, p50 {entry['p50'] * 1000:.0f} ms, "
+                    f"p99 {entry['p99'] * 1000:.0f} ms"
+                    + (f", cache hit ratio {ratio:.0%}" if ratio is not None else "")
+                )
+
+# Global metrics of the current run
+metrics = Metrics()
+
+class StageProfiler:
+    """
+    Sampling profiler that attributes samples to scrape stages.
+
+    A background thread captures the stack of the event loop thread every
+    interval seconds. The innermost stage marker on the stack (a function
+    of this module listed in STAGE_MARKERS) names the stage of the sample:
+    discovery, fetch, parse, build (script code producing rows outside
+    fetch and parse), write or checkpoint. Samples of the loop waiting in
+    its selector count as idle, i.e. waiting on the network.
+
+    Parsing in parse workers (parse_workers > 0) happens in other processes
+    and is not sampled; profile with parse_workers at 0 to see it.
+    """
+
+    STAGE_MARKERS = {
+        "_discover": "discovery",
+        "fetch_url": "fetch",
+        "_iter_sitemap_chunks": "fetch",
+        "_timed_call": "parse",
+        "parse_html": "parse",
+        "_product_rows": "build",
+        "_write_rows": "write",
+        "checkpoint_dedup_writers": "checkpoint",
+        "CrawlFrontier.checkpoint": "checkpoint",
+    }
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Dict[str, Counter] = defaultdict(Counter)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._target = None
+
+    def start(self):
+        """Start sampling the calling thread"""
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stage-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self._sample(frame)
+
+    def _sample(self, frame):
+        stage = None
+        leaf = frame
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            if stage is None and code.co_filename == __file__:
+                stage = self.STAGE_MARKERS.get(code.co_qualname)
+            frame = frame.f_back
+        if stage is None:
+            waiting = leaf.f_code.co_name == "select" and leaf.f_code.co_filename.endswith("selectors.py")
+            stage = "idle" if waiting else "other"
+        self.samples[stage][";".join(reversed(names))] += 1
+
+    def write(self, directory: Union[str, Path], name: str) -> Path:
+        """
+        Write <name>_profile.folded (all stages, each under a stage:<name>
+        root frame), <name>_profile_<stage>.folded per stage and a
+        <name>_profile.txt summary. The .folded files are in the collapsed
+        format read by flamegraph.pl, speedscope and inferno.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        total = sum(sum(stacks.values()) for stacks in self.samples.values())
+        combined = []
+        summary = [f"{total} samples every {self.interval * 1000:g} ms", ""]
+        for stage, stacks in sorted(self.samples.items(), key=lambda item: -sum(item[1].values())):
+            count = sum(stacks.values())
+            lines = [f"{stack} {n}" for stack, n in stacks.most_common()]
+            (directory / f"{name}_profile_{stage}.folded").write_text("\n".join(lines) + "\n", encoding="utf-8")
+            combined.extend(f"stage:{stage};{line}" for line in lines)
+
+            own = Counter()
+            for stack, n in stacks.items():
+                own[stack.rsplit(";", 1)[-1]] += n
+            summary.append(f"{stage}: {count} samples ({count / max(total, 1):.1%})")
+            summary.extend(f"    {n:>7} {n / count:>6.1%}  {frame}" for frame, n in own.most_common(10))
+            summary.append("")
+        path = directory / f"{name}_profile.folded"
+        path.write_text("\n".join(combined) + "\n", encoding="utf-8")
+        (directory / f"{name}_profile.txt").write_text("\n".join(summary), encoding="utf-8")
+        return path
+
+# Client error statuses that may clear up on a retry; other 4xx answers are final
+RETRYABLE_CLIENT_STATUSES = {408, 425, 429}
+
+class FetchStatusError(RuntimeError):
+    """A request answered with a client error status that retrying will not fix"""
+
+    def __init__(self, url: str, status_code: int):
+        super().__init__(f"HTTP {status_code} for URL: {url}")
+        self.url = url
+        self.status_code = status_code
 
 async def fetch_url(
     url: str,
@@ -138,64 +1175,138 @@ async def fetch_url(
     data: Optional[Union[Dict[str, Any], str]] = None,
     json_data: Optional[Dict[str, Any]] = None,
     method: str = "GET",
-    config: Dict[str, Any] = None
-) -> str:
+    config: Dict[str, Any] = None,
+    cache_key: Optional[str] = None,
+    cache_tag: Optional[str] = None,
+    final_client_errors: bool = False,
+    raw_response: bool = False
+) -> Union[str, httpx.Response]:
+    """
+    Fetch url with retries, through the raw cache for the content types saved locally.
+
+    The cache key defaults to the request fingerprint; callers that know a
+    better identity for the response (e.g. a GraphQL query) pass their own
+    cache_key, and a cache_tag to invalidate related entries together.
+
+    Every failure is retried unless final_client_errors is set: then a 4xx
+    other than RETRYABLE_CLIENT_STATUSES raises FetchStatusError at once,
+    for callers that handle it (e.g. by renewing a session). raw_response
+    returns the httpx.Response itself, for callers that need its headers or
+    cookies; such requests bypass the cache and ScrapingBee.
+    """
     if config is None:
         config = DEFAULT_CONFIG
 
     max_retries = config.get("max_retries", 3)
-    min_delay = config.get("min_delay", 1.0)
-    max_delay = config.get("max_delay", 3.0)
     save_raw = False
 
     if content_type == "sitemap" and config.get("save_raw_sitemaps", True):
         save_raw = True
     elif content_type == "category" and config.get("save_raw_categories", True):
         save_raw = True
-    elif content_type == "product" and config.get("save_raw_products", True):
+    elif content_type in ("product", "graphql") and config.get("save_raw_products", True):
         save_raw = True
 
-    if save_raw and config.get("save_local", True):
-        cache_path = get_cache_path(url, content_type)
-        if cache_path.exists():
-            logger.info(f"Using cached version of {url} from {cache_path}")
-            with open(cache_path, "r", encoding="utf-8") as f:
-                return f.read()
+    stale_entry = None
+    frontier_item = current_frontier_item.get()
+    if raw_response or not (save_raw and config.get("save_local", True)):
+        cache_key = None
+    else:
+        if cache_key is None:
+            cache_key = request_fingerprint(url, method, params, data, json_data)
+        entry = request_cache.lookup(cache_key)
+        if entry is not None:
+            # Sub-requests finished before a resumed run was interrupted are reused however old they are
+            if entry.is_fresh(config.get("cache_ttl", {}).get(content_type)) or (
+                frontier_item is not None and frontier_item[0].subrequest_done(frontier_item[1], cache_key)
+            ):
+                cached = request_cache.read(entry)
+                if cached is not None:
+                    logger.info(f"Using cached version of {url} ({cache_key[:12]})")
+                    metrics.inc("cache_requests_total", content_type=content_type, result="hit")
+                    return cached
+            elif config.get("cache_revalidate", False) and entry.conditional_headers():
+                stale_entry = entry
 
     if headers is None:
         headers = get_random_headers()
 
     for retry in range(max_retries):
+        started = None
         try:
-            await asyncio.sleep(random.uniform(min_delay, max_delay))
+            await rate_limiter.wait(url, config)
 
-            if config.get("use_scrapingbee", False) and config.get("scrapingbee_key"):
+            etag = last_modified = None
+            started = time.perf_counter()
+            if config.get("use_scrapingbee", False) and config.get("scrapingbee_key") and not raw_response:
                 response_text = await fetch_with_scrapingbee(url, headers, config)
+                metrics.inc("downloaded_bytes_total", len(response_text.encode("utf-8")), content_type=content_type)
             else:
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    if method.upper() == "POST":
-                        response = await client.post(url=url, headers=headers, params=params, data=data, json=json_data)
-                    else:
-                        response = await client.get(url=url, headers=headers, params=params)
-                    response.raise_for_status()
-                    response_text = response.text
-
-            if save_raw and config.get("save_local", True):
-                cache_path = get_cache_path(url, content_type)
-                cache_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(cache_path, "w", encoding="utf-8") as f:
-                    f.write(response_text)
+                client = get_http_client(url, config)
+                request_headers = headers
+                if stale_entry is not None:
+                    request_headers = {**headers, **stale_entry.conditional_headers()}
+                if method.upper() == "POST":
+                    response = await client.post(url=url, headers=request_headers, params=params, data=data, json=json_data)
+                else:
+                    response = await client.get(url=url, headers=request_headers, params=params)
+                metrics.inc("downloaded_bytes_total", response.num_bytes_downloaded, content_type=content_type)
+
+                if response.status_code == 304 and stale_entry is not None:
+                    cached = request_cache.read(stale_entry)
+                    if cached is not None:
+                        request_cache.revalidated(cache_key)
+                        logger.info(f"Revalidated cached version of {url} (304 Not Modified)")
+                        metrics.observe("fetch_seconds", time.perf_counter() - started, content_type=content_type)
+                        metrics.inc("cache_requests_total", content_type=content_type, result="revalidated")
+                        return cached
+                    # Body vanished from disk; retry as a plain request
+                    stale_entry = None
+                    raise RuntimeError("Cached body missing after 304 Not Modified")
+
+                response.raise_for_status()
+                if raw_response:
+                    metrics.observe("fetch_seconds", time.perf_counter() - started, content_type=content_type)
+                    return response
+                response_text = response.text
+                etag = response.headers.get("etag")
+                last_modified = response.headers.get("last-modified")
+            metrics.observe("fetch_seconds", time.perf_counter() - started, content_type=content_type)
+
+            if cache_key:
+                metrics.inc("cache_requests_total", content_type=content_type, result="miss")
+                cache_path = request_cache.put(
+                    cache_key, response_text, content_type, url, method,
+                    etag=etag, last_modified=last_modified,
+                    codec=resolve_cache_codec(config),
+                    compression_level=config.get("cache_compression_level", 3),
+                    use_dictionary=config.get("cache_zstd_dictionaries", True),
+                    tag=cache_tag
+                )
+                request_cache.evict(config.get("cache_max_bytes"))
                 logger.info(f"Saved raw content to {cache_path}")
+                if frontier_item is not None:
+                    frontier_item[0].record_subrequest(frontier_item[1], cache_key)
 
             return response_text
 
         except Exception as e:
+            if started is not None:
+                metrics.observe("fetch_seconds", time.perf_counter() - started, content_type=content_type)
+            if final_client_errors and isinstance(e, httpx.HTTPStatusError):
+                status_code = e.response.status_code
+                if 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_STATUSES:
+                    metrics.inc("fetch_failures_total", content_type=content_type)
+                    logger.warning(f"Request failed. URL: {url}. HTTP {status_code}, not retried")
+                    raise FetchStatusError(url, status_code) from e
             logger.warning(f"Request failed. URL: {url}. Error: {repr(e)}. Attempt {retry+1}/{max_retries}")
             if retry < max_retries - 1:
+                metrics.inc("fetch_retries_total", content_type=content_type)
                 backoff_time = (2 ** retry) + random.uniform(0, 1)
                 logger.info(f"Backing off for {backoff_time:.2f} seconds before retry")
                 await asyncio.sleep(backoff_time)
 
+    metrics.inc("fetch_failures_total", content_type=content_type)
     raise RuntimeError(f"Max retries exceeded for URL: {url}")
 
 async def fetch_with_scrapingbee(url: str, headers: Dict[str, str], config: Dict[str, Any]) -> str:
@@ -213,90 +1324,678 @@ async def fetch_with_scrapingbee(url: str, headers: Dict[str, str], config: Dict
     if headers:
         params["headers"] = json.dumps(headers)
     
-    # Make the request
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.get(SCRAPINGBEE_URL, params=params)
-        response.raise_for_status()
-        return response.text
+    # Make the request through the pooled client
+    client = get_http_client(SCRAPINGBEE_URL, config)
+    response = await client.get(SCRAPINGBEE_URL, params=params, timeout=60.0)
+    response.raise_for_status()
+    return response.text
 
-async def fetch_sitemap(url: str, config: Dict[str, Any] = None) -> List[str]:
+class SitemapEntry:
+    """A <loc> of a sitemap together with its optional <lastmod>"""
+
+    def __init__(self, loc: str, lastmod: Optional[str] = None):
+        self.loc = loc
+        self.lastmod = lastmod
+
+    def __repr__(self):
+        return f"SitemapEntry({self.loc!r}, lastmod={self.lastmod!r})"
+
+def _iter_cached_chunks(entry: CacheEntry) -> Iterator[str]:
+    """Read a cached body in chunks, decompressing as a stream"""
+    with request_cache.open_stream(entry) as f:
+        while True:
+            chunk = f.read(SITEMAP_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    request_cache.touch(entry.key)
+
+async def _iter_sitemap_chunks(url: str, config: Dict[str, Any]) -> AsyncIterator[Union[bytes, str]]:
     """
-    Fetch and parse a sitemap XML file.
+    Yield the XML of a sitemap in chunks, gunzipping .xml.gz bodies.
+
+    A fresh cached copy is streamed from disk; otherwise the body is streamed
+    from the network and written to the cache as it arrives, so a sitemap is
+    never held in memory as a whole.
     """
-    logger.info(f"Fetching sitemap from {url}")
-    try:
-        xml_text = await fetch_url(url, content_type="sitemap", config=config)
-
-        # Parse XML
-        root = ET.fromstring(xml_text)
-
-        # Extract URLs from sitemap
-        urls = []
-        # Define namespace if present in the XML
-        ns = {'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-
-        # Try with namespace first
-        loc_elements = root.findall('.//sm:loc', ns)
-        if not loc_elements:
-            # Try without namespace
-            loc_elements = root.findall('.//loc')
-
-        for loc in loc_elements:
-            urls.append(loc.text)
-
-        # Save URLs to output file if configured
-        if config and config.get("save_local", True):
-            sitemap_output = OUTPUTS_DIR / "sitemap.txt"
-            with open(sitemap_output, "w", encoding="utf-8") as f:
-                for url in urls:
-                    f.write(f"{url}\n")
-            logger.info(f"Saved {len(urls)} sitemap URLs to {sitemap_output}")
-
-        return urls
-    except Exception as e:
-        logger.error(f"Failed to fetch sitemap {url}: {repr(e)}")
-        return []
+    use_cache = config.get("save_raw_sitemaps", True) and config.get("save_local", True)
+    cache_key = request_fingerprint(url) if use_cache else None
+    stale_entry = None
+    if cache_key:
+        entry = request_cache.lookup(cache_key)
+        if entry is not None:
+            if entry.is_fresh(config.get("cache_ttl", {}).get("sitemap")) and entry.path.exists():
+                logger.info(f"Using cached version of {url} ({cache_key[:12]})")
+                metrics.inc("cache_requests_total", content_type="sitemap", result="hit")
+                for chunk in _iter_cached_chunks(entry):
+                    yield chunk
+                return
+            if config.get("cache_revalidate", False) and entry.conditional_headers() and entry.path.exists():
+                stale_entry = entry
 
-def save_to_file(data, path):
-    """Save data to a JSON file"""
-    path = Path(path)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    logger.info(f"Saved data to {path}")
+    if config.get("use_scrapingbee", False) and config.get("scrapingbee_key"):
+        # The proxy API returns whole bodies; fall back to a regular fetch
+        yield await fetch_url(url, content_type="sitemap", config=config)
+        return
 
-def append_to_file(line: str, path: Path):
-    """Append a line to a text file"""
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(f"{line}\n")
+    headers = get_random_headers()
+    if stale_entry is not None:
+        headers.update(stale_entry.conditional_headers())
 
-# Shared counter for async operations
-class SharedCounter:
-    def __init__(self, initial_value=0):
-        self._value = initial_value
-        self._lock = asyncio.Lock()
-        
-    @property
-    def value(self):
-        return self._value
-        
-    async def set_value(self, v):
-        async with self._lock:
-            self._value = v
-            
-    async def increment(self):
-        async with self._lock:
-            self._value += 1
-            return self._value
+    max_retries = config.get("max_retries", 3)
+    for retry in range(max_retries):
+        writer = None
+        started = False
+        request_started = None
+        try:
+            await rate_limiter.wait(url, config)
+            client = get_http_client(url, config)
+            request_started = time.perf_counter()
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and stale_entry is not None:
+                    request_cache.revalidated(cache_key)
+                    logger.info(f"Revalidated cached version of {url} (304 Not Modified)")
+                    metrics.observe("fetch_seconds", time.perf_counter() - request_started, content_type="sitemap")
+                    metrics.inc("cache_requests_total", content_type="sitemap", result="revalidated")
+                    for chunk in _iter_cached_chunks(stale_entry):
+                        yield chunk
+                    return
+                response.raise_for_status()
 
-# Base data model classes
-class Product:
-    def __init__(self, name, url, id, price=None, brand=None, category=None, subcategory=None, 
-                 sub_subcategory=None, description=None, images=None, review_count=0, review_rating=0,
-                 source="generic"):
-        self.name = name
-        self.url = url
+                if cache_key:
+                    writer = request_cache.open_writer(
+                        cache_key, "sitemap", url,
+                        etag=response.headers.get("etag"),
+                        last_modified=response.headers.get("last-modified"),
+                        codec=resolve_cache_codec(config),
+                        compression_level=config.get("cache_compression_level", 3),
+                    )
+
+                head = b""
+                decompressor = None
+                async for chunk in response.aiter_bytes(SITEMAP_CHUNK_SIZE):
+                    if not started:
+                        # Sniff the gzip magic number: .xml.gz files are served without Content-Encoding
+                        head += chunk
+                        if len(head) < 2:
+                            continue
+                        chunk, head = head, b""
+                        if chunk[:2] == b"\x1f\x8b":
+                            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                        started = True
+                    if decompressor is not None:
+                        chunk = decompressor.decompress(chunk)
+                    if chunk:
+                        if writer:
+                            writer.write(chunk)
+                        yield chunk
+                tail = decompressor.flush() if decompressor is not None else head
+                if tail:
+                    if writer:
+                        writer.write(tail)
+                    yield tail
+                metrics.inc("downloaded_bytes_total", response.num_bytes_downloaded, content_type="sitemap")
+            metrics.observe("fetch_seconds", time.perf_counter() - request_started, content_type="sitemap")
+            if cache_key:
+                metrics.inc("cache_requests_total", content_type="sitemap", result="miss")
+
+            if writer:
+                cache_path = writer.commit()
+                request_cache.evict(config.get("cache_max_bytes"))
+                logger.info(f"Saved raw content to {cache_path}")
+            return
+
+        except Exception as e:
+            if writer:
+                writer.abort()
+            if request_started is not None:
+                metrics.observe("fetch_seconds", time.perf_counter() - request_started, content_type="sitemap")
+            if started:
+                # Entries were already handed out; a retry would repeat them
+                metrics.inc("fetch_failures_total", content_type="sitemap")
+                raise
+            logger.warning(f"Request failed. URL: {url}. Error: {repr(e)}. Attempt {retry+1}/{max_retries}")
+            if retry < max_retries - 1:
+                metrics.inc("fetch_retries_total", content_type="sitemap")
+                backoff_time = (2 ** retry) + random.uniform(0, 1)
+                logger.info(f"Backing off for {backoff_time:.2f} seconds before retry")
+                await asyncio.sleep(backoff_time)
+
+    metrics.inc("fetch_failures_total", content_type="sitemap")
+    raise RuntimeError(f"Max retries exceeded for URL: {url}")
+
+def _sitemap_tag(tag: str) -> Optional[str]:
+    """Local name of a sitemap-protocol element, or None for foreign namespaces (image:loc, ...)"""
+    if tag.startswith("{"):
+        namespace, _, name = tag[1:].partition("}")
+        return name if namespace == SITEMAP_NS else None
+    return tag
+
+async def _parse_sitemap(url: str, config: Dict[str, Any]) -> AsyncIterator[Tuple[str, SitemapEntry]]:
+    """
+    Incrementally parse one sitemap document.
+
+    Yields ("url", entry) for pages and ("sitemap", entry) for the children
+    of a sitemap index as soon as their element closes; finished elements
+    are dropped so memory stays flat however large the document is.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    loc = lastmod = None
+
+    def drain():
+        nonlocal root, loc, lastmod
+        for event, elem in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            name = _sitemap_tag(elem.tag)
+            if name == "loc":
+                loc = (elem.text or "").strip()
+            elif name == "lastmod":
+                lastmod = (elem.text or "").strip() or None
+            elif name in ("url", "sitemap"):
+                if loc:
+                    yield name, SitemapEntry(loc, lastmod)
+                loc = lastmod = None
+                root.clear()
+
+    async for chunk in _iter_sitemap_chunks(url, config):
+        parser.feed(chunk)
+        for item in drain():
+            yield item
+    parser.close()
+    for item in drain():
+        yield item
+
+def get_sitemap_output_path(url: str) -> Path:
+    """Per-sitemap output file, so several sitemaps in one run do not overwrite each other"""
+    parsed = httpx.URL(url)
+    safe_name = re.sub(r'[^\w\-.]', '_', f"{parsed.host}{parsed.path}")[:150]
+    return OUTPUTS_DIR / f"sitemap_{safe_name}.txt"
+
+async def iter_sitemap(url: str, config: Dict[str, Any] = None) -> AsyncIterator[SitemapEntry]:
+    """
+    Stream the page entries (<loc> and <lastmod>) of a sitemap as they are parsed.
+
+    Sitemap indexes are followed recursively, with up to config["sitemap_concurrency"]
+    child sitemaps fetched at once; gzipped sitemaps are decompressed on the fly.
+    Parsing runs ahead of the consumer by at most config["sitemap_queue_size"]
+    entries, so memory stays bounded and product fetching can start with the
+    first entry. Entries of concurrently parsed children may interleave.
+    """
+    save_output = config is not None and config.get("save_local", True)
+    if config is None:
+        config = DEFAULT_CONFIG
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=config.get("sitemap_queue_size", 1000))
+    semaphore = asyncio.Semaphore(config.get("sitemap_concurrency", 4))
+    finished = object()
+    seen = {url}
+    tasks = []
+    pending = 0
+
+    async def crawl(sitemap_url: str):
+        nonlocal pending
+        try:
+            async with semaphore:
+                async for kind, entry in _parse_sitemap(sitemap_url, config):
+                    if kind == "sitemap":
+                        if entry.loc not in seen:
+                            seen.add(entry.loc)
+                            pending += 1
+                            tasks.append(asyncio.create_task(crawl(entry.loc)))
+                    else:
+                        await queue.put(entry)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to fetch sitemap {sitemap_url}: {repr(e)}")
+        await queue.put(finished)
+
+    pending += 1
+    tasks.append(asyncio.create_task(crawl(url)))
+
+    output = None
+    if save_output:
+        output_path = get_sitemap_output_path(url)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output = open(output_path, "w", encoding="utf-8")
+
+    count = 0
+    try:
+        while pending:
+            entry = await queue.get()
+            if entry is finished:
+                pending -= 1
+                continue
+            count += 1
+            if output:
+                output.write(f"{entry.loc}\n")
+            yield entry
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if output:
+            output.close()
+            logger.info(f"Saved {count} sitemap URLs to {output.name}")
+
+async def fetch_sitemap_entries(url: str, config: Dict[str, Any] = None) -> List[SitemapEntry]:
+    """
+    Fetch and parse a sitemap XML file, following sitemap indexes, keeping each <lastmod>.
+    """
+    logger.info(f"Fetching sitemap from {url}")
+    entries = []
+    try:
+        async for entry in iter_sitemap(url, config):
+            entries.append(entry)
+    except Exception as e:
+        logger.error(f"Failed to fetch sitemap {url}: {repr(e)}")
+    return entries
+
+async def fetch_sitemap(url: str, config: Dict[str, Any] = None) -> List[str]:
+    """
+    Fetch and parse a sitemap XML file, following sitemap indexes.
+    """
+    return [entry.loc for entry in await fetch_sitemap_entries(url, config)]
+
+def save_to_file(data, path):
+    """Save data to a JSON file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    logger.info(f"Saved data to {path}")
+
+def append_to_file(line: str, path: Path):
+    """Append a line to a text file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"{line}\n")
+
+# Shared counter for async operations
+class SharedCounter:
+    def __init__(self, initial_value=0):
+        self._value = initial_value
+        self._lock = asyncio.Lock()
+        
+    @property
+    def value(self):
+        return self._value
+        
+    async def set_value(self, v):
+        async with self._lock:
+            self._value = v
+            
+    async def increment(self):
+        async with self._lock:
+            self._value += 1
+            return self._value
+
+class TaskResult:
+    """Outcome of one item processed by run_bounded"""
+
+    def __init__(self, item: Any, result: Any = None, error: Optional[BaseException] = None):
+        self.item = item
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+async def run_bounded(
+    items: Union[Iterable[Any], AsyncIterable[Any]],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+    desc: str = None,
+    total: Optional[int] = None
+) -> List[TaskResult]:
+    """
+    Run worker(item) for every item with at most `concurrency` calls in flight.
+
+    A new item starts as soon as any running one finishes (a sliding window,
+    not fixed batches), so one slow item never holds back the free slots.
+    items may be a regular or an async iterable, which lets work start while
+    the items are still being discovered. The progress bar counts completed
+    items, and every result or exception is collected into a TaskResult.
+    """
+    concurrency = max(1, concurrency)
+    if total is None and hasattr(items, "__len__"):
+        total = len(items)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[TaskResult] = []
+    running = set()
+
+    with tqdm(total=total, desc=desc, ncols=100) as pbar:
+        async def run_one(item):
+            try:
+                results.append(TaskResult(item, result=await worker(item)))
+            except Exception as e:
+                logger.warning(f"Failed to process {item}: {e}")
+                results.append(TaskResult(item, error=e))
+            finally:
+                semaphore.release()
+                pbar.update(1)
+
+        async def start(item):
+            await semaphore.acquire()
+            task = asyncio.create_task(run_one(item))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    await start(item)
+            else:
+                for item in items:
+                    await start(item)
+            if running:
+                await asyncio.gather(*running)
+        finally:
+            for task in running:
+                task.cancel()
+
+    failed = sum(1 for r in results if not r.ok)
+    logger.info(f"{desc or 'Processing'}: {len(results) - failed} succeeded, {failed} failed")
+    return results
+
+# Per-host semaphores shared by the gather_subrequests calls of every product
+subrequest_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+async def gather_subrequests(
+    url: str,
+    items: Iterable[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    config: Dict[str, Any] = None
+) -> List[Any]:
+    """
+    Run worker(item) for the sub-requests of the product at url concurrently.
+
+    At most "per_product" calls of this product and "global" calls across
+    all products of its host run at once (config["subrequest_concurrency"]).
+    Results come back in the order of items whatever order they finish in;
+    the first failure cancels the remaining calls and is raised.
+    """
+    if config is None:
+        config = DEFAULT_CONFIG
+
+    limits = get_host_setting(config, "subrequest_concurrency", url) or {}
+    per_product = asyncio.Semaphore(max(1, limits.get("per_product", 1)))
+    host = httpx.URL(url).host
+    shared = subrequest_semaphores.get(host)
+    if shared is None:
+        shared = subrequest_semaphores[host] = asyncio.Semaphore(max(1, limits.get("global", 1)))
+
+    async def run_one(item):
+        async with per_product:
+            async with shared:
+                return await worker(item)
+
+    tasks = [asyncio.create_task(run_one(item)) for item in items]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def resolve_html_parser(config: Dict[str, Any] = None) -> str:
+    """HTML backend to use; a backend whose package is missing falls back like "auto" """
+    if config is None:
+        config = DEFAULT_CONFIG
+    available = []
+    if LexborHTMLParser is not None:
+        available.append("selectolax")
+    if LXML_AVAILABLE:
+        available.append("lxml")
+    available.append("html.parser")
+    choice = config.get("html_parser", "auto")
+    return choice if choice in available else available[0]
+
+class ScopeStrainer(SoupStrainer):
+    """
+    SoupStrainer keeping only the elements matched by simple selectors.
+
+    Selectors are a tag name, #id, .class or a combination such as
+    "script#__NEXT_DATA__" or "div.configure-container". A matching element
+    is kept with its whole subtree; everything outside is never built.
+    """
+
+    def __init__(self, selectors: List[str]):
+        super().__init__()
+        self.rules = []
+        for selector in selectors:
+            match = re.fullmatch(r"([\w-]*)(?:#([\w-]+))?((?:\.[\w-]+)*)", selector)
+            if not match:
+                raise ValueError(f"Unsupported scope selector: {selector}")
+            tag, element_id, classes = match.groups()
+            self.rules.append((tag or None, element_id, set(classes.split(".")[1:])))
+
+    def matches(self, name: str, attrs: Optional[Dict[str, Any]]) -> bool:
+        attrs = attrs or {}
+        classes = attrs.get("class") or []
+        if isinstance(classes, str):
+            classes = classes.split()
+        for tag, element_id, required in self.rules:
+            if tag and tag != name:
+                continue
+            if element_id and attrs.get("id") != element_id:
+                continue
+            if required and not required.issubset(classes):
+                continue
+            return True
+        return False
+
+    # bs4 >= 4.13
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        return self.matches(name, attrs)
+
+    def allow_string_creation(self, string) -> bool:
+        return False
+
+    # bs4 < 4.13
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return markup_name if self.matches(markup_name, dict(markup_attrs)) else None
+
+    def search(self, markup):
+        return None
+
+class HtmlNode:
+    """
+    Parsed HTML element (or whole document) with one API over the backends.
+
+    Covers what the site scripts need: CSS selection, text, attributes and
+    the text right after an element. Wraps a BeautifulSoup Tag or a
+    selectolax node.
+    """
+
+    def __init__(self, node: Any):
+        self._node = node
+        self._soup = hasattr(node, "get_text")
+
+    def select(self, css: str) -> List["HtmlNode"]:
+        found = self._node.select(css) if self._soup else self._node.css(css)
+        return [HtmlNode(node) for node in found]
+
+    def select_one(self, css: str) -> Optional["HtmlNode"]:
+        node = self._node.select_one(css) if self._soup else self._node.css_first(css)
+        return HtmlNode(node) if node is not None else None
+
+    def text(self) -> str:
+        """Text of the element with each piece stripped, like get_text(strip=True)"""
+        if self._soup:
+            return self._node.get_text(strip=True)
+        return self._node.text(strip=True)
+
+    def strings(self) -> List[str]:
+        """Non-empty stripped text pieces, like stripped_strings"""
+        if self._soup:
+            return list(self._node.stripped_strings)
+        pieces = (node.text(deep=False).strip() for node in self._node.traverse(include_text=True) if node.tag == "-text")
+        return [piece for piece in pieces if piece]
+
+    def attr(self, name: str, default: Any = None) -> Any:
+        if self._soup:
+            return self._node.get(name, default)
+        value = self._node.attributes.get(name)
+        return default if value is None else value
+
+    def next_text(self) -> str:
+        """Stripped text directly following this element, or "" """
+        if self._soup:
+            sibling = self._node.next_sibling
+            return sibling.strip() if isinstance(sibling, NavigableString) else ""
+        sibling = self._node.next
+        return sibling.text(deep=False).strip() if sibling is not None and sibling.tag == "-text" else ""
+
+def parse_html(markup: str, scope: Optional[List[str]] = None, config: Dict[str, Any] = None) -> HtmlNode:
+    """
+    Parse markup with the configured backend.
+
+    Args:
+        markup: HTML to parse
+        scope: Simple selectors (see ScopeStrainer) of the subtrees the caller
+            reads; BeautifulSoup backends skip the rest of the page.
+            selectolax always parses the whole page, which is still faster.
+        config: Configuration dictionary (default: DEFAULT_CONFIG)
+    """
+    if config is None:
+        config = DEFAULT_CONFIG
+    backend = resolve_html_parser(config)
+    if backend == "selectolax":
+        return HtmlNode(LexborHTMLParser(markup))
+    parse_only = ScopeStrainer(scope) if scope and config.get("html_parse_scope", True) else None
+    return HtmlNode(BeautifulSoup(markup, backend, parse_only=parse_only))
+
+def _timed_call(func: Callable, *args) -> Tuple[float, Any]:
+    """Call func(*args) and return its duration with the result (runs in parse workers)"""
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+class ParsePool:
+    """
+    Optional process pool for CPU-bound parsing and row building.
+
+    run() ships a call to a ProcessPoolExecutor so BeautifulSoup and row loops
+    never stall downloads on the event loop. At most parse_queue_size calls
+    are in flight; further callers wait, which holds back their fetch workers
+    instead of piling raw pages up in memory. With parse_workers at 0 the call
+    runs inline. Functions must be module-level and arguments plain data.
+
+    run_site_scraper starts the pool with the run config; calls made
+    outside a run start it from DEFAULT_CONFIG on first use.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._started = False
+
+    def start(self, config: Dict[str, Any]):
+        """Decide once, from config["parse_workers"], whether calls run in worker processes or inline"""
+        self.close()
+        self._started = True
+        workers = config.get("parse_workers", 0)
+        if workers == 0:
+            return
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._semaphore = asyncio.Semaphore(config.get("parse_queue_size") or workers * 2)
+        logger.info(f"Parsing in {workers} worker processes")
+
+    async def run(self, func: Callable, *args) -> Any:
+        if not self._started:
+            self.start(DEFAULT_CONFIG)
+        if self._executor is None:
+            elapsed, result = _timed_call(func, *args)
+        else:
+            async with self._semaphore:
+                elapsed, result = await asyncio.get_running_loop().run_in_executor(self._executor, _timed_call, func, *args)
+        metrics.observe("parse_seconds", elapsed, function=func.__name__)
+        return result
+
+    def close(self):
+        self._started = False
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._semaphore = None
+
+# Global parse pool
+parse_pool = ParsePool()
+
+async def run_parse(func: Callable, *args) -> Any:
+    """Run func(*args) in the parse pool (or inline when parse_workers is 0)"""
+    return await parse_pool.run(func, *args)
+
+def close_parse_pool():
+    """Shutdown hook: stop the parse worker processes"""
+    parse_pool.close()
+
+class RowTemplate:
+    """
+    Immutable columns shared by a group of output rows.
+
+    Product-level fields are computed once into a template (from any
+    number of dicts and keywords, later ones winning); row(overlay) returns
+    a new row dict with the per-row fields (prices, terms, steps) laid over
+    it. derive(fields) adds a level, e.g. plan fields within a variant,
+    without touching the parent template.
+    """
+
+    __slots__ = ("_fields",)
+
+    def __init__(self, *fields: Dict[str, Any], **more):
+        self._fields = {}
+        for part in fields:
+            self._fields.update(part)
+        self._fields.update(more)
+
+    @property
+    def fields(self) -> Mapping[str, Any]:
+        return types.MappingProxyType(self._fields)
+
+    def derive(self, *fields: Dict[str, Any], **more) -> "RowTemplate":
+        return RowTemplate(self._fields, *fields, **more)
+
+    def row(self, overlay: Optional[Dict[str, Any]] = None, **more) -> Dict[str, Any]:
+        row = self._fields.copy()
+        if overlay:
+            row.update(overlay)
+        if more:
+            row.update(more)
+        return row
+
+def url_category_fields(url: str) -> Dict[str, str]:
+    """cat and subcat1-5 from the path segments of a product URL (the first three are required)"""
+    parts = url.split("/")
+    fields = {"cat": parts[3], "subcat1": parts[4], "subcat2": parts[5]}
+    for i in range(3, 6):
+        fields[f"subcat{i}"] = parts[i + 3] if len(parts) > i + 3 else ""
+    return fields
+
+def spec_attribute_fields(specs: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+    """attributeType/Title/Value columns for (title, value) specification pairs, numbered from 1"""
+    fields = {}
+    for index, (title, value) in enumerate(specs, start=1):
+        fields[f"attributeType{index}"] = "SPECIFICATION"
+        fields[f"attributeTitle{index}"] = title
+        fields[f"attributeValue{index}"] = value
+    return fields
+
+# Base data model classes
+class Product:
+    def __init__(self, name, url, id, price=None, brand=None, category=None, subcategory=None, 
+                 sub_subcategory=None, description=None, images=None, review_count=0, review_rating=0,
+                 source="generic"):
+        self.name = name
+        self.url = url
         self.id = id
         self.price = price
         self.brand = brand
@@ -452,6 +2151,323 @@ def append_to_csv(record: Dict[str, Any], filepath: str, fieldnames: List[str] =
             writer.writeheader()
         writer.writerow({k: record.get(k, "") for k in fieldnames})
 
+class CsvSink:
+    """
+    Buffered CSV writer that keeps its file open for the whole run.
+
+    Rows are turned into lists in the precomputed field order as soon as they
+    are written, so callers may keep mutating the dict they passed in, and are
+    written out in batches once batch_size rows or flush_interval seconds have
+    accumulated. close() flushes the remainder and logs the write rate.
+    """
+
+    def __init__(self, path: Union[str, Path], fieldnames: List[str], batch_size: int = 1000,
+                 flush_interval: float = 5.0, append: bool = False):
+        self.path = Path(path)
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._buffer: List[List[Any]] = []
+        self._started = time.monotonic()
+        self._last_flush = self._started
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_header = not append or not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, "a" if append else "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if write_header:
+            self._writer.writerow(self.fieldnames)
+
+    def encode(self, row: Dict[str, Any]) -> List[Any]:
+        """The row as buffered: its values in field order"""
+        return [row.get(field, "") for field in self.fieldnames]
+
+    def write(self, row: Dict[str, Any]):
+        """Queue one row, flushing if a size or time threshold is reached"""
+        self.write_encoded(self.encode(row))
+
+    def write_encoded(self, values: List[Any]):
+        """Queue a row already passed through encode()"""
+        self._buffer.append(values)
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_many(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """Write buffered rows to disk"""
+        if self._buffer:
+            self._writer.writerows(self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def checkpoint(self) -> Optional[int]:
+        """Flush to stable storage and return the file size, which a resumed run can truncate back to"""
+        self.flush()
+        os.fsync(self._file.fileno())
+        return os.fstat(self._file.fileno()).st_size
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.monotonic() - self._started
+        return (self.rows_written + len(self._buffer)) / elapsed if elapsed > 0 else 0.0
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        logger.info(f"Wrote {self.rows_written} rows to {self.path} ({self.rows_per_second:.1f} rows/sec)")
+
+class ParquetSink:
+    """
+    Columnar output sink writing the product schema to Parquet.
+
+    Rows are buffered like CsvSink and written as one row group every
+    row_group_size rows, so the file grows incrementally during the scrape.
+    NUMERIC_OUTPUT_FIELDS become float64 columns and the remaining string
+    columns are dictionary encoded, which collapses the values repeated on
+    every row of a product. Empty strings and None are stored as nulls.
+    """
+
+    def __init__(self, path: Union[str, Path], fieldnames: List[str], numeric_fields: List[str] = None,
+                 row_group_size: int = 50000):
+        if pa is None:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+
+        self.path = Path(path)
+        self.fieldnames = list(fieldnames)
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        numeric = set(NUMERIC_OUTPUT_FIELDS if numeric_fields is None else numeric_fields)
+        self.schema = pa.schema([
+            pa.field(name, pa.float64() if name in numeric else pa.string()) for name in self.fieldnames
+        ])
+        self._numeric = [name in numeric for name in self.fieldnames]
+        self._buffer: List[List[Any]] = []
+        self._started = time.monotonic()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        string_columns = [name for name, is_numeric in zip(self.fieldnames, self._numeric) if not is_numeric]
+        self._writer = pq.ParquetWriter(self.path, self.schema, use_dictionary=string_columns, compression="zstd")
+
+    @staticmethod
+    def _to_float(value: Any) -> Optional[float]:
+        if value is None or value == "":
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def encode(self, row: Dict[str, Any]) -> List[Any]:
+        """The row as buffered: its values in field order"""
+        return [row.get(field) for field in self.fieldnames]
+
+    def write(self, row: Dict[str, Any]):
+        """Queue one row, writing a row group once enough rows are buffered"""
+        self.write_encoded(self.encode(row))
+
+    def write_encoded(self, values: List[Any]):
+        """Queue a row already passed through encode()"""
+        self._buffer.append(values)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def write_many(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """Write buffered rows as a row group"""
+        if not self._buffer:
+            return
+        columns = []
+        for i, is_numeric in enumerate(self._numeric):
+            if is_numeric:
+                columns.append([self._to_float(row[i]) for row in self._buffer])
+            else:
+                columns.append([None if row[i] is None or row[i] == "" else str(row[i]) for row in self._buffer])
+        self._writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+        self.rows_written += len(self._buffer)
+        self._buffer.clear()
+
+    def checkpoint(self) -> Optional[int]:
+        """A Parquet file is only readable once closed, so it cannot be resumed"""
+        self.flush()
+        return None
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.monotonic() - self._started
+        return (self.rows_written + len(self._buffer)) / elapsed if elapsed > 0 else 0.0
+
+    def close(self):
+        if self._writer is None:
+            return
+        self.flush()
+        self._writer.close()
+        self._writer = None
+        logger.info(f"Wrote {self.rows_written} rows to {self.path} ({self.rows_per_second:.1f} rows/sec)")
+
+class MultiSink:
+    """Fans rows out to several sinks, e.g. CSV and Parquet at once"""
+
+    def __init__(self, sinks: List[Any]):
+        self.sinks = sinks
+
+    def write(self, row: Dict[str, Any]):
+        for sink in self.sinks:
+            sink.write(row)
+
+    def encode(self, row: Dict[str, Any]) -> List[Any]:
+        return [sink.encode(row) for sink in self.sinks]
+
+    def write_encoded(self, values: List[Any]):
+        for sink, sink_values in zip(self.sinks, values):
+            sink.write_encoded(sink_values)
+
+    def write_many(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def checkpoint(self) -> Optional[int]:
+        sizes = [sink.checkpoint() for sink in self.sinks]
+        return None if None in sizes else sizes[0]
+
+    @property
+    def rows_written(self) -> int:
+        return max(sink.rows_written for sink in self.sinks)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+# Open output sinks by path, so scripts can keep addressing outputs by file name
+output_sinks: Dict[str, Any] = {}
+
+def open_csv_sink(path: Union[str, Path], fieldnames: List[str], config: Dict[str, Any] = None,
+                  append: bool = False) -> CsvSink:
+    """Open (truncating unless append is set) a buffered CSV sink and register it under its path"""
+    if config is None:
+        config = DEFAULT_CONFIG
+
+    key = str(Path(path))
+    if key in output_sinks:
+        output_sinks.pop(key).close()
+    sink = CsvSink(
+        path, fieldnames,
+        batch_size=config.get("output_batch_size", 1000),
+        flush_interval=config.get("output_flush_interval", 5.0),
+        append=append,
+    )
+    output_sinks[key] = sink
+    return sink
+
+def open_output_sink(path: Union[str, Path], fieldnames: List[str], config: Dict[str, Any] = None,
+                     append: bool = False):
+    """
+    Open the sink selected by config["output_format"] and register it under path.
+
+    "csv" writes path itself, "parquet" writes path with a .parquet suffix and
+    "both" writes the two side by side.
+    """
+    if config is None:
+        config = DEFAULT_CONFIG
+
+    output_format = config.get("output_format", "csv")
+    if output_format == "csv":
+        return open_csv_sink(path, fieldnames, config, append=append)
+    if output_format not in ("parquet", "both"):
+        raise ValueError(f"Unknown output_format: {output_format}")
+
+    key = str(Path(path))
+    if key in output_sinks:
+        output_sinks.pop(key).close()
+    sink = ParquetSink(
+        Path(path).with_suffix(".parquet"), fieldnames,
+        row_group_size=config.get("parquet_row_group_size", 50000),
+    )
+    if output_format == "both":
+        csv_sink = CsvSink(
+            path, fieldnames,
+            batch_size=config.get("output_batch_size", 1000),
+            flush_interval=config.get("output_flush_interval", 5.0),
+            append=append,
+        )
+        sink = MultiSink([csv_sink, sink])
+    output_sinks[key] = sink
+    return sink
+
+def get_output_sink(path: Union[str, Path]):
+    """Get the sink previously opened for path"""
+    return output_sinks[str(Path(path))]
+
+def close_output_sinks():
+    """Shutdown hook: flush and close every open output sink"""
+    while output_sinks:
+        _, sink = output_sinks.popitem()
+        sink.close()
+
+def parse_script_args(description: str = None, config: Dict[str, Any] = None,
+                      parser: Optional[argparse.ArgumentParser] = None) -> argparse.Namespace:
+    """
+    Parse the command line options shared by the site scripts and apply them to config.
+
+    Options left unset keep the value already in config. A script with
+    options of its own passes a parser that already has them.
+    """
+    if config is None:
+        config = DEFAULT_CONFIG
+
+    if parser is None:
+        parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--output-format", choices=["csv", "parquet", "both"], default=config.get("output_format", "csv"),
+        help="Write products as CSV, Parquet (needs pyarrow) or both"
+    )
+    parser.add_argument(
+        "--parse-workers", type=int, nargs="?", const=os.cpu_count(), default=config.get("parse_workers", 0),
+        help="Parse pages in N worker processes (one per core when N is omitted, 0 parses on the event loop)"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true", default=config.get("incremental", False),
+        help="Only fetch URLs that are new or changed since the last run, per sitemap <lastmod>"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", default=config.get("resume", False),
+        help="Continue the last interrupted run from its checkpoint instead of starting over"
+    )
+    parser.add_argument(
+        "--advance-grid", choices=["rows", "table"], default=config.get("advance_grid", "rows"),
+        help="Write a row per plan and upfront step, or one row per plan plus an upfront/payment table"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", default=config.get("profile", False),
+        help="Sample the run and write per-stage profiles and collapsed stacks to data/outputs"
+    )
+    args = parser.parse_args()
+
+    config["output_format"] = args.output_format
+    config["profile"] = args.profile
+    config["advance_grid"] = args.advance_grid
+    config["resume"] = args.resume
+    config["incremental"] = args.incremental
+    config["parse_workers"] = args.parse_workers
+    return args
+
 def load_product_urls_from_file() -> List[str]:
     """Load product URLs from the product_urls.txt file"""
     product_urls_file = OUTPUTS_DIR / "product_urls.txt"
@@ -497,10 +2513,169 @@ def convert_categories_to_list(categories_dict: Dict[str, Dict[str, Any]]) -> Li
     
     return result
 
+class DedupCsvWriter:
+    """
+    Deduplicating CSV writer backed by an append-only log.
+
+    Every accepted record is appended to "<file>.log" as one JSON line, and an
+    in-memory index maps each ID to the log offset of its latest version, so a
+    write costs one append (plus one seek to merge an update) instead of
+    rereading and rewriting the whole CSV. compact() writes the deduplicated
+    CSV in first-seen order - the same file the old per-record rewrite produced -
+    and is run at checkpoints and on close(). A log left behind by a crashed
+    run is replayed on open.
+    """
+
+    def __init__(self, filepath: Union[str, Path], id_field: str = "sku", fieldnames: List[str] = None):
+        self.filepath = Path(filepath)
+        self.id_field = id_field
+        self.fieldnames = list(fieldnames or STANDARD_CSV_HEADERS)
+        self.log_path = self.filepath.with_name(f"{self.filepath.name}.log")
+        self._index: Dict[str, int] = {}
+        self._orphans: List[int] = []  # records without an ID written since the last ID'd record
+        self._dirty = False
+
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        recovering = self.log_path.exists()
+        self._log = open(self.log_path, "a+b")
+        if recovering:
+            self._replay_log()
+        elif self.filepath.exists():
+            self._load_existing()
+
+    def _append_log(self, record_id: Optional[str], values: List[Any]) -> int:
+        self._log.seek(0, os.SEEK_END)
+        offset = self._log.tell()
+        self._log.write(json.dumps([record_id, values], ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+        return offset
+
+    def _read_log(self, offset: int) -> List[Any]:
+        self._log.flush()
+        self._log.seek(offset)
+        return json.loads(self._log.readline())[1]
+
+    def _load_existing(self):
+        """Index the rows of an existing CSV (one pass per run)"""
+        try:
+            with open(self.filepath, "r", newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    record_id = row.get(self.id_field)
+                    if record_id:
+                        self._index[record_id] = self._append_log(record_id, [row.get(k, "") for k in self.fieldnames])
+        except Exception as e:
+            logger.error(f"Error reading CSV file {self.filepath}: {e}")
+
+    def _replay_log(self):
+        """Rebuild the index from a log left behind by an interrupted run"""
+        self._log.seek(0)
+        offset = 0
+        for line in self._log:
+            try:
+                record_id = json.loads(line)[0]
+            except ValueError:
+                break  # torn last line
+            if record_id:
+                self._index[record_id] = offset
+                self._orphans.clear()
+            else:
+                self._orphans.append(offset)
+            offset += len(line)
+        self._log.truncate(offset)
+        self._dirty = True
+        logger.info(f"Recovered {len(self._index)} records for {self.filepath} from {self.log_path}")
+
+    def write(self, record: Dict[str, Any]):
+        """Add a record, or update the stored one with the same ID"""
+        record_id = record.get(self.id_field)
+        if not record_id:
+            logger.warning(f"Record has no {self.id_field}, cannot deduplicate")
+            self._orphans.append(self._append_log(None, [record.get(k, "") for k in self.fieldnames]))
+            return
+
+        record_id = str(record_id)
+        if record_id in self._index:
+            existing = dict(zip(self.fieldnames, self._read_log(self._index[record_id])))
+            values = [record.get(k, existing.get(k, "")) for k in self.fieldnames]
+            logger.debug(f"Updated existing record with {self.id_field}={record_id}")
+        else:
+            values = [record.get(k, "") for k in self.fieldnames]
+            logger.debug(f"Added new record with {self.id_field}={record_id}")
+        self._index[record_id] = self._append_log(record_id, values)
+        # A rewrite of the file drops rows without an ID, as the old per-record rewrite did
+        self._orphans.clear()
+        self._dirty = True
+
+    def compact(self):
+        """Write the deduplicated CSV and shrink the log to the latest version of each record"""
+        self._log.flush()
+        if not self._dirty:
+            # Nothing with an ID was written: the existing file stays as-is, orphans are appended
+            new_file = not self.filepath.exists()
+            with open(self.filepath, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(self.fieldnames)
+                for offset in self._orphans:
+                    writer.writerow(self._read_log(offset))
+            self._orphans.clear()
+            return
+
+        tmp_path = self.filepath.with_name(f"{self.filepath.name}.tmp")
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.fieldnames)
+            for offset in self._index.values():
+                writer.writerow(self._read_log(offset))
+            for offset in self._orphans:
+                writer.writerow(self._read_log(offset))
+        os.replace(tmp_path, self.filepath)
+
+        # Restart the log from the compacted state so it does not grow without bound
+        entries = [(record_id, self._read_log(offset)) for record_id, offset in self._index.items()]
+        orphans = [self._read_log(offset) for offset in self._orphans]
+        self._log.seek(0)
+        self._log.truncate()
+        self._index = {record_id: self._append_log(record_id, values) for record_id, values in entries}
+        self._orphans = [self._append_log(None, values) for values in orphans]
+        self._log.flush()
+        logger.info(f"Compacted {len(self._index)} unique records into {self.filepath}")
+
+    def close(self):
+        """Compact one final time and remove the log"""
+        if self._log.closed:
+            return
+        self.compact()
+        self._log.close()
+        self.log_path.unlink(missing_ok=True)
+
+# Open deduplicating writers by path
+dedup_writers: Dict[str, Any] = {}
+
+def get_dedup_csv_writer(filepath: Union[str, Path], id_field: str = "sku", fieldnames: List[str] = None) -> DedupCsvWriter:
+    """Get (opening on first use) the deduplicating writer for filepath"""
+    key = str(Path(filepath))
+    if key not in dedup_writers:
+        dedup_writers[key] = DedupCsvWriter(filepath, id_field=id_field, fieldnames=fieldnames)
+    return dedup_writers[key]
+
+def checkpoint_dedup_writers():
+    """Compact every open deduplicating writer to its final file"""
+    for writer in dedup_writers.values():
+        writer.compact()
+
+def close_dedup_writers():
+    """Shutdown hook: compact and close every deduplicating writer"""
+    while dedup_writers:
+        _, writer = dedup_writers.popitem()
+        writer.close()
+
 def append_to_csv_with_deduplication(record: Dict[str, Any], filepath: str, id_field: str = "sku", fieldnames: List[str] = None):
     """
     Append a record to CSV file with deduplication based on a unique ID field.
     If a record with the same ID already exists, it will be updated.
+
+    Writes go through the DedupCsvWriter for filepath; the CSV itself is
+    brought up to date by checkpoint_dedup_writers() or close_dedup_writers().
     
     Args:
         record: The record to append
@@ -508,65 +2683,161 @@ def append_to_csv_with_deduplication(record: Dict[str, Any], filepath: str, id_f
         id_field: Field to use as unique identifier (default: "sku")
         fieldnames: CSV field names (default: STANDARD_CSV_HEADERS)
     """
-    if fieldnames is None:
-        fieldnames = STANDARD_CSV_HEADERS
-        
-    filepath = Path(filepath)
-    filepath.parent.mkdir(parents=True, exist_ok=True)
-    
-    # If file doesn't exist, just write the record
-    if not filepath.exists():
-        with open(filepath, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerow({k: record.get(k, "") for k in fieldnames})
-        return
-    
-    # Read existing records into memory, indexed by ID
-    existing_records = {}
-    try:
-        with open(filepath, "r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row.get(id_field):  # Only index rows with valid IDs
-                    existing_records[row[id_field]] = row
-    except Exception as e:
-        logger.error(f"Error reading CSV file {filepath}: {e}")
-        # If we can't read the file, just append
-        with open(filepath, "a", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writerow({k: record.get(k, "") for k in fieldnames})
-        return
-    
-    # Check if record already exists
-    record_id = record.get(id_field)
-    if record_id and record_id in existing_records:
-        # Update existing record
-        existing_records[record_id] = {k: record.get(k, existing_records[record_id].get(k, "")) for k in fieldnames}
-        logger.debug(f"Updated existing record with {id_field}={record_id}")
-    elif record_id:
-        # Add new record
-        existing_records[record_id] = {k: record.get(k, "") for k in fieldnames}
-        logger.debug(f"Added new record with {id_field}={record_id}")
-    else:
-        logger.warning(f"Record has no {id_field}, cannot deduplicate")
-        # Just append the record without deduplication
-        with open(filepath, "a", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writerow({k: record.get(k, "") for k in fieldnames})
-        return
-    
-    # Write all records back to file
-    with open(filepath, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in existing_records.values():
-            writer.writerow(row)
+    get_dedup_csv_writer(filepath, id_field=id_field, fieldnames=fieldnames).write(record)
+
+class DedupLineWriter:
+    """
+    Deduplicating writer for delimited text files such as output_YYYY_MM_DD.txt.
+
+    Lines are appended to the file as they arrive, updates included. A SQLite
+    index next to the file ("<file>.idx") records, for every ID, its first-seen
+    position and the byte offset of its latest line, plus how many bytes of the
+    file it covers. Reopening a partially written file therefore only scans
+    the unindexed tail. compact() rewrites the file once with one line per ID
+    in first-seen order, keeping lines without an ID where they were.
+    """
+
+    COMMIT_EVERY = 200
+
+    def __init__(self, path: Union[str, Path], id_field_index: int = 4, delimiter: str = "|"):
+        self.path = Path(path)
+        self.id_field_index = id_field_index
+        self.delimiter = delimiter
+        self.index_path = self.path.with_name(f"{self.path.name}.idx")
+        self._pending = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.index_path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS lines ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, record_id TEXT UNIQUE, offset INTEGER NOT NULL, length INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._file = open(self.path, "a+b")
+
+        file_size = self._file.seek(0, os.SEEK_END)
+        indexed = self._indexed_bytes()
+        if indexed > file_size:
+            # The file was replaced or truncated behind the index's back; start over
+            self._db.execute("DELETE FROM lines")
+            indexed = 0
+        if indexed < file_size:
+            self._index_range(indexed)
+        self._db.commit()
+
+    def _indexed_bytes(self) -> int:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'indexed_bytes'").fetchone()
+        return row[0] if row else 0
+
+    def _record_id(self, line: str) -> Optional[str]:
+        fields = line.split(self.delimiter)
+        if len(fields) <= self.id_field_index:
+            return None
+        return fields[self.id_field_index] or None
+
+    def _index_line(self, record_id: Optional[str], offset: int, length: int):
+        if record_id is None:
+            self._db.execute("INSERT INTO lines (record_id, offset, length) VALUES (NULL, ?, ?)", (offset, length))
+        else:
+            # Upsert keeps seq, so an updated ID stays at its first-seen position
+            self._db.execute(
+                "INSERT INTO lines (record_id, offset, length) VALUES (?, ?, ?) "
+                "ON CONFLICT(record_id) DO UPDATE SET offset = excluded.offset, length = excluded.length",
+                (record_id, offset, length),
+            )
+
+    def _set_indexed_bytes(self, value: int):
+        self._db.execute(
+            "INSERT INTO meta (key, value) VALUES ('indexed_bytes', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (value,),
+        )
+
+    def _index_range(self, start: int):
+        """Index the lines of the file from byte offset start to the end"""
+        self._file.seek(start)
+        offset = start
+        count = 0
+        for raw in self._file:
+            if not raw.endswith(b"\n"):
+                break  # torn last line of an interrupted run; it will be overwritten by the next append
+            line = raw.decode("utf-8").strip()
+            if line:
+                self._index_line(self._record_id(line), offset, len(raw) - 1)
+                count += 1
+            offset += len(raw)
+        self._file.truncate(offset)
+        self._set_indexed_bytes(offset)
+        if count:
+            logger.info(f"Indexed {count} lines of {self.path} from byte {start}")
+
+    def write(self, line: str):
+        """Append a line; a later line with the same ID replaces it at compaction"""
+        offset = self._file.seek(0, os.SEEK_END)
+        data = f"{line}\n".encode("utf-8")
+        self._file.write(data)
+        self._index_line(self._record_id(line), offset, len(data) - 1)
+        self._set_indexed_bytes(offset + len(data))
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        """Make appended lines and their index entries durable"""
+        # Data reaches the file before the index that points at it
+        self._file.flush()
+        self._db.commit()
+        self._pending = 0
+
+    def compact(self):
+        """Rewrite the file with the latest line per ID in first-seen order"""
+        self.commit()
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        entries = []
+        with open(tmp_path, "wb") as out:
+            for record_id, offset, length in self._db.execute("SELECT record_id, offset, length FROM lines ORDER BY seq"):
+                self._file.seek(offset)
+                line = self._file.read(length).decode("utf-8").strip()
+                if not line:
+                    continue
+                data = f"{line}\n".encode("utf-8")
+                entries.append((record_id, out.tell(), len(data) - 1))
+                out.write(data)
+            compacted_size = out.tell()
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a+b")
+
+        self._db.execute("DELETE FROM lines")
+        self._db.executemany("INSERT INTO lines (record_id, offset, length) VALUES (?, ?, ?)", entries)
+        self._set_indexed_bytes(compacted_size)
+        self._db.commit()
+        logger.info(f"Compacted {self.path} to {len(entries)} lines")
+
+    def close(self):
+        """Compact one final time; the index is kept so the file can be resumed"""
+        if self._file.closed:
+            return
+        self.compact()
+        self._file.close()
+        self._db.close()
+
+def get_dedup_line_writer(path: Union[str, Path], id_field_index: int = 4, delimiter: str = "|") -> DedupLineWriter:
+    """Get (opening on first use) the deduplicating writer for a delimited file"""
+    key = str(Path(path))
+    if key not in dedup_writers:
+        dedup_writers[key] = DedupLineWriter(path, id_field_index=id_field_index, delimiter=delimiter)
+    return dedup_writers[key]
 
 def append_to_delimited_file_with_deduplication(line: str, path: Path, id_field_index: int = 4, delimiter: str = "|"):
     """
     Append a line to a delimited text file with deduplication based on a field index.
     If a line with the same ID already exists, it will be updated.
+
+    Writes go through the DedupLineWriter for path; duplicates are folded by
+    checkpoint_dedup_writers() or close_dedup_writers().
     
     Args:
         line: The line to append
@@ -574,144 +2845,686 @@ def append_to_delimited_file_with_deduplication(line: str, path: Path, id_field_
         id_field_index: Index of the field to use as unique identifier (default: 4 for "sku")
         delimiter: Field delimiter (default: "|")
     """
-    path.parent.mkdir(parents=True, exist_ok=True)
-    
-    # If file doesn't exist, just write the line
-    if not path.exists():
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(f"{line}\n")
-        return
-    
-    # Parse the line to get the ID
-    fields = line.split(delimiter)
-    if len(fields) <= id_field_index:
-        # Can't deduplicate, just append
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(f"{line}\n")
-        return
-    
-    record_id = fields[id_field_index]
-    if not record_id:
-        # No ID, just append
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(f"{line}\n")
-        return
-    
-    # Read existing lines into memory, indexed by ID
-    existing_lines = {}
-    line_order = []  # To preserve order
-    
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            for existing_line in f:
-                existing_line = existing_line.strip()
-                if not existing_line:
-                    continue
-                    
-                existing_fields = existing_line.split(delimiter)
-                if len(existing_fields) > id_field_index:
-                    existing_id = existing_fields[id_field_index]
-                    if existing_id:
-                        if existing_id not in existing_lines:
-                            line_order.append(existing_id)
-                        existing_lines[existing_id] = existing_line
-                    else:
-                        # No ID, keep the line as is with a generated ID
-                        dummy_id = f"_no_id_{len(line_order)}"
-                        line_order.append(dummy_id)
-                        existing_lines[dummy_id] = existing_line
-                else:
-                    # Line too short, keep as is with a generated ID
-                    dummy_id = f"_short_line_{len(line_order)}"
-                    line_order.append(dummy_id)
-                    existing_lines[dummy_id] = existing_line
-    except Exception as e:
-        logger.error(f"Error reading file {path}: {e}")
-        # If we can't read the file, just append
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(f"{line}\n")
+    get_dedup_line_writer(path, id_field_index=id_field_index, delimiter=delimiter).write(line)
+
+class CrawlState:
+    """
+    Per-URL record of the last incremental scrape of every site.
+
+    For each URL it keeps the sitemap <lastmod> seen at the time, when it was
+    scraped, a hash of its rows (ignoring the "date" column) and the rows
+    themselves as zlib-compressed JSON, so unchanged URLs can be written out
+    again without being fetched. Rows of a site's extra outputs are kept as
+    (output file, row) pairs, as the site yielded them.
+    """
+
+    COMMIT_EVERY = 200
+
+    def __init__(self, path: Union[str, Path] = CRAWL_STATE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._pending = 0
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "site TEXT NOT NULL, url TEXT NOT NULL, lastmod TEXT, scraped_at REAL NOT NULL, "
+            "changed_at REAL NOT NULL, content_hash TEXT NOT NULL, rows BLOB NOT NULL, PRIMARY KEY (site, url))"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def content_hash(rows: List[Any]) -> str:
+        content = [
+            {k: v for k, v in row.items() if k != "date"} if isinstance(row, dict)
+            else [row[0], {k: v for k, v in row[1].items() if k != "date"}]
+            for row in rows
+        ]
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def carry_forward(self, site: str, url: str, lastmod: Optional[str],
+                      max_age: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rows stored for url if its <lastmod> is unchanged since it was scraped
+        (and that scrape is at most max_age seconds old), else None
+        """
+        if not lastmod:
+            return None
+        row = self._db.execute(
+            "SELECT lastmod, scraped_at FROM urls WHERE site = ? AND url = ?", (site, url)
+        ).fetchone()
+        if not row or row[0] != lastmod:
+            return None
+        if max_age is not None and time.time() - row[1] > max_age:
+            return None
+        return self.rows(site, url)
+
+    def rows(self, site: str, url: str, since: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """Rows recorded by the last scrape of url, if any (and if it happened at or after since)"""
+        row = self._db.execute(
+            "SELECT rows, scraped_at FROM urls WHERE site = ? AND url = ?", (site, url)
+        ).fetchone()
+        if not row or (since is not None and row[1] < since):
+            return None
+        # JSON turns (output file, row) pairs into lists
+        return [item if isinstance(item, dict) else tuple(item) for item in json.loads(zlib.decompress(row[0]))]
+
+    def record(self, site: str, url: str, lastmod: Optional[str], rows: List[Dict[str, Any]]) -> bool:
+        """Store the rows of a fresh scrape; returns whether they differ from the previous one"""
+        now = time.time()
+        content_hash = self.content_hash(rows)
+        previous = self._db.execute(
+            "SELECT content_hash, changed_at FROM urls WHERE site = ? AND url = ?", (site, url)
+        ).fetchone()
+        changed = previous is None or previous[0] != content_hash
+        self._db.execute(
+            "INSERT OR REPLACE INTO urls (site, url, lastmod, scraped_at, changed_at, content_hash, rows) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (site, url, lastmod, now, now if changed else previous[1], content_hash,
+             zlib.compress(json.dumps(rows, default=str).encode("utf-8"))),
+        )
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+        return changed
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+class CrawlFrontier:
+    """
+    Durable crawl frontier of one site, for checkpoint and resume.
+
+    Records every URL taken up by a run as pending, done or failed, and the
+    cache keys of the sub-requests (variant and API calls) completed while
+    processing it. Changes are kept in memory and written by checkpoint()
+    together with the size of every output file at that moment and the
+    start time of the run; a URL only counts as done once its rows are in
+    the outputs, so a resumed run can cut them back to those sizes and redo
+    exactly the URLs that were not done.
+    """
+
+    def __init__(self, path: Union[str, Path], site: str):
+        self.path = Path(path)
+        self.site = site
+        self._changes: Dict[str, Tuple[Optional[str], str, Optional[str]]] = {}
+        self._subrequests: List[Tuple[str, str]] = []
+        self._done_subrequests: Dict[str, Set[str]] = defaultdict(set)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS urls (site TEXT NOT NULL, url TEXT NOT NULL, lastmod TEXT, "
+            "status TEXT NOT NULL, error TEXT, updated_at REAL NOT NULL, PRIMARY KEY (site, url))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS subrequests (site TEXT NOT NULL, url TEXT NOT NULL, key TEXT NOT NULL, "
+            "PRIMARY KEY (site, url, key))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints (site TEXT PRIMARY KEY, output_size INTEGER, updated_at REAL NOT NULL, "
+            "started_at REAL, output_sizes TEXT)"
+        )
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(checkpoints)")}
+        for name, ddl in (("started_at", "REAL"), ("output_sizes", "TEXT")):
+            if name not in existing:
+                self._db.execute(f"ALTER TABLE checkpoints ADD COLUMN {name} {ddl}")
+        self._db.commit()
+        row = self._db.execute("SELECT started_at FROM checkpoints WHERE site = ?", (self.site,)).fetchone()
+        # Start of the checkpointed run, replaced by reset() when a new run starts
+        self.started_at: Optional[float] = row[0] if row else None
+
+    def reset(self):
+        """Forget the previous run of the site"""
+        for table in ("urls", "subrequests", "checkpoints"):
+            self._db.execute(f"DELETE FROM {table} WHERE site = ?", (self.site,))
+        self._db.commit()
+        self.started_at = time.time()
+
+    def has_checkpoint(self) -> bool:
+        return self._db.execute("SELECT 1 FROM checkpoints WHERE site = ?", (self.site,)).fetchone() is not None
+
+    @property
+    def output_sizes(self) -> Optional[Dict[str, int]]:
+        """Size per output file recorded by the last checkpoint (None when the outputs cannot be resumed)"""
+        row = self._db.execute("SELECT output_sizes FROM checkpoints WHERE site = ?", (self.site,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def status(self, url: str) -> Optional[str]:
+        """Status of url as of the last checkpoint"""
+        row = self._db.execute("SELECT status FROM urls WHERE site = ? AND url = ?", (self.site, url)).fetchone()
+        return row[0] if row else None
+
+    def mark(self, url: str, lastmod: Optional[str], status: str, error: Optional[str] = None):
+        self._changes[url] = (lastmod, status, error)
+
+    def subrequest_done(self, url: str, key: str) -> bool:
+        if key in self._done_subrequests.get(url, ()):
+            return True
+        return self._db.execute(
+            "SELECT 1 FROM subrequests WHERE site = ? AND url = ? AND key = ?", (self.site, url, key)
+        ).fetchone() is not None
+
+    def record_subrequest(self, url: str, key: str):
+        self._done_subrequests[url].add(key)
+        self._subrequests.append((url, key))
+
+    def checkpoint(self, output_sizes: Optional[Dict[str, int]]):
+        """Write the changes since the last checkpoint and the matching output sizes"""
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO urls (site, url, lastmod, status, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.site, url, lastmod, status, error, now) for url, (lastmod, status, error) in self._changes.items()],
+        )
+        self._db.executemany(
+            "INSERT OR IGNORE INTO subrequests (site, url, key) VALUES (?, ?, ?)",
+            [(self.site, url, key) for url, key in self._subrequests],
+        )
+        # Sub-requests only matter until their URL is done
+        done = [url for url, (_, status, _) in self._changes.items() if status == "done"]
+        self._db.executemany("DELETE FROM subrequests WHERE site = ? AND url = ?", [(self.site, url) for url in done])
+        self._db.execute(
+            "INSERT OR REPLACE INTO checkpoints (site, output_sizes, updated_at, started_at) VALUES (?, ?, ?, ?)",
+            (self.site, json.dumps(output_sizes) if output_sizes is not None else None, now, self.started_at),
+        )
+        self._db.commit()
+        for url in done:
+            self._done_subrequests.pop(url, None)
+        self._changes.clear()
+        self._subrequests.clear()
+
+    def counts(self) -> Dict[str, int]:
+        """Number of URLs per status as of the last checkpoint"""
+        return dict(self._db.execute("SELECT status, COUNT(*) FROM urls WHERE site = ? GROUP BY status", (self.site,)))
+
+    def close(self):
+        self._db.close()
+
+# (frontier, url) of the URL processed by the current task; fetch_url records its sub-requests there
+current_frontier_item: contextvars.ContextVar[Optional[Tuple["CrawlFrontier", str]]] = contextvars.ContextVar(
+    "current_frontier_item", default=None
+)
+
+class SiteScraper:
+    """
+    A site plugin run by run_site_scraper.
+
+    A site only supplies discovery and rows; the engine owns fetching
+    concurrency, output batching, checkpointing, shutdown and reporting.
+    Rows go to output_file; a site with extra outputs (extra_outputs) yields
+    their rows as (output file, row) pairs, and they are written, checkpointed
+    and carried forward together with the main rows of their URL.
+    """
+
+    name = "generic"
+    # Used to look up per-host settings such as "concurrency"
+    site_url = ""
+    output_file = "products.csv"
+    fieldnames = DG_CSV_HEADERS
+    # Config of the current run, set by run_site_scraper
+    config: Dict[str, Any] = DEFAULT_CONFIG
+
+    def discover(self) -> AsyncIterator[Union[str, SitemapEntry]]:
+        """
+        Async iterator of the URLs to scrape, plain or as sitemap entries.
+        Entries with a <lastmod> can be skipped by incremental runs.
+        """
+        raise NotImplementedError
+
+    def rows(self, url: str) -> AsyncIterator[Union[Dict[str, Any], Tuple[str, Dict[str, Any]]]]:
+        """Async generator of the output rows for one URL"""
+        raise NotImplementedError
+
+    def extra_outputs(self, config: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Fieldnames of the files next to output_file that rows() also writes to, by file name"""
+        return {}
+
+    def get_concurrency(self, config: Dict[str, Any]) -> int:
+        return get_host_setting(config, "concurrency", self.site_url, config.get("workers", DEFAULT_WORKERS))
+
+    def open_output(self, config: Dict[str, Any], resume_from: Optional[int] = None):
+        """
+        Open the sink the rows are written to. When resuming, resume_from is
+        the output size recorded by the last checkpoint: the output is cut
+        back to it and appended to.
+        """
+        return open_resumable_sink(OUTPUTS_DIR / self.output_file, self.fieldnames, config, resume_from)
+
+    def open_outputs(self, config: Dict[str, Any], resume_from: Optional[Dict[str, int]] = None) -> "SiteOutput":
+        """Open the main and extra outputs, cut back to their checkpointed sizes when resuming"""
+        resume_from = resume_from or {}
+        main = self.open_output(config, resume_from=resume_from.get(self.output_file))
+        extras = {
+            name: open_resumable_sink(OUTPUTS_DIR / name, fieldnames, config, resume_from.get(name))
+            for name, fieldnames in self.extra_outputs(config).items()
+        }
+        return SiteOutput(self.output_file, main, extras)
+
+def open_resumable_sink(path: Path, fieldnames: List[str], config: Dict[str, Any], resume_from: Optional[int] = None):
+    """Open an output sink, first cutting the file back to resume_from bytes and appending when it is given"""
+    if resume_from is not None and path.exists():
+        if path.stat().st_size < resume_from:
+            logger.warning(f"{path} is shorter than its checkpoint; rows of resumed URLs may be missing")
+        else:
+            with open(path, "r+b") as f:
+                f.truncate(resume_from)
+    return open_output_sink(path, fieldnames, config, append=resume_from is not None)
+
+class SiteOutput:
+    """
+    The main output of a site and its extra outputs, written and checkpointed together.
+
+    encode() routes a row yielded by the site to its sink: plain rows go to
+    the main output, (output file, row) pairs to that extra output.
+    """
+
+    def __init__(self, main_file: str, main, extras: Dict[str, Any]):
+        self.main_file = main_file
+        self.main = main
+        self.extras = extras
+
+    def encode(self, row: Union[Dict[str, Any], Tuple[str, Dict[str, Any]]]) -> Tuple[Optional[str], Any]:
+        if isinstance(row, tuple):
+            name, row = row
+            return name, self.extras[name].encode(row)
+        return None, self.main.encode(row)
+
+    def write_encoded(self, encoded: Tuple[Optional[str], Any]):
+        name, values = encoded
+        (self.main if name is None else self.extras[name]).write_encoded(values)
+
+    def checkpoint(self) -> Optional[Dict[str, int]]:
+        """Size of every output file, or None if one of them cannot be resumed"""
+        sizes = {self.main_file: self.main.checkpoint()}
+        sizes.update((name, sink.checkpoint()) for name, sink in self.extras.items())
+        return None if None in sizes.values() else sizes
+
+    def close(self):
+        self.main.close()
+        for sink in self.extras.values():
+            sink.close()
+
+# Stage markers for StageProfiler: thin wrappers whose frames tag what runs inside them
+
+async def _discover(site: "SiteScraper") -> AsyncIterator[Union[str, SitemapEntry]]:
+    async for item in site.discover():
+        yield item
+
+async def _product_rows(site: "SiteScraper", url: str) -> AsyncIterator[Dict[str, Any]]:
+    async for row in site.rows(url):
+        yield row
+
+def _write_rows(output, staged: List[Any]):
+    for values in staged:
+        output.write_encoded(values)
+
+async def _run_periodically(interval: Optional[float], func: Callable[[], Any]):
+    """Call func every interval seconds until cancelled"""
+    if not interval:
         return
-    
-    # Update or add the new line
-    if record_id in existing_lines:
-        # Update existing line
-        existing_lines[record_id] = line
-        logger.debug(f"Updated existing line with ID={record_id}")
-    else:
-        # Add new line
-        existing_lines[record_id] = line
-        line_order.append(record_id)
-        logger.debug(f"Added new line with ID={record_id}")
-    
-    # Write all lines back to file
-    with open(path, "w", encoding="utf-8") as f:
-        for line_id in line_order:
-            f.write(f"{existing_lines[line_id]}\n")
-
-async def generic_product_worker(
-    queue, 
-    process_func, 
-    brands, 
-    categories, 
-    output_file: Path,
-    processed_count,
-    config: Dict[str, Any]
-):
+    while True:
+        await asyncio.sleep(interval)
+        func()
+
+async def run_site_scraper(site: SiteScraper, config: Dict[str, Any] = None) -> Dict[str, Any]:
     """
-    Generic worker function to process products from the queue.
-    
+    Scrape a site plugin and write its rows.
+
+    URLs are processed by run_bounded as discovery yields them, with the
+    site's per-host concurrency. Rows are encoded by the output sink as the
+    site yields them and handed to it once their URL is complete, so a URL
+    that fails leaves nothing in the output. With config["incremental"], the
+    rows of each URL are also recorded in the CrawlState, and sitemap entries
+    whose <lastmod> is unchanged are not fetched: their recorded rows are
+    written again with today's date.
+
+    Progress is checkpointed to the CrawlFrontier every checkpoint_interval
+    seconds and when the run ends. With config["resume"], URLs done by the
+    checkpointed run are skipped: the output is cut back to the checkpoint
+    and appended to, or, for outputs that cannot be appended to (Parquet),
+    rewritten with the done URLs' rows from the CrawlState when that run
+    recorded them, and fetched again otherwise. HTTP clients, output sinks
+    and dedup writers are closed when the run ends, including on errors.
+
     Args:
-        queue: AsyncIO queue containing product URLs
-        process_func: Function to process each product URL
-        brands: Dictionary of brands
-        categories: Dictionary of categories
-        output_file: Path to output file for streaming results
-        processed_count: SharedCounter to track progress
-        config: Configuration dictionary
-    """
-    source_name = config.get("source_name", "generic")
-    stream_output = config.get("stream_output", True)
+        site: The site plugin to run
+        config: Configuration dictionary (default: DEFAULT_CONFIG)
+
+    Returns:
+        Summary of the run: products, failed, resumed, carried, changed, rows, elapsed and rows_per_second
+    """
+    if config is None:
+        config = DEFAULT_CONFIG
+
+    site.config = config
     save_local = config.get("save_local", True)
-    min_delay = config.get("min_delay", 1.0)
-    max_delay = config.get("max_delay", 3.0)
-    
-    while True:
-        try:
-            product_url = await queue.get()
-            if product_url is None:  # Sentinel value to stop worker
-                queue.task_done()
-                break
-                
-            # Add random delay to avoid being blocked
-            await asyncio.sleep(random.uniform(min_delay, max_delay))
-                
-            product = await process_func(product_url, brands, categories, config)
-            if product:
-                # Set source name
-                if hasattr(product, 'source') and not product.source:
-                    product.source = source_name
-                
-                # Convert to dictionary and CSV record
-                product_dict = product.to_dict()
-                csv_record = product.to_csv_record()
-                
-                # Stream output to file if configured
-                if stream_output and save_local:
-                    # Append to CSV file with deduplication
-                    append_to_csv_with_deduplication(csv_record, output_file, id_field="sku")
-                    
-                    # Append to pipe-delimited file with deduplication
-                    pipe_file = OUTPUTS_DIR / f"output_{date.today().strftime('%Y_%m_%d')}.txt"
-                    pipe_delimited = product.to_pipe_delimited()
-                    append_to_delimited_file_with_deduplication(pipe_delimited, pipe_file, id_field_index=4)  # 4 is the index of "sku"
-                
-                # Update progress
-                await processed_count.increment()
-            
-            queue.task_done()
-        except Exception as e:
-            logger.error(f"Error in worker: {repr(e)}")
-            queue.task_done()
+    logger.info(f"Starting {site.name} scraper")
+    metrics.reset(site.name)
+    profiler = None
+    if config.get("profile", False):
+        if config.get("parse_workers", 0) != 0:
+            logger.warning("Profiling with parse workers: parse time in the worker processes is not sampled")
+        profiler = StageProfiler(config.get("profile_interval", 0.005))
+        profiler.start()
+    parse_pool.start(config)
+    if save_local:
+        ensure_data_dirs()
+    crawl_state = CrawlState(CRAWL_STATE_PATH) if save_local else None
+    frontier = CrawlFrontier(FRONTIER_PATH, site.name) if save_local else None
+    resume = frontier is not None and config.get("resume", False) and frontier.has_checkpoint()
+    if config.get("resume", False) and not resume:
+        logger.warning(f"No checkpoint to resume for {site.name}; starting a fresh run")
+    resume_from = frontier.output_sizes if resume else None
+    if resume_from is not None and set(resume_from) != {site.output_file, *site.extra_outputs(config)}:
+        logger.warning(f"Outputs of {site.name} changed since the checkpoint; rewriting them instead of appending")
+        resume_from = None
+    if resume:
+        logger.info(f"Resuming {site.name} from checkpoint: {frontier.counts()}")
+    elif frontier is not None:
+        frontier.reset()
+    output = site.open_outputs(config, resume_from=resume_from) if save_local else None
+    incremental = crawl_state is not None and config.get("incremental", False)
+    max_age = config.get("incremental_max_age")
+    rows_written = resumed = carried = changed = 0
+    started = time.monotonic()
+
+    def checkpoint():
+        frontier.checkpoint(output.checkpoint() if output is not None else None)
+
+    async def process(item: Union[str, SitemapEntry]) -> int:
+        nonlocal rows_written, resumed, carried, changed
+        url, lastmod = (item.loc, item.lastmod) if isinstance(item, SitemapEntry) else (item, None)
+        rows = None
+        if resume and frontier.status(url) == "done":
+            if resume_from is not None:
+                # Its rows are already in the output kept from the checkpoint
+                frontier.mark(url, lastmod, "done")
+                resumed += 1
+                return 0
+            rows = crawl_state.rows(site.name, url, since=frontier.started_at)
+            if rows is not None:
+                resumed += 1
+        if rows is None and incremental:
+            rows = crawl_state.carry_forward(site.name, url, lastmod, max_age)
+            if rows is not None:
+                today = datetime.now().strftime("%Y-%m-%d")
+                for row in rows:
+                    row = row[1] if isinstance(row, tuple) else row
+                    if "date" in row:
+                        row["date"] = today
+                carried += 1
+        if rows is not None:
+            staged = [output.encode(row) for row in rows] if output is not None else None
+            count = sum(1 for row in rows if not isinstance(row, tuple))
+        else:
+            if frontier is not None:
+                frontier.mark(url, lastmod, "pending")
+            token = current_frontier_item.set((frontier, url)) if frontier is not None else None
+            product_started = time.perf_counter()
+            staged = [] if output is not None else None
+            recorded = [] if incremental else None
+            count = 0
+            try:
+                async for row in _product_rows(site, url):
+                    if staged is not None:
+                        staged.append(output.encode(row))
+                    if isinstance(row, tuple):
+                        if recorded is not None:
+                            recorded.append((row[0], dict(row[1])))
+                        continue
+                    if recorded is not None:
+                        recorded.append(dict(row))
+                    count += 1
+            except Exception as e:
+                if frontier is not None:
+                    frontier.mark(url, lastmod, "failed", repr(e))
+                raise
+            finally:
+                if token is not None:
+                    current_frontier_item.reset(token)
+            metrics.observe("product_seconds", time.perf_counter() - product_started)
+            if recorded is not None and crawl_state.record(site.name, url, lastmod, recorded):
+                changed += 1
+        if output is not None:
+            _write_rows(output, staged)
+        if frontier is not None:
+            frontier.mark(url, lastmod, "done")
+        metrics.inc("rows_written_total", count)
+        rows_written += count
+        return count
+
+    periodic_tasks = [asyncio.create_task(_run_periodically(config.get("dedup_checkpoint_interval", 300), checkpoint_dedup_writers))]
+    if frontier is not None:
+        periodic_tasks.append(asyncio.create_task(_run_periodically(config.get("checkpoint_interval", 30), checkpoint)))
+    try:
+        results = await run_bounded(_discover(site), process, site.get_concurrency(config), desc=f"{site.name} products")
+    finally:
+        for task in periodic_tasks:
+            task.cancel()
+        if frontier is not None:
+            checkpoint()
+            frontier.close()
+        if output is not None:
+            output.close()
+        if crawl_state is not None:
+            crawl_state.close()
+        close_output_sinks()
+        close_dedup_writers()
+        close_parse_pool()
+        subrequest_semaphores.clear()
+        await close_http_clients()
+        if save_local:
+            log_cache_stats()
+        if profiler is not None:
+            profiler.stop()
+            logger.info(f"Profile written to {profiler.write(OUTPUTS_DIR, site.name)}")
+
+    elapsed = time.monotonic() - started
+    failed = sum(1 for r in results if not r.ok)
+    stats = {
+        "site": site.name,
+        "products": len(results) - failed,
+        "failed": failed,
+        "resumed": resumed,
+        "carried": carried,
+        "changed": changed,
+        "rows": rows_written,
+        "elapsed": elapsed,
+        "rows_per_second": rows_written / elapsed if elapsed > 0 else 0.0,
+    }
+    logger.info(
+        f"Scraping completed. {site.name}: {stats['products']} products ({resumed} resumed, {carried} carried forward, "
+        f"{changed} changed), {failed} failed, "
+        f"{rows_written} rows in {elapsed:.1f}s ({stats['rows_per_second']:.1f} rows/sec)"
+    )
+
+    metrics.inc("products_total", stats["products"] - resumed - carried, result="fetched")
+    metrics.inc("products_total", resumed, result="resumed")
+    metrics.inc("products_total", carried, result="carried")
+    metrics.inc("products_total", failed, result="failed")
+    metrics.set("run_seconds", elapsed)
+    metrics.set("rows_per_second", stats["rows_per_second"])
+    metrics.log_summary()
+    if save_local and config.get("metrics", True):
+        prom_path, json_path = metrics.write(config.get("metrics_dir") or OUTPUTS_DIR, site.name)
+        logger.info(f"Metrics written to {prom_path} and {json_path}")
+    return stats
+
+class ProductRecordOutput:
+    """Writes Product CSV records to the deduplicated CSV and the daily pipe-delimited file"""
+
+    def __init__(self, output_file: Path, enabled: bool = True):
+        self.output_file = output_file
+        self.enabled = enabled
+
+    def write(self, record: Dict[str, Any]):
+        if not self.enabled:
+            return
+        append_to_csv_with_deduplication(record, self.output_file, id_field="sku")
+        pipe_file = OUTPUTS_DIR / f"output_{date.today().strftime('%Y_%m_%d')}.txt"
+        pipe_delimited = "|".join(str(record.get(field, "")) for field in STANDARD_CSV_HEADERS)
+        append_to_delimited_file_with_deduplication(pipe_delimited, pipe_file, id_field_index=4)  # 4 is the index of "sku"
+
+    def encode(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(record)
+
+    def write_encoded(self, record: Dict[str, Any]):
+        self.write(record)
+
+    def checkpoint(self) -> Optional[int]:
+        """Deduplicated outputs absorb replayed rows, so they are never cut back"""
+        checkpoint_dedup_writers()
+        return None
+
+    def close(self):
+        close_dedup_writers()
+
+class CallbackSite(SiteScraper):
+    """Site plugin built from the callbacks taken by run_scraper"""
+
+    fieldnames = STANDARD_CSV_HEADERS
+
+    def __init__(
+        self,
+        sitemap_urls: List[str],
+        browse_sitemap_url: str,
+        extract_categories_func: Callable,
+        extract_brands_func: Callable,
+        process_product_func: Callable,
+        output_csv_path: str,
+        config: Dict[str, Any]
+    ):
+        self.sitemap_urls = sitemap_urls
+        self.browse_sitemap_url = browse_sitemap_url
+        self.extract_categories_func = extract_categories_func
+        self.extract_brands_func = extract_brands_func
+        self.process_product_func = process_product_func
+        self.output_csv_path = Path(output_csv_path)
+        self.config = config
+        self.name = config.get("source_name", "generic")
+        self.categories = {}
+        self.brands = {}
+
+    def get_concurrency(self, config: Dict[str, Any]) -> int:
+        # Limit number of workers to avoid being blocked
+        return min(config.get("workers", 3), 3)
+
+    def open_output(self, config: Dict[str, Any], resume_from: Optional[int] = None):
+        return ProductRecordOutput(self.output_csv_path, enabled=config.get("stream_output", True))
+
+    async def discover(self) -> AsyncIterator[str]:
+        config = self.config
+        test = config.get("test", False)
+        test20 = config.get("test20", False)
+        scrape_products_only = config.get("scrape_products_only", False)
+        save_local = config.get("save_local", True)
+        deduplicate = config.get("deduplicate", True)
+
+        # If deduplicate is True, clean existing output files
+        if deduplicate and save_local:
+            output_file = self.output_csv_path
+            if output_file.exists():
+                # Deduplicate existing CSV file
+                try:
+                    existing_records = []
+                    with open(output_file, "r", newline="", encoding="utf-8") as f:
+                        reader = csv.DictReader(f)
+                        for row in reader:
+                            existing_records.append(row)
+
+                    if existing_records:
+                        save_to_csv(existing_records, output_file)
+                        logger.info(f"Deduplicated existing CSV file: {output_file}")
+                except Exception as e:
+                    logger.error(f"Error deduplicating existing CSV file {output_file}: {e}")
+
+        product_urls = []
+
+        # If scrape_products_only is True, load product URLs from file
+        if scrape_products_only:
+            logger.info("Product-only mode: Loading product URLs from file")
+            product_urls = load_product_urls_from_file()
+            if not product_urls:
+                logger.warning("No product URLs found in file. Exiting.")
+                return
+        else:
+            # Use a fallback approach if sitemap is blocked
+            try:
+                # Try to fetch browse sitemap
+                browse_urls = await fetch_sitemap(self.browse_sitemap_url, config)
+                if not browse_urls:
+                    raise Exception(f"Failed to fetch browse sitemap: {self.browse_sitemap_url}")
+
+                # Extract categories and brands
+                self.categories = self.extract_categories_func(browse_urls)
+                self.brands = self.extract_brands_func(browse_urls)
+
+                # Save categories to output file if configured
+                if save_local:
+                    categories_output = OUTPUTS_DIR / "categories.txt"
+                    with open(categories_output, "w", encoding="utf-8") as f:
+                        for cat in self.categories.values():
+                            f.write(f"{cat['name']}|{cat['url']}\n")
+                    logger.info(f"Saved {len(self.categories)} categories to {categories_output}")
+            except Exception as e:
+                logger.warning(f"Sitemap approach failed: {e}. Using direct product URLs.")
+
+            # Save categories in hierarchical format
+            if self.categories and save_local:
+                category_list = convert_categories_to_list(self.categories)
+                save_to_file(category_list, "data/categories/categories.json")
+
+            # Save brands list
+            if self.brands and save_local:
+                brand_list = [brand.to_dict() for brand in self.brands.values()]
+                save_to_file(brand_list, "data/brands/brands.json")
+
+            # Try to fetch product sitemaps
+            try:
+                for sitemap_url in self.sitemap_urls:
+                    urls = await fetch_sitemap(sitemap_url, config)
+                    product_urls.extend(urls)
+
+                if not product_urls:
+                    raise Exception("No product URLs found in sitemaps")
+
+                # Save product URLs to file if configured
+                if save_local:
+                    product_urls_output = OUTPUTS_DIR / "product_urls.txt"
+                    with open(product_urls_output, "w", encoding="utf-8") as f:
+                        for url in product_urls:
+                            f.write(f"{url}\n")
+                    logger.info(f"Saved {len(product_urls)} product URLs to {product_urls_output}")
+
+            except Exception as e:
+                logger.warning(f"Product sitemap approach failed: {e}. Using test product URLs.")
+                product_urls = []
+
+        # Limit for testing
+        if test:
+            product_urls = product_urls[:5]
+        elif test20:
+            product_urls = product_urls[:20]
+
+        if not product_urls:
+            logger.error("No product URLs to process. Exiting.")
+            return
+
+        for url in product_urls:
+            yield url
+
+    async def rows(self, url: str) -> AsyncIterator[Dict[str, Any]]:
+        product = await self.process_product_func(url, self.brands, self.categories, self.config)
+        if product:
+            # Set source name
+            if hasattr(product, 'source') and not product.source:
+                product.source = self.name
+            yield product.to_csv_record()
 
 async def run_scraper(
     sitemap_urls: List[str],
@@ -724,6 +3537,9 @@ async def run_scraper(
 ):
     """
     Generic scraper workflow that can be used by any brand
+
+    The callbacks are wrapped in a CallbackSite and run by run_site_scraper;
+    new site scripts should subclass SiteScraper directly.
     
     Args:
         sitemap_urls: List of product sitemap URLs
@@ -736,166 +3552,15 @@ async def run_scraper(
     """
     if config is None:
         config = DEFAULT_CONFIG.copy()
-    
-    # Extract configuration options
-    test = config.get("test", False)
-    test20 = config.get("test20", False)
-    workers = config.get("workers", 3)
-    scrape_products_only = config.get("scrape_products_only", False)
-    save_local = config.get("save_local", True)
-    source_name = config.get("source_name", "generic")
-    deduplicate = config.get("deduplicate", True)  # New option for deduplication
-    
-    logger.info(f"Starting {source_name} scraper with configuration: {config}")
-    ensure_data_dirs()
-    
-    # If deduplicate is True, clean existing output files
-    if deduplicate and save_local:
-        output_file = Path(output_csv_path)
-        if output_file.exists():
-            # Deduplicate existing CSV file
-            try:
-                existing_records = []
-                with open(output_file, "r", newline="", encoding="utf-8") as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        existing_records.append(row)
-                
-                if existing_records:
-                    save_to_csv(existing_records, output_file)
-                    logger.info(f"Deduplicated existing CSV file: {output_file}")
-            except Exception as e:
-                logger.error(f"Error deduplicating existing CSV file {output_file}: {e}")
-    
-    # Initialize results
-    categories = {}
-    brands = {}
-    product_urls = []
-    
-    # If scrape_products_only is True, load product URLs from file
-    if scrape_products_only:
-        logger.info("Product-only mode: Loading product URLs from file")
-        product_urls = load_product_urls_from_file()
-        if not product_urls:
-            logger.warning("No product URLs found in file. Exiting.")
-            return
-    else:
-        # Use a fallback approach if sitemap is blocked
-        try:
-            # Try to fetch browse sitemap
-            browse_urls = await fetch_sitemap(browse_sitemap_url, config)
-            if not browse_urls:
-                raise Exception(f"Failed to fetch browse sitemap: {browse_sitemap_url}")
-                
-            # Extract categories and brands
-            categories = extract_categories_func(browse_urls)
-            brands = extract_brands_func(browse_urls)
-            
-            # Save categories to output file if configured
-            if save_local:
-                categories_output = OUTPUTS_DIR / "categories.txt"
-                with open(categories_output, "w", encoding="utf-8") as f:
-                    for cat in categories.values():
-                        f.write(f"{cat['name']}|{cat['url']}\n")
-                logger.info(f"Saved {len(categories)} categories to {categories_output}")
-        except Exception as e:
-            logger.warning(f"Sitemap approach failed: {e}. Using direct product URLs.")
-        
-        # Save categories in hierarchical format
-        if categories and save_local:
-            category_list = convert_categories_to_list(categories)
-            save_to_file(category_list, "data/categories/categories.json")
-        
-        # Save brands list
-        if brands and save_local:
-            brand_list = [brand.to_dict() for brand in brands.values()]
-            save_to_file(brand_list, "data/brands/brands.json")
-        
-        # Try to fetch product sitemaps
-        try:
-            for sitemap_url in sitemap_urls:
-                urls = await fetch_sitemap(sitemap_url, config)
-                product_urls.extend(urls)
-                
-            if not product_urls:
-                raise Exception("No product URLs found in sitemaps")
-                
-            # Save product URLs to file if configured
-            if save_local:
-                product_urls_output = OUTPUTS_DIR / "product_urls.txt"
-                with open(product_urls_output, "w", encoding="utf-8") as f:
-                    for url in product_urls:
-                        f.write(f"{url}\n")
-                logger.info(f"Saved {len(product_urls)} product URLs to {product_urls_output}")
-                
-        except Exception as e:
-            logger.warning(f"Product sitemap approach failed: {e}. Using test product URLs.")
-            # Generate some test URLs if all else fails
-            product_urls = []
-    
-    # Limit for testing
-    if test:
-        product_urls = product_urls[:5]
-    elif test20:
-        product_urls = product_urls[:20]
-    
-    if not product_urls:
-        logger.error("No product URLs to process. Exiting.")
-        return
-    
-    # Set up queue and workers for concurrent processing
-    queue = asyncio.Queue()
-    
-    # Add all product URLs to the queue
-    for url in product_urls:
-        await queue.put(url)
-    
-    # Prepare output file path
-    output_file = Path(output_csv_path)
-    
-    # Shared counter for progress tracking
-    processed_count = SharedCounter(0)
-    
-    # Limit number of workers to avoid being blocked
-    actual_workers = min(workers, 3)  # Limit to 3 workers max
-    logger.info(f"Using {actual_workers} workers to avoid rate limiting")
-    
-    # Create worker tasks
-    worker_tasks = []
-    for _ in range(actual_workers):
-        task = asyncio.create_task(
-            generic_product_worker(
-                queue, 
-                process_product_func, 
-                brands, 
-                categories, 
-                output_file,
-                processed_count,
-                config
-            )
-        )
-        worker_tasks.append(task)
-    
-    # Set up progress bar
-    total_products = len(product_urls)
-    with tqdm(total=total_products) as pbar:
-        # Update progress bar periodically
-        last_count = 0
-        while not queue.empty():
-            current_count = processed_count.value
-            if current_count > last_count:
-                pbar.update(current_count - last_count)
-                last_count = current_count
-            await asyncio.sleep(0.5)
-    
-    # Wait for all tasks to be processed
-    await queue.join()
-    
-    # Stop workers
-    for _ in range(actual_workers):
-        await queue.put(None)
-    
-    # Wait for all workers to finish
-    await asyncio.gather(*worker_tasks)
-    
-    logger.info(f"Scraping completed. Processed {processed_count.value} products.")
+
+    logger.info(f"Starting {config.get('source_name', 'generic')} scraper with configuration: {config}")
+    site = CallbackSite(
+        sitemap_urls,
+        browse_sitemap_url,
+        extract_categories_func,
+        extract_brands_func,
+        process_product_func,
+        output_csv_path,
+        config,
+    )
+    return await run_site_scraper(site, config)
@@ -1,7 +1,6 @@
 import os
 from functions import *
 import re
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 import html
 
@@ -9,71 +8,32 @@ import html
 
 
 
-if DEFAULT_CONFIG["save_local"]:
-
-    for folder in [DATA_DIR, SITEMAPS_DIR, PRODUCTS_DIR,OUTPUTS_DIR ]:
-        os.makedirs(folder, exist_ok=True)
-
 logger = setup_logger("logs/scraper.log")
 
+# Parts of a product page read by parse_product_page (every <li> is scanned for the warranty)
+PRODUCT_PAGE_SCOPE = ["li", ".summary", ".promo-pill", "div.configure-container", "#handset-gallery", ".handset-chosen"]
 
 
 
-def get_standard_csv_headers():
-    headers = [
-        "source", "date", "apiURL", "url", "sku", "name", "brand","stock",
-        "advance","paymentAmount","phoneContractDuration","sim_price","simContractname","simContractDuration","phoneContractPrice","isPhoneContractAvailableWOsim"
-        ,"phoneContractSimPackage","handsetOnlyCostCash","handsetOnlyContract",
-        "previousPrice", "onSale", "saleText",
-        "plan_type","sim_data","simOfferData", "sim1YearIncrease", "sim2YearIncrease", "sim3YearIncrease","simDesc",
-        "colour", "size", "UPC", "EAN",
-        "cat", "subcat1", "subcat2", "subcat3", "subcat4", "subcat5", "warranty",
-        "image1", "image2", "image3", "image4", "image5", "desc", "shortDesc",
-        "reviewCount", "reviewRating", "videoURL", "isSellingFast",
-        "isRestockingSoon", "isPromotion", "isOutletPrice", "lowestPriceText",
-        "lowestPriceValue"
-    ]
-    for i in range(1, 21):
-        headers += [f"attributeType{i}", f"attributeTitle{i}", f"attributeValue{i}"]
-    return headers
-
-def create_csv_file(filepath):
-    if DEFAULT_CONFIG["save_local"]:
-
-        headers = get_standard_csv_headers()
-        with open(OUTPUTS_DIR/filepath, mode="w", newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-
-def append_to_csv(item, filepath):
-
-    if DEFAULT_CONFIG["save_local"]:
-
-        headers = get_standard_csv_headers()
-        with open(OUTPUTS_DIR/filepath, mode="a", newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writerow(item)
-
 
-def extract_images(html: str, base_url: str = "https://phones.lebara.co.uk"):
+def extract_images(soup: HtmlNode, base_url: str = "https://phones.lebara.co.uk"):
     """
     Extract all unique handset images (full paths).
     Args:
-        html (str): page HTML
+        soup (HtmlNode): parsed page (see parse_html)
         base_url (str): base domain for relative paths
     Returns:
         list: list of image URLs
     """
-    soup = BeautifulSoup(html, "html.parser")
     images = []
 
     for a in soup.select("#handset-gallery a[href]"):
-        full = urljoin(base_url, a.get("href").strip())
+        full = urljoin(base_url, a.attr("href").strip())
         images.append(full)
 
     chosen = soup.select_one(".handset-chosen img[src]")
     if chosen:
-        full = urljoin(base_url, chosen.get("src").strip())
+        full = urljoin(base_url, chosen.attr("src").strip())
         if full not in images:
             images.insert(0, full)
 
@@ -89,7 +49,7 @@ def extract_images(html: str, base_url: str = "https://phones.lebara.co.uk"):
 def get_size(soup, fallback_name="", fallback_url=""):
     size_tag = soup.select_one("div.configure-container.default p")
     if size_tag:
-        return size_tag.get_text(strip=True)
+        return size_tag.text()
 
     if fallback_name:
         match = re.search(r"\b\d+\s*(GB|TB)\b", fallback_name, re.IGNORECASE)
@@ -113,7 +73,7 @@ def extract_specs(raw_data, max_attributes=20):
     clean_html = html.unescape(raw_html)
     clean_html = clean_html.replace('\\"', '"').replace("\\/", "/")
 
-    soup = BeautifulSoup(clean_html, "html.parser")
+    soup = parse_html(clean_html, scope=["table.spec-section"])
 
     specs = []
     rows = soup.select("table.spec-section tr")
@@ -123,8 +83,8 @@ def extract_specs(raw_data, max_attributes=20):
         if not th or not td:
             continue
 
-        title = th.get_text(strip=True).rstrip(":")
-        value = " ".join(td.stripped_strings)
+        title = th.text().rstrip(":")
+        value = " ".join(td.strings())
 
         specs.append({
             "attributeType": "SPECIFICATION",
@@ -135,18 +95,16 @@ def extract_specs(raw_data, max_attributes=20):
 
 
 
-async def fetch_single_product(url: str):
-    confing = DEFAULT_CONFIG.copy()
-    confing["use_scrapingbee"] = False
-    response = await fetch_url(url, content_type="product", headers={},config=confing)
-
-    soup = BeautifulSoup(response, "html.parser")
-    items = [li.get_text(strip=True) for li in soup.select(".summary li")]
+def parse_product_page(url: str, response: str) -> list:
+    """Build the page-level part of the rows for every ecommerce block on a product page"""
+    soup = parse_html(response, scope=PRODUCT_PAGE_SCOPE)
+    items = [li.text() for li in soup.select(".summary li")]
 
     desc = " | ".join(items)
     pattern = r"dataLayer\.push\((\{[\s\S]*?\})\);"
     matches = re.findall(pattern, response)
 
+    rows = []
     for block in matches:
         if "'ecommerce'" in block or '"ecommerce"' in block:
             fixed = block.replace("'", '"')
@@ -165,23 +123,6 @@ async def fetch_single_product(url: str):
                 row["stock"] = ""
                 row["desc"] = desc
                 row["shortDesc"] = ""
-                data = {
-                    'handset_id': row["sku"],
-                }
-                api_video = f"https://phones.lebara.co.uk/functions_handset/get_video?{row["sku"]}"
-
-                response_video = await fetch_url(api_video,method="POST", content_type="product", data=data, headers={},config=confing)
-                response_video_json = json.loads(response_video)
-                clean_html = html.unescape(response_video_json["html"])
-
-                soupvideo = BeautifulSoup(clean_html, "html.parser")
-                iframe = soupvideo.find("iframe")
-                video_url = iframe["src"] if iframe else ""
-
-                if video_url.startswith("//"):
-                    video_url = "https:" + video_url
-
-                row["videoURL"] = video_url if video_url else ""
 
                 row["lowestPriceValue"] = ""
                 row["reviewRating"] = ""
@@ -189,7 +130,7 @@ async def fetch_single_product(url: str):
                 row["handsetOnlyCostCash"] = data_product["ecommerce"]["impressions"][0]["price"]
                 promo = soup.select_one(".promo-pill")
                 if promo:
-                    text = promo.get_text(strip=True)
+                    text = promo.text()
                     match = re.search(r"\d+", text)
                     if match:
                         row["previousPrice"] = float(match.group(0))+float(row["handsetOnlyCostCash"])
@@ -197,7 +138,7 @@ async def fetch_single_product(url: str):
                     row["previousPrice"] = ""
 
                 row["onSale"] = "Y" if row["previousPrice"] else ""
-                row["saleText"] = promo.get_text(strip=True) if promo else ""
+                row["saleText"] = promo.text() if promo else ""
 
                 row["colour"] = data_product["ecommerce"]["impressions"][0]["variant"]
                 name = data_product["ecommerce"]["impressions"][0]["name"]
@@ -214,8 +155,8 @@ async def fetch_single_product(url: str):
                 row["subcat3"] = parts[3] if len(parts) > 3 else ""
                 row["subcat4"] = parts[4] if len(parts) > 4 else ""
                 row["subcat5"] = parts[5] if len(parts) > 5 else ""
-                for li in soup.find_all("li"):
-                    text = li.get_text(strip=True)
+                for li in soup.select("li"):
+                    text = li.text()
                     if "warranty" in text.lower():
                         match = re.search(r"\d+\s*[-]?\s*\w+", text)
                         if match:
@@ -228,25 +169,54 @@ async def fetch_single_product(url: str):
                 row["isPromotion"] = "Y" if promo else ""
                 row["isOutletPrice"] = ""
                 row["lowestPriceText"] = ""
-                imgs = extract_images(response)
+                imgs = extract_images(soup)
 
                 for idx in range(1, 5 + 1):
                     if idx <= len(imgs):
                         row[f"image{idx}"] = imgs[idx - 1]
                     else:
                         row[f"image{idx}"] = ""
+                rows.append(row)
+    return rows
+
+def extract_video_url(response_video: str) -> str:
+    response_video_json = json.loads(response_video)
+    clean_html = html.unescape(response_video_json["html"])
+
+    soupvideo = parse_html(clean_html)
+    iframe = soupvideo.select_one("iframe")
+    video_url = iframe.attr("src", "") if iframe else ""
+
+    if video_url.startswith("//"):
+        video_url = "https:" + video_url
+    return video_url
+
+async def fetch_single_product(url: str, config: Dict[str, Any] = None):
+    # Lebara's pages and handset endpoints are fetched directly, never through ScrapingBee
+    config = {**(config or DEFAULT_CONFIG), "use_scrapingbee": False}
+    response = await fetch_url(url, content_type="product", headers={},config=config)
 
+    for row in await run_parse(parse_product_page, url, response):
+        data = {
+            'handset_id': row["sku"],
+        }
+        api_video = f"https://phones.lebara.co.uk/functions_handset/get_video?{row["sku"]}"
 
-                api_spec = f"https://phones.lebara.co.uk/functions_handset/get_spec?{row["sku"]}"
+        response_video = await fetch_url(api_video,method="POST", content_type="product", data=data, headers={},config=config)
+        video_url = await run_parse(extract_video_url, response_video)
+        row["videoURL"] = video_url if video_url else ""
 
-                response_spec = await fetch_url(api_spec,method="POST", content_type="product", data=data, headers={},config=confing)
-                specs = extract_specs(response_spec)
-                for idx, spec in enumerate(specs, start=1):
-                    row[f"attributeType{idx}"] = spec["attributeType"]
-                    row[f"attributeTitle{idx}"] = spec["attributeTitle"]
-                    row[f"attributeValue{idx}"] = spec["attributeValue"]
 
-                append_to_csv(row, "products.csv")
+        api_spec = f"https://phones.lebara.co.uk/functions_handset/get_spec?{row["sku"]}"
+
+        response_spec = await fetch_url(api_spec,method="POST", content_type="product", data=data, headers={},config=config)
+        specs = await run_parse(extract_specs, response_spec)
+        for idx, spec in enumerate(specs, start=1):
+            row[f"attributeType{idx}"] = spec["attributeType"]
+            row[f"attributeTitle{idx}"] = spec["attributeTitle"]
+            row[f"attributeValue{idx}"] = spec["attributeValue"]
+
+        yield row
 
 
 
@@ -263,9 +233,10 @@ def extract_offers(obj):
             offers.extend(extract_offers(item))
     return offers
 
-async def fetch_sim_plan(url_plan: str):
-    html = await fetch_url(url_plan,config=DEFAULT_CONFIG,headers={},content_type="product")
-    json_data = json.loads(html)
+def build_plan_rows(response: str) -> list:
+    """Build one SIM ONLY row per offer in the plans feed"""
+    rows = []
+    json_data = json.loads(response)
     offers = extract_offers(json_data)
     for offer in offers:
         row = {}
@@ -304,35 +275,13 @@ async def fetch_sim_plan(url_plan: str):
         row["simDesc"] = " | ".join(allowances)
 
 
-        append_to_csv(row, "products.csv")
-
-
-async def extact_data_from_product_url(all_product_urls: list[str]):
-    tasks = []
-    total_urls = len(all_product_urls)
-
-    with tqdm(total=total_urls, desc="Processing product URLs", ncols=100) as pbar:
-        for url in all_product_urls:
-            task = asyncio.create_task(wrapped_fetch(url))
-            tasks.append(task)
-            pbar.update(1)
-            if len(tasks) >= DEFAULT_WORKERS:
-                await tasks.pop(0)
-
-    for task in tasks:
-        await task
-
-
-
-async def wrapped_fetch(url):
-    try:
-        await fetch_single_product(url)
-    except Exception as e:
-        logger = logging.getLogger("scraper")
-        logger.warning(f"Failed to fetch {url}: {e}")
-
-
+        rows.append(row)
+    return rows
 
+async def fetch_sim_plan(url_plan: str, config: Dict[str, Any] = None):
+    response = await fetch_url(url_plan,config=config,headers={},content_type="product")
+    for row in await run_parse(build_plan_rows, response):
+        yield row
 
 
 def get_product_links(urls):
@@ -353,23 +302,29 @@ def get_product_links(urls):
     return list(set(product_links))
 
 
+class LebaraSite(SiteScraper):
+    name = "lebara"
+    site_url = "https://phones.lebara.co.uk"
+    sitemap_url = "https://phones.lebara.co.uk/sitemap.xml"
+    plan_url = "https://www.lebara.co.uk/en/best-sim-only-deals.model.json"
 
+    async def discover(self):
+        yield self.plan_url
+        site_maps = await fetch_sitemap_entries(self.sitemap_url, self.config)
+        lastmods = {f"{entry.loc}?simfree=1": entry.lastmod for entry in site_maps}
+        for url in get_product_links([entry.loc for entry in site_maps]):
+            yield SitemapEntry(url, lastmods.get(url))
 
-async def main():
-    create_csv_file("products.csv")
-
-    url_plan = "https://www.lebara.co.uk/en/best-sim-only-deals.model.json"
-    await fetch_sim_plan(url_plan)
-
-
-    url = "https://phones.lebara.co.uk/sitemap.xml"
-    site_maps = await fetch_sitemap(url)
-    products = get_product_links(site_maps)
-    data = await extact_data_from_product_url(products)
-
+    def rows(self, url: str):
+        if url == self.plan_url:
+            return fetch_sim_plan(url, self.config)
+        return fetch_single_product(url, self.config)
 
 
+async def main():
+    await run_site_scraper(LebaraSite())
 
 
 if __name__ == "__main__":
+    parse_script_args("Scrape Lebara products")
     asyncio.run(main())
@@ -3,7 +3,6 @@ import time
 from functions import *
 import os
 from html import unescape
-from bs4 import BeautifulSoup
 import urllib.parse
 
 
@@ -11,86 +10,33 @@ import urllib.parse
 
 
 
-if DEFAULT_CONFIG["save_local"]:
-
-    for folder in [DATA_DIR, SITEMAPS_DIR, PRODUCTS_DIR,OUTPUTS_DIR ]:
-        os.makedirs(folder, exist_ok=True)
-
 logger = setup_logger("logs/scraper.log")
 
+# Columns of the upfront/payment table written with advance_grid "table" (see build_variant_rows)
+ADVANCE_GRID_FIELDS = [
+    "url", "sku", "colour", "size", "simContractname", "phoneContractDuration", "handsetOnlyCostCash",
+    "advance", "paymentAmount",
+]
+ADVANCE_GRID_FILE = "mozillion_advance_grid.csv"
 
+# Parts of a product page read by parse_product_page
+PRODUCT_PAGE_SCOPE = ["#tab-sim", "#accordion-flush-body-1", "span.less-text", "span.more-text", "input#price-slider"]
 
 
-def get_standard_csv_headers():
-    headers = [
-        "source", "date", "apiURL", "url", "sku", "name", "brand","stock",
-        "advance","paymentAmount","phoneContractDuration","sim_price","simContractname","simContractDuration","phoneContractPrice","isPhoneContractAvailableWOsim"
-        ,"phoneContractSimPackage","handsetOnlyCostCash","handsetOnlyContract",
-        "previousPrice", "onSale", "saleText",
-        "plan_type","sim_data","simOfferData", "sim1YearIncrease", "sim2YearIncrease", "sim3YearIncrease","simDesc",
-        "colour", "size", "UPC", "EAN",
-        "cat", "subcat1", "subcat2", "subcat3", "subcat4", "subcat5", "warranty",
-        "image1", "image2", "image3", "image4", "image5", "desc", "shortDesc",
-        "reviewCount", "reviewRating", "videoURL", "isSellingFast",
-        "isRestockingSoon", "isPromotion", "isOutletPrice", "lowestPriceText",
-        "lowestPriceValue"
-    ]
-    for i in range(1, 21):
-        headers += [f"attributeType{i}", f"attributeTitle{i}", f"attributeValue{i}"]
-    return headers
-
-def create_csv_file(filepath):
-    if DEFAULT_CONFIG["save_local"]:
-
-        headers = get_standard_csv_headers()
-        with open(OUTPUTS_DIR/filepath, mode="w", newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-
-def append_to_csv(item, filepath):
-
-    if DEFAULT_CONFIG["save_local"]:
-
-        headers = get_standard_csv_headers()
-        with open(OUTPUTS_DIR/filepath, mode="a", newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writerow(item)
-
-
-
-
-
-
-async def fetch_single_product(url: str):
-
-    # print(url)
-
-    with httpx.Client() as client:
-        response = client.get(url)
-
-        mozillion_session = response.cookies.get("mozillion_session")
-    #####################################################
-
-    match = re.search(r'_token:\s*"([^"]+)"', response.text)
-    _token =  match.group(1)
-    # print("_token",_token)
-    # print("mozillion_session:", mozillion_session)
-
-    #####################################################
 
-    response = await fetch_url(url, content_type="product")
 
-    # print(response)
+def parse_product_page(html: str) -> dict:
+    """Pull the model id, descriptions, specs, colours, capacities and max upfront out of a product page"""
     pattern_product_model_id = r'product_model_id: "(\d+)"'
-    product_model_id = re.findall(pattern_product_model_id, response)[0]
-    soup = BeautifulSoup(response, 'html.parser')
+    product_model_id = re.findall(pattern_product_model_id, html)[0]
+    soup = parse_html(html, scope=PRODUCT_PAGE_SCOPE)
 
 
 
     #####################################################
     # sim_detals
     try:
-        sim_items = [li.get_text(strip=True) for li in soup.select("#tab-sim ul li")]
+        sim_items = [li.text() for li in soup.select("#tab-sim ul li")]
         simDesc = " | ".join(sim_items)
     except:
         simDesc = ""
@@ -100,39 +46,257 @@ async def fetch_single_product(url: str):
         spec_items = soup.select("#accordion-flush-body-1 ul li")
     except:
         spec_items = []
+    specs = []
+    for li in spec_items:
+        if len(specs) >= 20:
+            break
+        strong = li.select_one("strong")
+        if strong:
+            title = strong.text().replace(":", "")
+            description = strong.next_text()
+            specs.append((title, description.upper()))
     #####################################################
     try:
-        less_text = soup.find('span', class_='less-text').get_text(strip=True)
-        more_text = soup.find('span', class_='more-text').get_text(strip=True)
+        less_text = soup.select_one('span.less-text').text()
+        more_text = soup.select_one('span.more-text').text()
         combined_text = less_text + " " + more_text
     except:
-        less_text = soup.find('span', class_='less-text').get_text(strip=True)
+        less_text = soup.select_one('span.less-text').text()
         more_text= ""
         combined_text = less_text + " " + more_text
 
 
     #####################################################
     pattern_colors = r'data-color-id="color_(\d+)"\s+title="([^"]+)"'
-    matches_colors = re.findall(pattern_colors, response)
+    matches_colors = re.findall(pattern_colors, html)
     result_colors = [f"{num}_{title}" for num, title in matches_colors]
 
     pattern_capacity = r'data-capacity-id="(\d+)"\s*href="[^"]*"\s*class="[^"]*">([^<]+)<'
-    matches_capacity = re.findall(pattern_capacity, response)
+    matches_capacity = re.findall(pattern_capacity, html)
     result_capacity = [f"{num}_{capacity}" for num, capacity in matches_capacity]
     try:
-        slider = soup.find("input", {"id": "price-slider"})
+        slider = soup.select_one("input#price-slider")
 
-        max_value = slider.get("max")
-        # print("Max upfront:", max_value)
+        max_value = slider.attr("max")
     except:
         max_value = 0
-    # print(result_colors)
-    # print(result_capacity)
-    # print(product_model_id)
 
-    for color in result_colors:
-        for capacity in result_capacity:
-            row = {}
+    return {
+        "product_model_id": product_model_id,
+        "simDesc": simDesc,
+        "specs": specs,
+        "combined_text": combined_text,
+        "colors": result_colors,
+        "capacities": result_capacity,
+        "max_value": max_value,
+    }
+
+def build_variant_rows(url: str, page: dict, colors: str, capacitys: str, url_api: str, response_data: str,
+                       advance_grid: str = "rows") -> Tuple[list, list]:
+    """
+    Build the output rows of one colour/capacity variant from its variants API response.
+
+    Every plan in available_sims gives one row per upfront step (0 to the
+    page's slider max, by 10). With advance_grid "table" it gives a single
+    row, for no upfront, and the steps go to the returned grid instead as
+    ADVANCE_GRID_FIELDS rows. Returns (rows, grid).
+
+    The variant's columns are built once into a RowTemplate and each
+    plan's into a template derived from it; the step loop only sets the
+    pricing columns.
+    """
+    rows = []
+    grid = []
+    data_product = json.loads(response_data)
+    images = data_product["variant_images"]
+    handsetOnlyCostCash = float(data_product["min_price"])
+    template = RowTemplate(
+        {
+            "source": "mozillion",
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "apiURL": url_api,
+            "url": url,
+            "name": f"{url.split("/")[-1].replace("-","_")}_{colors.replace(" ","_")}_{capacitys}",
+            "brand": url.split("/")[-2],
+            "stock": "",
+            "desc": page["combined_text"],
+            "shortDesc": "",
+            "videoURL": "",
+            "lowestPriceValue": "",
+            "reviewRating": "",
+            "reviewCount": "",
+            "onSale": "",
+            "colour": colors,
+            "size": capacitys,
+            "UPC": "",
+            "EAN": "",
+            **url_category_fields(url),
+            "warranty": "",
+            "isSellingFast": "",
+            "isRestockingSoon": "",
+            "isPromotion": "",
+            "isOutletPrice": "",
+            "lowestPriceText": "",
+            **{f"image{i + 1}": images[i]["full_path"] if len(images) > i else "" for i in range(5)},
+            "saleText": "",
+            "handsetOnlyCostCash": handsetOnlyCostCash,
+            "previousPrice": "",
+            "simDesc": page["simDesc"],
+        },
+        spec_attribute_fields(page["specs"]),
+    )
+    if not handsetOnlyCostCash:
+        return rows, grid
+
+    # Each plan is paired with itself only: its phone id, data, duration and attributes belong together
+    for plan in data_product.get("available_sims", [{}]):
+        if not isinstance(plan, dict):
+            plan = {}
+        duration_months = plan.get("durationInt", 0)
+        attributes = plan.get("attributes", {})
+
+        texts_minutes = attributes.get("texts-minutes") or ""
+        data_tariff = attributes.get("data-tariff") or ""
+        duration = attributes.get("duration") or ""
+
+        if texts_minutes or data_tariff or duration:
+            sim_contract_name = (
+                f'Texts Minutes - {texts_minutes}, '
+                f'data-tariff - {data_tariff}, '
+                f'Duration - {duration}'
+            )
+        else:
+            sim_contract_name = ""
+        sku = plan.get("phone", {}).get("id", "")
+        plan_template = template.derive(
+            sku=sku,
+            phoneContractDuration=duration_months,
+            plan_type="contract",
+            sim_data=plan.get("data-tariff", ""),
+            simOfferData="",
+            simContractname=sim_contract_name,
+            simContractDuration=duration_months,
+            isPhoneContractAvailableWOsim="N",
+            phoneContractSimPackage=0 if duration_months == 0 else handsetOnlyCostCash,
+            handsetOnlyContract="",
+            sim1YearIncrease="",
+            sim2YearIncrease="",
+            sim3YearIncrease="",
+        )
+
+        for Upfront in range(0, int(page["max_value"]) + 1, 10):
+            paymentAmount = 0 if duration_months == 0 else round(((handsetOnlyCostCash-Upfront)/24),2)
+            if advance_grid == "table":
+                grid.append({
+                    "url": url,
+                    "sku": sku,
+                    "colour": colors,
+                    "size": capacitys,
+                    "simContractname": sim_contract_name,
+                    "phoneContractDuration": duration_months,
+                    "handsetOnlyCostCash": handsetOnlyCostCash,
+                    "advance": Upfront,
+                    "paymentAmount": paymentAmount,
+                })
+                if Upfront:
+                    continue
+            rows.append(plan_template.row(advance=Upfront, paymentAmount=paymentAmount, sim_price=paymentAmount))
+
+    return rows, grid
+
+class MozillionSession:
+    """
+    The mozillion_session cookie and CSRF _token the variant endpoints need.
+
+    Both come from one product page response. The pair is shared by every
+    product until the cookie expires (at most MAX_AGE seconds) or an
+    endpoint rejects it with a 419/403; the next caller then fetches a new
+    pair while the others wait for it.
+    """
+
+    MAX_AGE = 3600
+    # Renew this long before the cookie says it expires
+    EXPIRY_MARGIN = 60
+
+    def __init__(self):
+        self.credentials: Optional[Tuple[str, str]] = None
+        self.expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _valid(self) -> bool:
+        return self.credentials is not None and time.time() < self.expires_at
+
+    async def get(self, url: str, config: Dict[str, Any]) -> Tuple[Tuple[str, str], Optional[str]]:
+        """Return (cookie, token), plus the page of url when it had to be fetched for them"""
+        async with self._lock:
+            if self._valid():
+                return self.credentials, None
+            return await self._start(url, config)
+
+    async def refresh(self, url: str, rejected: Tuple[str, str], config: Dict[str, Any]) -> Tuple[str, str]:
+        """Replace credentials an endpoint rejected, unless another task already has"""
+        async with self._lock:
+            if self.credentials != rejected and self._valid():
+                return self.credentials
+            credentials, _ = await self._start(url, config)
+            return credentials
+
+    async def _start(self, url: str, config: Dict[str, Any]) -> Tuple[Tuple[str, str], str]:
+        # Never from the cache: the cookie and _token must be fresh
+        response = await fetch_url(url, content_type="product", config=config, raw_response=True)
+        cookie = response.cookies.get("mozillion_session")
+        match = re.search(r'_token:\s*"([^"]+)"', response.text)
+        if not cookie or not match:
+            raise RuntimeError(f"No mozillion_session cookie or _token on {url}")
+
+        now = time.time()
+        expires = next(
+            (c.expires for c in response.cookies.jar if c.name == "mozillion_session" and c.expires), None
+        )
+        self.expires_at = min(expires - self.EXPIRY_MARGIN, now + self.MAX_AGE) if expires else now + self.MAX_AGE
+        self.credentials = (cookie, match.group(1))
+        logger.info(f"Started Mozillion session, valid for {self.expires_at - now:.0f}s")
+        return self.credentials, response.text
+
+session = MozillionSession()
+
+def variant_cache_key(endpoint: str, data: dict) -> str:
+    """Cache key of a variants POST: its body without the _token, which changes with every session"""
+    return request_fingerprint(endpoint, "POST", json_data={k: v for k, v in data.items() if k != "_token"})
+
+async def fetch_variants(url: str, endpoint: str, data: dict, config: Dict[str, Any]) -> str:
+    """POST a variants request with the shared session, renewing it once if it is rejected"""
+    credentials, _ = await session.get(url, config)
+    cache_key = variant_cache_key(endpoint, data)
+    for attempt in range(2):
+        cookie, token = credentials
+        try:
+            return await fetch_url(
+                endpoint, method="POST", json_data={**data, "_token": token},
+                headers={'cookie': f'mozillion_session={cookie}'}, content_type="product", config=config,
+                cache_key=cache_key, final_client_errors=True
+            )
+        except FetchStatusError as e:
+            if e.status_code not in (403, 419) or attempt:
+                raise
+            logger.info(f"Mozillion session rejected with HTTP {e.status_code}; renewing it")
+            credentials = await session.refresh(url, credentials, config)
+
+async def fetch_single_product(url: str, config: Dict[str, Any] = None):
+    if config is None:
+        config = DEFAULT_CONFIG
+    advance_grid = config.get("advance_grid", "rows")
+
+    # The page that starts a session doubles as the product page
+    _, response = await session.get(url, config)
+    if response is None:
+        response = await fetch_url(url, content_type="product", config=config)
+
+    page = await run_parse(parse_product_page, response)
+
+    variants = []
+    for color in page["colors"]:
+        for capacity in page["capacities"]:
             capacity_code = capacity.split('_')[0]
             capacitys = capacity.split('_')[1]
 
@@ -145,17 +309,12 @@ async def fetch_single_product(url: str):
             # print(color_code)
             # print(colors)
 
-            headers = {
-
-                'cookie': f'mozillion_session={mozillion_session}',
-            }
-
             data = {
-                'product_model_id': product_model_id,
+                'product_model_id': page["product_model_id"],
                 'color_id': color_code,
                 'capacity': capacity_code,
                 'condition': '',
-                '_token': _token,
+                '_token': None,  # set by fetch_variants from the shared session
                 'colorchangeflag': 'true',
                 'storageIdOld': '',
                 'conditionIdOld': '',
@@ -164,174 +323,70 @@ async def fetch_single_product(url: str):
             # print(url)
             # print(url.split("/")[-1])
             if "bundle" in url:
-                url_api = f"https://www.mozillion.com/get-available-bundle-variants?{url.split("/")[-1]}_color={colors.replace(" ", "_")}_capacity={capacitys}"
+                endpoint = "https://www.mozillion.com/get-available-bundle-variants"
             else:
-                url_api = f"https://www.mozillion.com/get-available-variants?{url.split("/")[-1]}_color={colors.replace(" ", "_")}_capacity={capacitys}"
-
-            response_data = await fetch_url(url_api, method="POST", json_data=data, headers=headers, content_type="product")
-            data_product = json.loads(response_data)
-            row["source"] = "mozillion"
-            row["date"] = datetime.now().strftime("%Y-%m-%d")
-            row["apiURL"] = url_api
-            row["url"] = url
-            available_sims = data_product.get("available_sims", [{}])
-
-            for simplan in available_sims:
-                if isinstance(simplan, dict):
-                    phone = simplan.get("phone", {})
-                    row["sku"] = phone.get("id", "")
-                else:
-                    row["sku"] = ""
-                row["name"] = f"{url.split("/")[-1].replace("-","_")}_{colors.replace(" ","_")}_{capacitys}"
-                row["brand"] = url.split("/")[-2]
-                row["stock"] = ""
-                row["desc"] = combined_text
-                row["shortDesc"] = ""
-                row["videoURL"] = ""
-                row["lowestPriceValue"] = ""
-                row["reviewRating"] = ""
-                row["reviewCount"] = ""
-                row["onSale"] = ""
-                row["colour"] = colors
-                row["size"] = capacitys
-                row["UPC"] = ""
-                row["EAN"] = ""
-                row["cat"] = url.split("/")[3]
-                row["subcat1"] = url.split("/")[4]
-                row["subcat2"] = url.split("/")[5]
-                row["subcat3"] = url.split("/")[6] if len(url.split("/")) > 6 else ""
-                row["subcat4"] = url.split("/")[7] if len(url.split("/")) > 7 else ""
-                row["subcat5"] = url.split("/")[8] if len(url.split("/")) > 8 else ""
-                row["warranty"] = ""
-                row["isSellingFast"] = ""
-                row["isRestockingSoon"] = ""
-                row["isPromotion"] = ""
-                row["isOutletPrice"] = ""
-                row["lowestPriceText"] = ""
-                images = data_product["variant_images"]
-                row[f"image1"] = images[0] ["full_path"] if len(images) > 0 else ""
-                row[f"image2"] = images[1]["full_path"] if len(images) > 1 else ""
-                row[f"image3"] = images[2]["full_path"] if len(images) > 2 else ""
-                row[f"image4"] = images[3]["full_path"] if len(images) > 3 else ""
-                row[f"image5"] = images[4]["full_path"] if len(images) > 4 else ""
-                row["saleText"] = ""
-                row["handsetOnlyCostCash"] = float(data_product["min_price"])
-                if row["handsetOnlyCostCash"]:
-                    row["previousPrice"] = ""
-
-                    plans = data_product.get("available_sims") or [{}]
-
-                    for bundle in plans:
-                        row["phoneContractDuration"] = bundle.get("durationInt", 0)
-                        for Upfront in range(0, int(max_value) + 1, 10):
-                            row["advance"] = Upfront
-                            paymentAmount = round(((row["handsetOnlyCostCash"]-row["advance"])/24),2)
-                            row["paymentAmount"] = 0 if row["phoneContractDuration"] == 0 else paymentAmount
-                            row["plan_type"] = "contract"
-                            row["sim_data"] = simplan.get("data-tariff", "")
-                            row["sim_price"] = 0 if row["phoneContractDuration"] == 0 else paymentAmount
-                            row["simOfferData"] = ""
-                            attributes = bundle.get("attributes", {})
-
-                            texts_minutes = attributes.get("texts-minutes") or ""
-                            data_tariff = attributes.get("data-tariff") or ""
-                            duration = attributes.get("duration") or ""
-
-                            if texts_minutes or data_tariff or duration:
-                                sim_contract_name = (
-                                    f'Texts Minutes - {texts_minutes}, '
-                                    f'data-tariff - {data_tariff}, '
-                                    f'Duration - {duration}'
-                                )
-                            else:
-                                sim_contract_name = ""
-                            row["simContractname"] = sim_contract_name
-                            row["simContractDuration"] = 0 if row["phoneContractDuration"] == 0 else row["phoneContractDuration"]
-                            row["isPhoneContractAvailableWOsim"] = "N"
-                            row["phoneContractSimPackage"] = 0 if row["phoneContractDuration"] == 0 else row["handsetOnlyCostCash"]
-                            row["handsetOnlyContract"] = ""
-                            row["sim1YearIncrease"] = ""
-                            row["sim2YearIncrease"] = ""
-                            row["sim3YearIncrease"] = ""
-                            row["simDesc"] = simDesc
-                            attribute_index = 1
-
-                            for li in spec_items:
-                                if attribute_index > 20:
-                                    break
-                                strong = li.find("strong")
-                                if strong:
-                                    title = strong.get_text(strip=True).replace(":", "")
-                                    description = strong.next_sibling.strip() if strong.next_sibling else ""
-                                    row[f"attributeType{attribute_index}"] = "SPECIFICATION"
-                                    row[f"attributeTitle{attribute_index}"] = title
-                                    row[f"attributeValue{attribute_index}"] = description.upper()
-                                    attribute_index += 1
-
-
-
-
-                            append_to_csv(row, "products.csv")
-
-
-
-
-
-
-
-
-
-
-async def extact_data_from_product_url(all_product_urls: list[str]):
-    tasks = []
-    total_urls = len(all_product_urls)
-
-    with tqdm(total=total_urls, desc="Processing product URLs", ncols=100) as pbar:
-        for url in all_product_urls:
-            task = asyncio.create_task(wrapped_fetch(url))
-            tasks.append(task)
-            pbar.update(1)
-            if len(tasks) >= DEFAULT_WORKERS:
-                await tasks.pop(0)
-
-    for task in tasks:
-        await task
-
-
-
-async def wrapped_fetch(url):
-    try:
-        await fetch_single_product(url)
-    except Exception as e:
-        logger = logging.getLogger("scraper")
-        logger.warning(f"Failed to fetch {url}: {e}")
-
-
-
-
-
-async def get_products_list(urlsite_map: str):
-    products_all = await fetch_sitemap(urlsite_map)
-    products = [url for url in products_all if "/phone/" in url or "/bundle/" in url]
-    products = ["/".join(u.rstrip("/").split("/")[:-1])  for u in products]
+                endpoint = "https://www.mozillion.com/get-available-variants"
+            # The query string only labels the variant in the output; the cache keys on the POST body
+            # without its _token (see variant_cache_key)
+            url_api = f"{endpoint}?{url.split("/")[-1]}_color={colors.replace(" ", "_")}_capacity={capacitys}"
+            variants.append((colors, capacitys, endpoint, data, url_api))
+
+    async def variant_rows(variant):
+        colors, capacitys, endpoint, data, url_api = variant
+        response_data = await fetch_variants(url, endpoint, data, config)
+        return await run_parse(
+            build_variant_rows, url, page, colors, capacitys, url_api, response_data, advance_grid
+        )
+
+    # All colour x capacity lookups at once; rows still come out in colour, then capacity order
+    for rows, grid in await gather_subrequests(url, variants, variant_rows, config):
+        for row in rows:
+            yield row
+        # The upfront table is an extra output of the site (see MozillionSite.extra_outputs)
+        for grid_row in grid:
+            yield ADVANCE_GRID_FILE, grid_row
+
+
+async def get_products_list(urlsite_map: str, config: Dict[str, Any] = None):
+    products_all = await fetch_sitemap_entries(urlsite_map, config)
+    products = [entry for entry in products_all if "/phone/" in entry.loc or "/bundle/" in entry.loc]
+    # Variant pages collapse into their product page, which changes when any of them does
+    lastmods = {}
+    for entry in products:
+        url = "/".join(entry.loc.rstrip("/").split("/")[:-1])
+        lastmods[url] = max(lastmods.get(url) or "", entry.lastmod or "") or None
     filtered_products = []
-    for url in products:
+    for url, lastmod in lastmods.items():
         parts = url.strip("/").split("/")
         if "phone" in parts or "bundle" in parts:
             idx = parts.index("phone") if "phone" in parts else parts.index("bundle")
             if len(parts) > idx + 2:
-                filtered_products.append(url)
-    return list(set(filtered_products))
+                filtered_products.append(SitemapEntry(url, lastmod))
+    return filtered_products
 
 
-async def main():
-    create_csv_file("products.csv")
-    urlsite_map = "https://www.mozillion.com/sitemapxml"
-    products = await get_products_list(urlsite_map)
+class MozillionSite(SiteScraper):
+    name = "Mozillion"
+    site_url = "https://www.mozillion.com"
+    sitemap_url = "https://www.mozillion.com/sitemapxml"
 
+    async def discover(self):
+        for entry in await get_products_list(self.sitemap_url, self.config):
+            yield entry
 
-    data = await extact_data_from_product_url(products)
+    def rows(self, url: str):
+        return fetch_single_product(url, self.config)
+
+    def extra_outputs(self, config: Dict[str, Any]) -> Dict[str, List[str]]:
+        if config.get("advance_grid", "rows") == "table":
+            return {ADVANCE_GRID_FILE: ADVANCE_GRID_FIELDS}
+        return {}
+
+
+async def main():
+    await run_site_scraper(MozillionSite())
 
 
 if __name__ == "__main__":
+    parse_script_args("Scrape Mozillion products")
     asyncio.run(main())
@@ -0,0 +1,167 @@
+"""
+Per-page parse time of the DG product page parsers for each HTML backend.
+
+The baseline is the old path: the whole page parsed by html.parser. Each
+other combination runs the same script function (parse_product_page of
+DG_EE, DG_mozillion and DG_lebara) with config["html_parser"] and
+config["html_parse_scope"] switched, and is checked against the baseline
+output.
+
+Pages are synthetic by default, padded with navigation/footer/listing
+markup to a realistic weight. Saved pages can be used instead:
+
+    python bench/bench_html_parsers.py --page mozillion=saved.html --repeat 50
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+SIM_DIR = Path(__file__).resolve().parents[1]
+for script_dir in ("DG_EE", "DG_mozillion", "DG_lebara"):
+    sys.path.insert(0, str(SIM_DIR / script_dir))
+
+import functions
+import DG_EE
+import DG_mozillion
+import DG_lebara
+
+EE_URL = "https://ee.co.uk/mobile/pay-monthly-phones-gallery/apple/iphone-16"
+MOZILLION_URL = "https://www.mozillion.com/phone/apple/iphone-15"
+LEBARA_URL = "https://phones.lebara.co.uk/phones/apple/iphone-15-128gb?simfree=1"
+
+
+def padding(kilobytes):
+    """Navigation, listings and footer markup the parsers do not need"""
+    card = (
+        '<li class="card"><a href="/p/{i}"><img src="/img/{i}.webp" alt="Phone {i}">'
+        '<span class="title">Phone {i}</span><span class="price">&pound;{i}.99</span></a>'
+        '<ul class="tags"><li>5G</li><li>eSIM</li></ul></li>'
+    )
+    cards = []
+    size = 0
+    i = 0
+    while size < kilobytes * 1024:
+        chunk = card.format(i=i)
+        cards.append(chunk)
+        size += len(chunk)
+        i += 1
+    return (
+        '<header><nav><ul class="menu">' + "".join(f'<li><a href="/m/{n}">Menu {n}</a></li>' for n in range(40))
+        + '</ul></nav></header><section class="listing"><ul>' + "".join(cards) + "</ul></section>"
+        + '<footer><div class="links">' + "".join(f'<a href="/f/{n}">Link {n}</a>' for n in range(60)) + "</div></footer>"
+    )
+
+
+def ee_page(kilobytes):
+    next_data = {"props": {"apolloState": {"ROOT_QUERY": {
+        'deviceBundle({"seo":"iphone-16"})': {
+            "product": {"baseDeviceSeoId": "apple-iphone-16"},
+            "deviceBundleVariants": [
+                {"product": {"dimensions": [{"key": "color", "value": colour}, {"key": "capacity", "value": capacity}]}}
+                for colour in ("black", "white", "pink", "teal") for capacity in ("128GB", "256GB", "512GB")
+            ],
+        },
+    }}}}
+    return (
+        "<html><head><title>iPhone 16</title></head><body>" + padding(kilobytes)
+        + f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data)}</script></body></html>'
+    )
+
+
+def mozillion_page(kilobytes):
+    specs = "".join(f"<li><strong>Spec {n}:</strong> Value {n}</li>" for n in range(25))
+    colours = "".join(f'<a data-color-id="color_{n}" title="Colour {n}"></a>' for n in range(4))
+    capacities = "".join(f'<a data-capacity-id="{n}" href="#" class="cap">{n * 128}GB</a>' for n in range(1, 4))
+    return (
+        '<html><body><script>var x = {product_model_id: "4242", _token: "abc"};</script>' + padding(kilobytes // 2)
+        + '<div id="tab-sim"><ul><li>Unlimited texts</li><li>30GB data</li></ul></div>'
+        + f'<div id="accordion-flush-body-1"><ul>{specs}</ul></div>'
+        + '<p><span class="less-text">Refurbished iPhone 15.</span><span class="more-text">Fully tested.</span></p>'
+        + colours + capacities + '<input id="price-slider" type="range" min="0" max="200">'
+        + padding(kilobytes // 2) + "</body></html>"
+    )
+
+
+def lebara_page(kilobytes):
+    data_layer = json.dumps({"ecommerce": {"impressions": [{
+        "id": "LEB-15-128", "brand": "Apple", "price": "699.00", "variant": "Black",
+        "name": "iPhone 15 128GB", "category": "Phones > Apple > iPhone",
+    }]}}).replace('"', "'")
+    gallery = "".join(f'<a href="/images/iphone-15-{n}.jpg"><img src="/images/thumb-{n}.jpg"></a>' for n in range(6))
+    return (
+        "<html><body>" + padding(kilobytes // 2)
+        + '<div class="handset-chosen"><img src="/images/iphone-15-0.jpg"></div>'
+        + f'<div id="handset-gallery">{gallery}</div>'
+        + '<ul class="summary"><li>6.1 inch display</li><li>A16 Bionic</li><li>48MP camera</li></ul>'
+        + '<span class="promo-pill">Save &pound;50</span>'
+        + '<div class="configure-container default"><p>128GB</p></div>'
+        + "<ul><li>24 month warranty included</li></ul>"
+        + f"<script>dataLayer.push({data_layer});</script>"
+        + padding(kilobytes // 2) + "</body></html>"
+    )
+
+
+CASES = {
+    "ee": (ee_page, lambda page: DG_EE.parse_product_page(page)),
+    "mozillion": (mozillion_page, lambda page: DG_mozillion.parse_product_page(page)),
+    "lebara": (lebara_page, lambda page: DG_lebara.parse_product_page(LEBARA_URL, page)),
+}
+
+
+def backends():
+    """(label, html_parser, html_parse_scope); the first entry is the baseline"""
+    combos = [("html.parser (full page)", "html.parser", False), ("html.parser + scope", "html.parser", True)]
+    if functions.LXML_AVAILABLE:
+        combos += [("lxml (full page)", "lxml", False), ("lxml + scope", "lxml", True)]
+    if functions.LexborHTMLParser is not None:
+        combos.append(("selectolax", "selectolax", False))
+    return combos
+
+
+def time_parse(parse, page, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = parse(page)
+        timings.append(time.perf_counter() - started)
+    return result, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML parser backends on DG product pages")
+    parser.add_argument("--repeat", type=int, default=20, help="Parses per page and backend")
+    parser.add_argument("--page-kb", type=int, default=300, help="Size of the synthetic pages")
+    parser.add_argument("--page", action="append", default=[], metavar="SITE=FILE",
+                        help="Use a saved page for a site (ee, mozillion or lebara)")
+    args = parser.parse_args()
+
+    pages = {site: make_page(args.page_kb) for site, (make_page, _) in CASES.items()}
+    for option in args.page:
+        site, _, filename = option.partition("=")
+        pages[site] = Path(filename).read_text(encoding="utf-8")
+
+    config = functions.DEFAULT_CONFIG
+    print(f"{'site':<10} {'backend':<26} {'ms/page':>9} {'p99 ms':>8} {'speedup':>8}  same output")
+    for site, (_, parse) in CASES.items():
+        page = pages[site]
+        baseline_result = baseline_ms = None
+        for label, backend, scoped in backends():
+            config["html_parser"] = backend
+            config["html_parse_scope"] = scoped
+            result, timings = time_parse(parse, page, args.repeat)
+            median_ms = statistics.median(timings) * 1000
+            p99_ms = sorted(timings)[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+            if baseline_result is None:
+                baseline_result, baseline_ms = result, median_ms
+            print(
+                f"{site:<10} {label:<26} {median_ms:>9.2f} {p99_ms:>8.2f} {baseline_ms / median_ms:>7.1f}x"
+                f"  {'yes' if result == baseline_result else 'NO'}"
+            )
+        print(f"{'':<10} page size {len(page) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
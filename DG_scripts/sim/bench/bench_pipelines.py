@@ -0,0 +1,462 @@
+"""
+End-to-end throughput of the DG site scripts against a local stand-in server.
+
+A ThreadingHTTPServer serves synthetic fixtures shaped like the real
+responses:
+- EE: the shop sitemap, __NEXT_DATA__ product pages and the GraphQL
+  variant queries, as GETs or batched POSTs (a list of queries in, a
+  list of results out); --ee-aliases lists products a second time under
+  another gallery path, as the real sitemap does;
+- Mozillion: the sitemap, product pages with session cookie and _token,
+  and the variant POSTs;
+- Lebara: the sitemap, product pages, get_video/get_spec and the SIM-only
+  model.json.
+Every response is delayed by --latency (plus --jitter) and fails with a
+503 at --error-rate.
+
+Each script then runs its full pipeline (discovery, fetch, parse, rows,
+output) in a child process with config["host_overrides"] pointing the
+carrier hosts at the server. The report shows products/sec, rows/sec,
+peak RSS and p50/p99 of request and per-product latency.
+
+    python bench/bench_pipelines.py --products 30 --latency 40 --error-rate 0.01
+    python bench/bench_pipelines.py --json-out before.json
+    python bench/bench_pipelines.py --baseline before.json --tolerance 0.1
+
+With --baseline, the exit status is 1 when a site's products/sec drops by
+more than --tolerance. Recorded responses can replace the synthetic ones
+with --fixtures DIR: a request for https://<host><path> is answered with
+DIR/<host><path> when that file exists.
+
+--rerun runs every site a second time on the cache of the first run, in
+a new process and so with a new Mozillion session and _token. The second
+run must not send any Mozillion variant POST; otherwise the exit status
+is 1.
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+SIM_DIR = Path(__file__).resolve().parents[1]
+SITES = {
+    # site: (script directory, module, plugin class, hosts served)
+    "ee": ("DG_EE", "DG_EE", "EESite", ["ee.co.uk"]),
+    "mozillion": ("DG_mozillion", "DG_mozillion", "MozillionSite", ["www.mozillion.com"]),
+    "lebara": ("DG_lebara", "DG_lebara", "LebaraSite", ["phones.lebara.co.uk", "www.lebara.co.uk"]),
+}
+
+COLOURS = ["black", "white", "blue", "pink", "green", "purple"]
+CAPACITIES = ["128GB", "256GB", "512GB", "1TB"]
+
+
+def padding(kilobytes):
+    """Listing and footer markup the parsers skip, to give pages a realistic weight"""
+    card = '<li class="card"><a href="/p/{i}"><img src="/img/{i}.webp"><span>Phone {i}</span></a></li>'
+    cards = "".join(card.format(i=i) for i in range(kilobytes * 1024 // 80))
+    return f'<section class="listing"><ul>{cards}</ul></section>'
+
+
+def urlset(urls):
+    entries = "".join(f"<url><loc>{url}</loc><lastmod>2025-01-01</lastmod></url>" for url in urls)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+
+
+class Fixtures:
+    """Synthetic responses for every route the three scripts request"""
+
+    def __init__(self, products, colours, capacities, plans, page_kb, session_ttl=0, ee_aliases=0):
+        self.products = products
+        self.ee_aliases = ee_aliases
+        self.colours = COLOURS[:colours]
+        self.capacities = CAPACITIES[:capacities]
+        self.plans = plans
+        self.page_kb = page_kb
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.sessions_started = 0
+        self.sessions_rejected = 0
+        self.graphql_queries = 0
+        self.variant_posts = 0
+        self.graphql_posts = 0
+        self._lock = threading.Lock()
+
+    def respond(self, method, host, path, query, body):
+        """Return (status, content type, body, extra headers)"""
+        if host == "ee.co.uk":
+            return self.ee(method, path, query, body)
+        if host == "www.mozillion.com":
+            return self.mozillion(method, path, body)
+        if host in ("phones.lebara.co.uk", "www.lebara.co.uk"):
+            return self.lebara(path)
+        return 404, "text/plain", "unknown host", {}
+
+    # EE
+
+    def ee(self, method, path, query, body):
+        if path == "/sitemap-shop-hybris.xml":
+            urls = [f"https://ee.co.uk/mobile/pay-monthly-phones-gallery/apple/iphone-{i}" for i in range(self.products)]
+            urls += [f"https://ee.co.uk/mobile/pay-monthly-phones-gallery/apple-deals/iphone-{i}" for i in range(self.ee_aliases)]
+            return 200, "application/xml", urlset(urls), {}
+        if path.startswith("/mobile/"):
+            seo_id = f"apple-{path.rsplit('/', 1)[-1]}"
+            next_data = {"props": {"apolloState": {"ROOT_QUERY": {f'deviceBundle({{"seo":"{seo_id}"}})': {
+                "product": {"baseDeviceSeoId": seo_id},
+                "deviceBundleVariants": [
+                    {"product": {"dimensions": [{"key": "color", "value": colour}, {"key": "capacity", "value": capacity}]}}
+                    for colour in self.colours for capacity in self.capacities
+                ],
+            }}}}}
+            page = (
+                f"<html><body>{padding(self.page_kb)}"
+                f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data)}</script></body></html>'
+            )
+            return 200, "text/html", page, {}
+        if path == "/graphql" and method == "POST":
+            operations = json.loads(body)
+            with self._lock:
+                self.graphql_posts += 1
+                self.graphql_queries += len(operations)
+            return 200, "application/json", json.dumps([
+                self.ee_graphql(operation["variables"]) for operation in operations
+            ]), {}
+        if path == "/graphql":
+            with self._lock:
+                self.graphql_queries += 1
+            return 200, "application/json", json.dumps(self.ee_graphql(json.loads(query["variables"][0]))), {}
+        return 404, "text/plain", "not found", {}
+
+    def ee_graphql(self, variables):
+        variables = variables["deviceBundleBySeoInput"]
+        dimensions = {d["key"]: d["value"] for d in variables["dimensions"]}
+        return self.ee_variant(variables["baseProductSeoId"], dimensions)
+
+    def ee_variant(self, seo_id, dimensions):
+        plans = [{
+            "plan": {
+                "name": f"{gb}GB Essentials",
+                "summary": f"{gb}GB data, unlimited minutes and texts",
+                "entitlements": [{"code": "ME_DATA_MB", "quantity": -1 if gb >= 200 else gb * 1000}],
+                "price": {
+                    "payMonthlyPrice": 10.0 + n * 5, "wasPayMonthlyPrice": 0.0, "subscriptionTermInMonths": 24,
+                    "futurePrices": [{"price": 11.5 + n * 5}, {"price": 13.0 + n * 5}],
+                },
+                "planFamily": {"features": [{"name": "5G"}, {"name": "Wi-Fi calling"}], "specialFeatures": []},
+            },
+            "productPrice": {
+                "payTodayPrice": 799.0, "minimumPayTodayPrice": 30.0, "availableSubscriptionTermsInMonths": [24, 36],
+            },
+        } for n, gb in enumerate([10, 25, 50, 100, 250][:self.plans])]
+        return {"data": {
+            "deviceBundle": {
+                "product": {
+                    "code": f"{seo_id}-{dimensions.get('color')}-{dimensions.get('capacity')}",
+                    "name": seo_id.replace("-", " ").title(), "manufacturer": "Apple",
+                    "stock": {"message": "In stock"},
+                    "baseDeviceShortDescription": "A fast phone with a great camera.", "seoTitle": seo_id,
+                    "images": [{"formats": [{"mimeType": "image/webp", "url": f"https://ee.co.uk/img/{seo_id}-{n}.webp"}]}
+                               for n in range(6)],
+                    "features": [{"assistiveText": f"Feature {n}", "name": f"Value {n}"} for n in range(12)],
+                },
+                "productPlanCombinations": plans,
+            },
+            "guidedSellingConfig": {"maxLoanUpfrontCostPercentage": 50},
+        }}
+
+    # Mozillion
+
+    def start_session(self):
+        """A new mozillion_session cookie and its _token, as every page served without a cookie gets"""
+        with self._lock:
+            self.sessions_started += 1
+            session = f"session-{self.sessions_started}"
+            self.sessions[f"token-{self.sessions_started}"] = time.monotonic()
+        return session, f"token-{self.sessions_started}"
+
+    def session_valid(self, token):
+        with self._lock:
+            started = self.sessions.get(token)
+        return started is not None and (not self.session_ttl or time.monotonic() - started < self.session_ttl)
+
+    def mozillion(self, method, path, body):
+        if path == "/sitemapxml":
+            return 200, "application/xml", urlset(
+                f"https://www.mozillion.com/phone/apple/iphone-{i}/{capacity.lower()}"
+                for i in range(self.products) for capacity in self.capacities
+            ), {}
+        if path.startswith("/phone/"):
+            colours = "".join(f'<a data-color-id="color_{n}" title="{colour.title()}"></a>' for n, colour in enumerate(self.colours))
+            capacities = "".join(
+                f'<a data-capacity-id="{n}" href="#" class="cap">{capacity}</a>' for n, capacity in enumerate(self.capacities)
+            )
+            specs = "".join(f"<li><strong>Spec {n}:</strong> Value {n}</li>" for n in range(25))
+            session, token = self.start_session()
+            page = (
+                f'<html><body><script>var x = {{product_model_id: "{1000 + int(path.rsplit('-', 1)[-1])}", '
+                f'_token: "{token}"}};</script>{padding(self.page_kb // 2)}'
+                '<div id="tab-sim"><ul><li>Unlimited texts</li><li>30GB data</li></ul></div>'
+                f'<div id="accordion-flush-body-1"><ul>{specs}</ul></div>'
+                '<p><span class="less-text">Refurbished phone.</span><span class="more-text">Fully tested.</span></p>'
+                f'{colours}{capacities}<input id="price-slider" type="range" min="0" max="200">'
+                f"{padding(self.page_kb // 2)}</body></html>"
+            )
+            return 200, "text/html", page, {"Set-Cookie": f"mozillion_session={session}; Path=/"}
+        if method == "POST" and path in ("/get-available-variants", "/get-available-bundle-variants"):
+            data = json.loads(body or b"{}")
+            with self._lock:
+                self.variant_posts += 1
+            if not self.session_valid(data.get("_token")):
+                with self._lock:
+                    self.sessions_rejected += 1
+                return 419, "application/json", '{"message": "CSRF token mismatch."}', {}
+            sims = [{
+                "phone": {"id": f"{data.get('product_model_id')}-{data.get('color_id')}-{data.get('capacity')}"},
+                "data-tariff": f"{gb}GB", "durationInt": 12,
+                "attributes": {"texts-minutes": "Unlimited", "data-tariff": f"{gb}GB", "duration": "12 months"},
+            } for gb in [10, 30, 100][:self.plans]]
+            response = {
+                "available_sims": sims,
+                "variant_images": [{"full_path": f"https://www.mozillion.com/img/{n}.jpg"} for n in range(5)],
+                "min_price": "299.00",
+            }
+            return 200, "application/json", json.dumps(response), {}
+        return 404, "text/plain", "not found", {}
+
+    # Lebara
+
+    def lebara(self, path):
+        if path == "/sitemap.xml":
+            return 200, "application/xml", urlset(
+                f"https://phones.lebara.co.uk/phones/apple/iphone-{i}-128gb" for i in range(self.products)
+            ), {}
+        if path.startswith("/phones/"):
+            slug = path.rsplit("/", 1)[-1]
+            data_layer = json.dumps({"ecommerce": {"impressions": [{
+                "id": f"LEB-{slug}", "brand": "Apple", "price": "699.00", "variant": "Black",
+                "name": slug.replace("-", " "), "category": "Phones > Apple > iPhone",
+            }]}}).replace('"', "'")
+            gallery = "".join(f'<a href="/images/{slug}-{n}.jpg"><img src="/images/thumb-{n}.jpg"></a>' for n in range(6))
+            page = (
+                f"<html><body>{padding(self.page_kb // 2)}"
+                f'<div class="handset-chosen"><img src="/images/{slug}-0.jpg"></div><div id="handset-gallery">{gallery}</div>'
+                '<ul class="summary"><li>6.1 inch display</li><li>48MP camera</li></ul>'
+                '<span class="promo-pill">Save &pound;50</span><div class="configure-container default"><p>128GB</p></div>'
+                f"<ul><li>24 month warranty included</li></ul><script>dataLayer.push({data_layer});</script>"
+                f"{padding(self.page_kb // 2)}</body></html>"
+            )
+            return 200, "text/html", page, {}
+        if path == "/functions_handset/get_video":
+            return 200, "application/json", json.dumps({"html": '<iframe src="//www.youtube.com/embed/bench"></iframe>'}), {}
+        if path == "/functions_handset/get_spec":
+            rows = "".join(
+                f'<tr><th class="spec-title">Spec {n}:</th><td class="spec-copy">Value <b>{n}</b></td></tr>' for n in range(25)
+            )
+            return 200, "application/json", json.dumps({"html": f'<table class="spec-section">{rows}</table>'}), {}
+        if path == "/en/best-sim-only-deals.model.json":
+            offers = [{
+                "id": f"plan-{n}", "detailsLink": f"/en/plans/{n}", "cost": 5 + n, "planName": f"{n + 1} - Month Plan",
+                "allowanceList": [{"name": "Data", "formatedValue": f"{(n + 1) * 10}GB"}, {"name": "Minutes", "formatedValue": "Unlimited"}],
+                "appPromotionMessage": "",
+            } for n in range(12)]
+            return 200, "application/json", json.dumps({"content": {"items": [{"offers": offers}]}}), {}
+        return 404, "text/plain", "not found", {}
+
+
+def make_handler(fixtures, latency, jitter, error_rate, fixtures_dir):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def handle_request(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            if error_rate and random.random() < error_rate:
+                return self.reply(503, "text/plain", "injected error", {})
+
+            host = (self.headers.get("Host") or "").split(":")[0]
+            url = urlsplit(self.path)
+            recorded = Path(fixtures_dir, host + url.path) if fixtures_dir else None
+            if recorded is not None and recorded.is_file():
+                return self.reply(200, "text/html", recorded.read_text(encoding="utf-8"), {})
+            self.reply(*fixtures.respond(method, host, url.path, parse_qs(url.query), body))
+
+        def reply(self, status, content_type, text, headers):
+            payload = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self.handle_request("GET")
+
+        def do_POST(self):
+            self.handle_request("POST")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run_child(args):
+    """Run one site's pipeline against the server and print its stats as JSON"""
+    import resource
+
+    script_dir, module_name, class_name, _ = SITES[args.child]
+    # functions.py lives next to DG_EE.py and is shared by every script
+    sys.path[:0] = [str(SIM_DIR / script_dir), str(SIM_DIR / "DG_EE")]
+    import asyncio
+    import importlib
+    import logging
+    import functions
+
+    module = importlib.import_module(module_name)
+    logging.getLogger("scraper").setLevel(logging.WARNING)
+    server = f"http://127.0.0.1:{args.port}"
+    functions.DEFAULT_CONFIG.update({
+        "host_overrides": {host: server for _, _, _, hosts in SITES.values() for host in hosts},
+        "rate_limits": {"default": {"rate": 0, "burst": 1}},
+        "concurrency": {"default": args.concurrency},
+        "max_connections_per_host": max(10, args.concurrency * 2),
+        "max_keepalive_per_host": max(10, args.concurrency * 2),
+        "save_raw_sitemaps": args.cache, "save_raw_categories": args.cache, "save_raw_products": args.cache,
+        "max_retries": 3, "http2": False, "use_scrapingbee": False,
+        "parse_workers": args.parse_workers, "output_format": args.output_format,
+        "graphql_batch_size": args.graphql_batch_size, "advance_grid": args.advance_grid,
+    })
+    stats = asyncio.run(functions.run_site_scraper(getattr(module, class_name)()))
+    summary = functions.metrics.summary()
+    histograms = {entry["name"]: entry for entry in summary["histograms"] if entry["name"] in ("fetch_seconds", "product_seconds")}
+    fetch = [entry for entry in summary["histograms"] if entry["name"] == "fetch_seconds"]
+    requests = sum(entry["count"] for entry in fetch)
+    print(json.dumps({
+        **stats,
+        "requests": requests,
+        "fetch_p50_ms": max((entry["p50"] for entry in fetch), default=0.0) * 1000,
+        "fetch_p99_ms": max((entry["p99"] for entry in fetch), default=0.0) * 1000,
+        "product_p50_ms": histograms.get("product_seconds", {}).get("p50", 0.0) * 1000,
+        "product_p99_ms": histograms.get("product_seconds", {}).get("p99", 0.0) * 1000,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DG site pipelines against a local stand-in server")
+    parser.add_argument("--sites", default="ee,mozillion,lebara", help="Comma-separated sites to run")
+    parser.add_argument("--products", type=int, default=20, help="Products in each sitemap")
+    parser.add_argument("--colours", type=int, default=3, help="Colours per product (max 6)")
+    parser.add_argument("--capacities", type=int, default=2, help="Capacities per product (max 4)")
+    parser.add_argument("--plans", type=int, default=3, help="Plans per variant response")
+    parser.add_argument("--session-ttl", type=float, default=0,
+                        help="Seconds before a Mozillion _token is rejected with a 419 (0 = never)")
+    parser.add_argument("--ee-aliases", type=int, default=0,
+                        help="EE products listed a second time under another gallery path")
+    parser.add_argument("--graphql-batch-size", type=int, default=1,
+                        help="EE GraphQL variant queries per batched POST (1 = one GET each)")
+    parser.add_argument("--page-kb", type=int, default=150, help="Weight of the product pages")
+    parser.add_argument("--latency", type=float, default=50, help="Response delay in ms")
+    parser.add_argument("--jitter", type=float, default=10, help="Random +/- delay in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of responses answered with a 503")
+    parser.add_argument("--concurrency", type=int, default=4, help="Products processed at once per site")
+    parser.add_argument("--parse-workers", type=int, default=0, help="Parse worker processes (0 = event loop)")
+    parser.add_argument("--output-format", choices=["csv", "parquet", "both"], default="csv")
+    parser.add_argument("--advance-grid", choices=["rows", "table"], default="rows",
+                        help="Mozillion upfront steps as rows or as a separate table")
+    parser.add_argument("--cache", action="store_true", help="Keep the raw response cache on (off by default)")
+    parser.add_argument("--rerun", action="store_true",
+                        help="Run each site again on the cache of the first run (implies --cache)")
+    parser.add_argument("--fixtures", help="Directory of recorded responses, as <host>/<path>")
+    parser.add_argument("--json-out", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed products/sec drop against the baseline")
+    parser.add_argument("--child", choices=list(SITES), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    fixtures = Fixtures(
+        args.products, args.colours, args.capacities, args.plans, args.page_kb, args.session_ttl, args.ee_aliases
+    )
+    handler = make_handler(fixtures, args.latency / 1000, args.jitter / 1000, args.error_rate, args.fixtures)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {}
+    child_args = [
+        "--port", str(server.server_port), "--concurrency", str(args.concurrency),
+        "--parse-workers", str(args.parse_workers), "--output-format", args.output_format,
+        "--graphql-batch-size", str(args.graphql_batch_size), "--advance-grid", args.advance_grid,
+    ] + (["--cache"] if args.cache or args.rerun else [])
+    rerun_variant_posts = 0
+    try:
+        for site in args.sites.split(","):
+            with tempfile.TemporaryDirectory(prefix=f"bench_{site}_") as workdir:
+                for run in (site, f"{site} rerun") if args.rerun else (site,):
+                    variant_posts = fixtures.variant_posts
+                    child = subprocess.run(
+                        [sys.executable, str(Path(__file__).resolve()), "--child", site] + child_args,
+                        cwd=workdir, capture_output=True, text=True,
+                    )
+                    if child.returncode != 0:
+                        print(f"{run} failed:\n{child.stderr[-2000:]}", file=sys.stderr)
+                        break
+                    results[run] = json.loads(child.stdout.strip().splitlines()[-1])
+                    if run != site:
+                        rerun_variant_posts += fixtures.variant_posts - variant_posts
+    finally:
+        server.shutdown()
+    if "ee" in results:
+        print(f"EE GraphQL queries answered: {fixtures.graphql_queries} ({fixtures.graphql_posts} batched POSTs)")
+    if "mozillion" in results:
+        print(f"Mozillion variant POSTs rejected with 419: {fixtures.sessions_rejected}")
+
+    print(
+        f"{'site':<10} {'products':>8} {'failed':>6} {'rows':>8} {'requests':>8} {'prod/s':>8} {'rows/s':>9} "
+        f"{'RSS MB':>7} {'fetch p50/p99 ms':>17} {'product p50/p99 ms':>19}"
+    )
+    for site, r in results.items():
+        print(
+            f"{site:<10} {r['products']:>8} {r['failed']:>6} {r['rows']:>8} {r['requests']:>8} "
+            f"{r['products'] / r['elapsed']:>8.2f} {r['rows_per_second']:>9.0f} {r['peak_rss_mb']:>7.0f} "
+            f"{r['fetch_p50_ms']:>8.0f}/{r['fetch_p99_ms']:<8.0f} {r['product_p50_ms']:>9.0f}/{r['product_p99_ms']:<9.0f}"
+        )
+
+    if args.rerun and "mozillion rerun" in results:
+        print(f"Mozillion variant POSTs sent by the rerun: {rerun_variant_posts} (expected 0)")
+        if rerun_variant_posts:
+            sys.exit(1)
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressed = False
+        for site, r in results.items():
+            if site not in baseline:
+                continue
+            before = baseline[site]["products"] / baseline[site]["elapsed"]
+            after = r["products"] / r["elapsed"]
+            change = after / before - 1 if before else 0.0
+            flag = "REGRESSION" if change < -args.tolerance else "ok"
+            regressed |= flag != "ok"
+            print(f"{site:<10} products/sec {before:.2f} -> {after:.2f} ({change:+.1%}) {flag}")
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()